@@ -4,13 +4,18 @@ LinkedIn Outreach Templates and Automation System
 Advanced LinkedIn messaging and connection strategies for B2B lead generation
 """
 
+import csv
+import hashlib
 import json
 import sqlite3
+import time
 from datetime import datetime, timedelta
-from dataclasses import dataclass
-from typing import List, Dict, Optional, Any
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Optional, Any, Tuple
 # from jinja2 import Template  # Removed for testing
 import random
+import re
+from urllib.parse import unquote
 
 @dataclass
 class LinkedInMessage:
@@ -23,6 +28,7 @@ class LinkedInMessage:
     personalization_fields: List[str]
     conversion_goal: str
     character_limit: int = 300
+    fallback_templates: List[str] = field(default_factory=list)  # shorter variants, tried in order
 
 @dataclass
 class LinkedInProspect:
@@ -38,11 +44,184 @@ class LinkedInProspect:
     pain_points: List[str]
     connection_status: str = "not_connected"
 
+def canonicalize_profile_url(url: str) -> str:
+    """
+    Normalize a LinkedIn profile URL so scheme, www/country subdomains,
+    query strings, fragments, case and trailing slashes don't create duplicates
+    """
+    url = (url or "").strip()
+    scheme_end = url.find("://")
+    if scheme_end != -1:
+        url = url[scheme_end + 3:]
+    
+    for separator in ("?", "#"):
+        cut = url.find(separator)
+        if cut != -1:
+            url = url[:cut]
+    
+    host, _, path = url.partition("/")
+    host = host.rsplit("@", 1)[-1].split(":")[0].lower()
+    if host.endswith(".linkedin.com"):
+        host = "linkedin.com"
+    if not host:
+        return ""
+    
+    if "%" in path:
+        path = unquote(path)
+    path = path.lower().rstrip("/")
+    return f"{host}/{path}" if path else host
+
+def profile_url_hash(url: str, canonical: bool = False) -> str:
+    """
+    Compact hash of the canonical profile URL used for indexed dedupe
+    """
+    canonical_url = url if canonical else canonicalize_profile_url(url)
+    return hashlib.blake2b(canonical_url.encode("utf-8"), digest_size=8).hexdigest()
+
+class CompiledMessageTemplate:
+    """
+    Message template split once into literal text and placeholder fields so the
+    rendered length can be computed from field lengths before building the string
+    """
+    
+    PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+    
+    def __init__(self, template: str):
+        self.literals = []
+        self.fields = []
+        position = 0
+        for match in self.PLACEHOLDER_PATTERN.finditer(template):
+            self.literals.append(template[position:match.start()])
+            self.fields.append(match.group(1))
+            position = match.end()
+        self.literals.append(template[position:])
+        self.literal_length = sum(len(literal) for literal in self.literals)
+    
+    def rendered_length(self, values: Dict[str, str]) -> int:
+        # Unknown placeholders are left in the message verbatim
+        return self.literal_length + sum(
+            len(values[name]) if name in values else len(name) + 4
+            for name in self.fields
+        )
+    
+    def render(self, values: Dict[str, str]) -> str:
+        parts = [self.literals[0]]
+        for name, literal in zip(self.fields, self.literals[1:]):
+            parts.append(values[name] if name in values else "{{" + name + "}}")
+            parts.append(literal)
+        return "".join(parts)
+
+@dataclass
+class MessageVariant:
+    variant_id: int  # index into the Cartesian product of slot options
+    choices: Dict[str, str]
+    text: str
+
+class MessageVariationEngine:
+    """
+    Deterministic A/B variants of a base template.
+
+    Each slot is a list of interchangeable phrases; a slot is active when one of
+    its phrases appears in the base template. Variants are indices into the
+    Cartesian product of active slots, sampled without repeats from a seeded
+    RNG and built once. Prospects are assigned by a stable hash so batches can
+    be split across processes without coordination.
+    """
+    
+    @staticmethod
+    def get_default_slots() -> Dict[str, List[str]]:
+        return {
+            "opening": [
+                "Hi {{first_name}},",
+                "Hello {{first_name}},",
+                "Hey {{first_name}},",
+                "{{first_name}},"
+            ],
+            "cta": [
+                "Would you be open to a brief conversation?",
+                "Worth a 15-minute discussion?",
+                "Quick call this week?",
+                "Open to a quick chat this week?"
+            ],
+            "closing": [
+                "\nKenneth",
+                "\nBest,\nKenneth",
+                "\nBest regards,\nKenneth",
+                "\nCheers,\nKenneth",
+                "\nThanks,\nKenneth"
+            ]
+        }
+    
+    def __init__(self, base_template: str, variations_count: int = 3, seed: int = 0,
+                 slots: Optional[Dict[str, List[str]]] = None):
+        if variations_count < 1:
+            raise ValueError(f"variations_count must be at least 1, got {variations_count}")
+        self.base_template = base_template
+        self.seed = seed
+        self.active_slots = []  # (name, anchor position, anchor text, options)
+        
+        for name, options in (slots or self.get_default_slots()).items():
+            # Longest phrase first so "\nBest,\nKenneth" wins over "\nKenneth"
+            for phrase in sorted(options, key=len, reverse=True):
+                position = base_template.rfind(phrase)
+                if position != -1:
+                    self.active_slots.append((name, position, phrase, options))
+                    break
+        
+        # Keep slots in template order and drop any whose anchor overlaps another
+        active_slots = []
+        for slot in sorted(self.active_slots, key=lambda slot: slot[1]):
+            if not active_slots or slot[1] >= active_slots[-1][1] + len(active_slots[-1][2]):
+                active_slots.append(slot)
+        self.active_slots = active_slots
+        
+        self.total_variants = 1
+        for _, _, _, options in self.active_slots:
+            self.total_variants *= len(options)
+        
+        count = min(variations_count, self.total_variants)
+        indices = random.Random(seed).sample(range(self.total_variants), count)
+        self.variants = [self.build_variant(index) for index in indices]
+    
+    def build_variant(self, variant_id: int) -> MessageVariant:
+        """
+        Build the variant at a Cartesian-product index (mixed-radix decode)
+        """
+        choices = {}
+        remainder = variant_id
+        for name, _, _, options in reversed(self.active_slots):
+            remainder, option_index = divmod(remainder, len(options))
+            choices[name] = options[option_index]
+        
+        parts = []
+        cursor = 0
+        for name, position, phrase, _ in self.active_slots:
+            parts.append(self.base_template[cursor:position])
+            parts.append(choices[name])
+            cursor = position + len(phrase)
+        parts.append(self.base_template[cursor:])
+        
+        return MessageVariant(variant_id=variant_id, choices=choices, text="".join(parts))
+    
+    def assign(self, prospect_key: str) -> MessageVariant:
+        """
+        Stable variant for a prospect key (the canonical profile_url_hash),
+        identical in every process
+        """
+        digest = hashlib.blake2b(f"{self.seed}:{self.base_template}:{prospect_key}".encode("utf-8"),
+                                 digest_size=8).digest()
+        return self.variants[int.from_bytes(digest, "big") % len(self.variants)]
+
 class LinkedInOutreachManager:
+    # Most characters a truncated message gives up to end on a whole word
+    TRUNCATION_BACKTRACK = 20
+    
     def __init__(self, db_path="linkedin_outreach.db"):
         self.db_path = db_path
         self.init_database()
         self.message_templates = self.load_message_templates()
+        self.compiled_templates: Dict[Tuple[str, Tuple[str, ...]], List[CompiledMessageTemplate]] = {}
+        self.variation_engines: Dict[Tuple[str, int, int], MessageVariationEngine] = {}
     
     def init_database(self):
         conn = sqlite3.connect(self.db_path)
@@ -65,10 +244,33 @@ class LinkedInOutreachManager:
                 current_step INTEGER DEFAULT 0,
                 response_received BOOLEAN DEFAULT FALSE,
                 converted BOOLEAN DEFAULT FALSE,
-                notes TEXT
+                notes TEXT,
+                next_due_at TEXT,
+                sender_account TEXT,
+                profile_url_hash TEXT
             )
         ''')
         
+        # Databases created before these columns existed need them added
+        if self._ensure_column(cursor, 'linkedin_prospects', 'next_due_at', 'TEXT'):
+            self._backfill_next_due_at(cursor)
+        self._ensure_column(cursor, 'linkedin_prospects', 'sender_account', 'TEXT')
+        self._ensure_column(cursor, 'linkedin_prospects', 'profile_url_hash', 'TEXT')
+        self._backfill_profile_url_hashes(cursor)
+        
+        # URL variants of the same profile collapse onto one hash
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_linkedin_prospects_url_hash
+            ON linkedin_prospects (profile_url_hash)
+        ''')
+        
+        # Due-queue lookups only touch prospects with a pending step
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_linkedin_prospects_next_due
+            ON linkedin_prospects (next_due_at)
+            WHERE next_due_at IS NOT NULL
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS linkedin_messages (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,13 +281,103 @@ class LinkedInOutreachManager:
                 response_received BOOLEAN DEFAULT FALSE,
                 response_date TEXT,
                 conversion_achieved BOOLEAN DEFAULT FALSE,
+                sequence_name TEXT,
+                step INTEGER,
+                connection_accepted BOOLEAN DEFAULT FALSE,
                 FOREIGN KEY (prospect_id) REFERENCES linkedin_prospects (id)
             )
         ''')
         
+        self._ensure_column(cursor, 'linkedin_messages', 'sequence_name', 'TEXT')
+        self._ensure_column(cursor, 'linkedin_messages', 'step', 'INTEGER')
+        self._ensure_column(cursor, 'linkedin_messages', 'connection_accepted', 'BOOLEAN DEFAULT FALSE')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_linkedin_messages_prospect_template
+            ON linkedin_messages (prospect_id, template_name)
+        ''')
+        
+        # Funnel counters maintained as messages are logged and outcomes recorded
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS linkedin_funnel_counters (
+                sequence_name TEXT,
+                step INTEGER,
+                template_name TEXT,
+                messages_sent INTEGER DEFAULT 0,
+                connections INTEGER DEFAULT 0,
+                responses INTEGER DEFAULT 0,
+                conversions INTEGER DEFAULT 0,
+                PRIMARY KEY (sequence_name, step, template_name)
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
+    def _ensure_column(self, cursor, table: str, column: str, definition: str) -> bool:
+        """
+        Add a column to an existing table if it is missing; True if it was added
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            return True
+        return False
+    
+    def _backfill_next_due_at(self, cursor):
+        """
+        Schedule the pending step of sequences started before next_due_at
+        existed, from their last contact and the step's delay
+        """
+        sequences = self.load_message_templates()
+        cursor.execute('''
+            SELECT id, sequence_name, current_step, last_contacted FROM linkedin_prospects
+            WHERE sequence_name IS NOT NULL AND response_received IS NOT TRUE
+        ''')
+        
+        updates = []
+        for prospect_id, sequence_name, current_step, last_contacted in cursor.fetchall():
+            sequence = sequences.get(sequence_name, [])
+            try:
+                last_sent = datetime.fromisoformat(last_contacted)
+            except (TypeError, ValueError):
+                last_sent = datetime.now()
+            next_due_at = self._next_due_at(sequence, current_step or 0, last_sent)
+            if next_due_at is not None:
+                updates.append((next_due_at, prospect_id))
+        
+        cursor.executemany('''
+            UPDATE linkedin_prospects SET next_due_at = ? WHERE id = ?
+        ''', updates)
+    
+    def _backfill_profile_url_hashes(self, cursor):
+        """
+        Hash profile URLs of rows stored before profile_url_hash existed
+        """
+        cursor.execute('''
+            SELECT id, profile_url FROM linkedin_prospects WHERE profile_url_hash IS NULL
+        ''')
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        cursor.execute('''
+            SELECT profile_url_hash FROM linkedin_prospects WHERE profile_url_hash IS NOT NULL
+        ''')
+        seen = {row[0] for row in cursor.fetchall()}
+        
+        updates = []
+        for prospect_id, profile_url in rows:
+            url_hash = profile_url_hash(profile_url)
+            # Pre-existing variants of one profile keep a NULL hash after the first
+            if url_hash not in seen:
+                seen.add(url_hash)
+                updates.append((url_hash, prospect_id))
+        
+        cursor.executemany('''
+            UPDATE linkedin_prospects SET profile_url_hash = ? WHERE id = ?
+        ''', updates)
+    
     def load_message_templates(self) -> Dict[str, List[LinkedInMessage]]:
         """
         Load all LinkedIn message template sequences
@@ -112,7 +404,8 @@ class LinkedInOutreachManager:
                 delay_days=0,
                 personalization_fields=["first_name", "company", "industry"],
                 conversion_goal="accept_connection",
-                character_limit=300
+                character_limit=300,
+                fallback_templates=["""Hi {{first_name}}, I help {{industry}} companies automate their revenue processes. Would love to connect!"""]
             ),
             
             LinkedInMessage(
@@ -237,7 +530,8 @@ Kenneth""",
                 delay_days=0,
                 personalization_fields=["first_name", "topic"],
                 conversion_goal="accept_connection",
-                character_limit=300
+                character_limit=300,
+                fallback_templates=["""Hi {{first_name}}, thanks for your comment on my {{topic}} post! Would love to connect."""]
             ),
             
             LinkedInMessage(
@@ -307,7 +601,8 @@ Kenneth""",
                 delay_days=0,
                 personalization_fields=["first_name", "event_name", "topic"],
                 conversion_goal="accept_connection",
-                character_limit=300
+                character_limit=300,
+                fallback_templates=["""Hi {{first_name}}, great meeting you at {{event_name}}! Would love to stay in touch."""]
             ),
             
             LinkedInMessage(
@@ -353,7 +648,8 @@ Kenneth""",
                 delay_days=0,
                 personalization_fields=["first_name", "referrer_name", "industry"],
                 conversion_goal="accept_connection",
-                character_limit=300
+                character_limit=300,
+                fallback_templates=["""Hi {{first_name}}, {{referrer_name}} suggested I reach out. Would love to connect!"""]
             ),
             
             LinkedInMessage(
@@ -383,13 +679,31 @@ Kenneth""",
             )
         ]
     
-    def personalize_message(self, template: LinkedInMessage, prospect: LinkedInProspect, 
-                          additional_data: Optional[Dict] = None) -> str:
+    def get_personalization_defaults(self) -> Dict[str, str]:
         """
-        Personalize LinkedIn message template
+        Default values for common personalization fields
+        """
+        return {
+            'similar_company': 'TechCorp Solutions',
+            'similar_title': 'VP of Sales',
+            'case_study_company': 'GrowthMax Inc',
+            'referrer_name': 'John Smith',
+            'referrer_company': 'InnovateNow',
+            'event_name': 'Revenue Automation Summit',
+            'topic': 'revenue automation',
+            'process': 'lead qualification',
+            'template_name': 'Sales Automation Template',
+            'checklist_name': 'Revenue Optimization Checklist',
+            'result_1': '40% increase in qualified leads',
+            'result_2': '25% reduction in sales cycle',
+            'result_3': '$500K additional revenue'
+        }
+    
+    def get_personalization_values(self, prospect: LinkedInProspect,
+                                   additional_data: Optional[Dict] = None) -> Dict[str, str]:
+        """
+        Merge defaults, prospect fields and additional data into string values
         """
-        message_template = template.message_template
-        
         # Base personalization data from prospect
         template_data = {
             'first_name': prospect.first_name,
@@ -405,39 +719,88 @@ Kenneth""",
         if additional_data:
             template_data.update(additional_data)
         
-        # Add default values for common fields
-        defaults = {
-            'similar_company': 'TechCorp Solutions',
-            'similar_title': 'VP of Sales',
-            'case_study_company': 'GrowthMax Inc',
-            'referrer_name': 'John Smith',
-            'referrer_company': 'InnovateNow',
-            'event_name': 'Revenue Automation Summit',
-            'topic': 'revenue automation',
-            'process': 'lead qualification',
-            'template_name': 'Sales Automation Template',
-            'checklist_name': 'Revenue Optimization Checklist',
-            'result_1': '40% increase in qualified leads',
-            'result_2': '25% reduction in sales cycle',
-            'result_3': '$500K additional revenue'
-        }
+        final_data = {**self.get_personalization_defaults(), **template_data}
+        return {key: str(value) for key, value in final_data.items()}
+    
+    def compile_template(self, template: LinkedInMessage) -> List[CompiledMessageTemplate]:
+        """
+        Compiled primary template followed by its fallbacks, cached per template text
+        """
+        key = (template.message_template, tuple(template.fallback_templates))
+        compiled = self.compiled_templates.get(key)
+        if compiled is None:
+            compiled = [CompiledMessageTemplate(text)
+                        for text in [template.message_template, *template.fallback_templates]]
+            self.compiled_templates[key] = compiled
+        return compiled
+    
+    def render_message(self, template: LinkedInMessage,
+                       values: Dict[str, str]) -> Tuple[str, str]:
+        """
+        Render the first variant that fits the character limit.
+
+        Returns the message and how it was produced: "full", "fallback" or
+        "truncated" when no variant fits and the shortest one is cut at a
+        nearby word boundary, or at the limit itself when there is none.
+        """
+        variants = self.compile_template(template)
+        lengths = [variant.rendered_length(values) for variant in variants]
         
-        # Merge all data
-        final_data = {**defaults, **template_data}
+        for index, length in enumerate(lengths):
+            if length <= template.character_limit:
+                return variants[index].render(values), "full" if index == 0 else "fallback"
         
-        # Simple placeholder replacement
-        personalized_message = message_template
-        for key, value in final_data.items():
-            placeholder = "{{" + key + "}}"
-            if placeholder in personalized_message:
-                personalized_message = personalized_message.replace(placeholder, str(value))
+        shortest = variants[lengths.index(min(lengths))].render(values)
+        cut = shortest[:template.character_limit - 3]
+        # Back up to a word boundary only when it costs a few characters; a
+        # long unbroken field would otherwise collapse the message to "Hi..."
+        boundary = cut.rfind(" ")
+        if boundary > 0 and boundary >= len(cut) - self.TRUNCATION_BACKTRACK:
+            cut = cut[:boundary].rstrip(" ,.;:-")
+        return cut + "...", "truncated"
+    
+    def personalize_message(self, template: LinkedInMessage, prospect: LinkedInProspect, 
+                          additional_data: Optional[Dict] = None) -> str:
+        """
+        Personalize LinkedIn message template
+        """
+        values = self.get_personalization_values(prospect, additional_data)
+        message, _ = self.render_message(template, values)
+        return message
+    
+    def get_truncation_report(self, batch: List[Tuple[LinkedInMessage, LinkedInProspect]],
+                              additional_data: Optional[Dict] = None) -> Dict:
+        """
+        Share of a batch that would need a fallback or truncation, from lengths only
+        """
+        per_template: Dict[str, Dict[str, int]] = {}
+        
+        for template, prospect in batch:
+            values = self.get_personalization_values(prospect, additional_data)
+            lengths = [variant.rendered_length(values) for variant in self.compile_template(template)]
+            
+            if lengths[0] <= template.character_limit:
+                outcome = "full"
+            elif min(lengths) <= template.character_limit:
+                outcome = "fallback"
+            else:
+                outcome = "truncated"
+            
+            stats = per_template.setdefault(template.template_name,
+                                            {"messages": 0, "full": 0, "fallback": 0, "truncated": 0})
+            stats["messages"] += 1
+            stats[outcome] += 1
         
-        # Ensure message stays within character limit
-        if len(personalized_message) > template.character_limit:
-            # Truncate and add ellipsis
-            personalized_message = personalized_message[:template.character_limit-3] + "..."
+        total = sum(stats["messages"] for stats in per_template.values())
+        fallback = sum(stats["fallback"] for stats in per_template.values())
+        truncated = sum(stats["truncated"] for stats in per_template.values())
         
-        return personalized_message
+        return {
+            'total_messages': total,
+            'fallback_rate': round((fallback / total) * 100, 2) if total > 0 else 0,
+            'truncation_rate': round((truncated / total) * 100, 2) if total > 0 else 0,
+            'by_template': per_template
+        }
     
     def add_prospect(self, prospect: LinkedInProspect) -> int:
         """
@@ -450,12 +813,13 @@ Kenneth""",
             cursor.execute('''
                 INSERT INTO linkedin_prospects
                 (profile_url, first_name, last_name, title, company, industry, 
-                 location, mutual_connections, connection_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 location, mutual_connections, connection_status, profile_url_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 prospect.profile_url, prospect.first_name, prospect.last_name,
                 prospect.title, prospect.company, prospect.industry,
-                prospect.location, prospect.mutual_connections, prospect.connection_status
+                prospect.location, prospect.mutual_connections, prospect.connection_status,
+                profile_url_hash(prospect.profile_url)
             ))
             conn.commit()
             return cursor.lastrowid
@@ -464,19 +828,128 @@ Kenneth""",
         finally:
             conn.close()
     
+    def _read_export_records(self, file_path: str):
+        """
+        Stream records from a CSV or JSONL export
+        """
+        with open(file_path, newline="", encoding="utf-8") as export_file:
+            if file_path.lower().endswith((".jsonl", ".ndjson")):
+                for line in export_file:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(export_file)
+    
+    def import_prospects(self, file_path: str, chunk_size: int = 5000) -> Dict:
+        """
+        Bulk import prospects from a CSV or JSONL export.
+
+        Profile URLs are canonicalized and deduped in memory and against the
+        database through the profile_url_hash index; each chunk is written in
+        its own transaction.
+        """
+        started = time.perf_counter()
+        seen_hashes = set()
+        summary = {
+            'rows_read': 0,
+            'invalid_rows': 0,
+            'duplicates_in_file': 0,
+            'duplicates_in_db': 0,
+            'inserted': 0,
+            'chunks': []
+        }
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        def flush(chunk: List[tuple]):
+            chunk_started = time.perf_counter()
+            changes_before = conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO linkedin_prospects
+                (profile_url, first_name, last_name, title, company, industry,
+                 location, mutual_connections, connection_status, profile_url_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+            conn.commit()
+            
+            inserted = conn.total_changes - changes_before
+            seconds = time.perf_counter() - chunk_started
+            summary['inserted'] += inserted
+            summary['duplicates_in_db'] += len(chunk) - inserted
+            summary['chunks'].append({
+                'chunk': len(summary['chunks']) + 1,
+                'rows': len(chunk),
+                'inserted': inserted,
+                'seconds': round(seconds, 4),
+                'rows_per_second': round(len(chunk) / seconds) if seconds > 0 else len(chunk)
+            })
+        
+        chunk = []
+        for record in self._read_export_records(file_path):
+            summary['rows_read'] += 1
+            
+            raw_url = record.get('profile_url') or record.get('linkedin_url') or record.get('url') or ""
+            canonical_url = canonicalize_profile_url(raw_url)
+            if not canonical_url:
+                summary['invalid_rows'] += 1
+                continue
+            
+            url_hash = profile_url_hash(canonical_url, canonical=True)
+            if url_hash in seen_hashes:
+                summary['duplicates_in_file'] += 1
+                continue
+            seen_hashes.add(url_hash)
+            
+            try:
+                mutual_connections = int(record.get('mutual_connections') or 0)
+            except (TypeError, ValueError):
+                mutual_connections = 0
+            
+            chunk.append((
+                canonical_url,
+                record.get('first_name', ''),
+                record.get('last_name', ''),
+                record.get('title', ''),
+                record.get('company', ''),
+                record.get('industry', ''),
+                record.get('location', ''),
+                mutual_connections,
+                record.get('connection_status') or 'not_connected',
+                url_hash
+            ))
+            
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        
+        if chunk:
+            flush(chunk)
+        
+        conn.close()
+        
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['rows_read'] / elapsed) if elapsed > 0 else summary['rows_read']
+        return summary
+    
     def start_outreach_sequence(self, prospect_id: int, sequence_name: str, 
                               additional_data: Optional[Dict] = None):
         """
         Start LinkedIn outreach sequence for a prospect
         """
+        started_at = datetime.now()
+        sequence = self.message_templates.get(sequence_name, [])
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
             UPDATE linkedin_prospects 
-            SET sequence_name = ?, current_step = 0, last_contacted = ?
+            SET sequence_name = ?, current_step = 0, last_contacted = ?, next_due_at = ?
             WHERE id = ?
-        ''', (sequence_name, datetime.now().isoformat(), prospect_id))
+        ''', (sequence_name, started_at.isoformat(),
+              self._next_due_at(sequence, 0, started_at), prospect_id))
         
         conn.commit()
         conn.close()
@@ -484,11 +957,38 @@ Kenneth""",
         # Send first message
         self.send_next_message(prospect_id, additional_data)
     
+    def _next_due_at(self, sequence: List[LinkedInMessage], step: int,
+                     last_sent: datetime) -> Optional[str]:
+        """
+        Due date for a sequence step, or None once the sequence is finished
+        """
+        if step >= len(sequence):
+            return None
+        return (last_sent + timedelta(days=sequence[step].delay_days)).isoformat()
+    
+    def _row_to_prospect(self, row: sqlite3.Row) -> LinkedInProspect:
+        """
+        Build a LinkedInProspect from a named linkedin_prospects row
+        """
+        return LinkedInProspect(
+            profile_url=row['profile_url'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            title=row['title'],
+            company=row['company'],
+            industry=row['industry'],
+            location=row['location'],
+            mutual_connections=row['mutual_connections'],
+            recent_activity=[],
+            pain_points=['efficiency', 'growth', 'automation']
+        )
+    
     def send_next_message(self, prospect_id: int, additional_data: Optional[Dict] = None):
         """
         Send the next message in the outreach sequence
         """
         conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -497,12 +997,14 @@ Kenneth""",
         
         prospect_data = cursor.fetchone()
         if not prospect_data:
+            conn.close()
             return False
         
-        sequence_name = prospect_data[9]  # sequence_name column
-        current_step = prospect_data[10]  # current_step column
+        sequence_name = prospect_data['sequence_name']
+        current_step = prospect_data['current_step']
         
         if sequence_name not in self.message_templates:
+            conn.close()
             return False
         
         sequence = self.message_templates[sequence_name]
@@ -511,7 +1013,7 @@ Kenneth""",
             # Sequence completed
             cursor.execute('''
                 UPDATE linkedin_prospects 
-                SET current_step = ?
+                SET current_step = ?, next_due_at = NULL
                 WHERE id = ?
             ''', (current_step, prospect_id))
             conn.commit()
@@ -521,34 +1023,29 @@ Kenneth""",
         template = sequence[current_step]
         
         # Create prospect object for personalization
-        prospect = LinkedInProspect(
-            profile_url=prospect_data[1],
-            first_name=prospect_data[2],
-            last_name=prospect_data[3],
-            title=prospect_data[4],
-            company=prospect_data[5],
-            industry=prospect_data[6],
-            location=prospect_data[7],
-            mutual_connections=prospect_data[8],
-            recent_activity=[],
-            pain_points=['efficiency', 'growth', 'automation']
-        )
+        prospect = self._row_to_prospect(prospect_data)
         
         personalized_message = self.personalize_message(template, prospect, additional_data)
+        sent_at = datetime.now()
         
         # Log the message
         cursor.execute('''
             INSERT INTO linkedin_messages
-            (prospect_id, template_name, message_type, sent_date)
-            VALUES (?, ?, ?, ?)
-        ''', (prospect_id, template.template_name, template.message_type, datetime.now().isoformat()))
+            (prospect_id, template_name, message_type, sent_date, sequence_name, step)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (prospect_id, template.template_name, template.message_type, sent_at.isoformat(),
+              sequence_name, current_step))
+        
+        self._bump_funnel_counters(cursor, {(sequence_name, current_step, template.template_name): 1},
+                                   'messages_sent')
         
         # Update prospect progress
         cursor.execute('''
             UPDATE linkedin_prospects 
-            SET current_step = ?, last_contacted = ?
+            SET current_step = ?, last_contacted = ?, next_due_at = ?
             WHERE id = ?
-        ''', (current_step + 1, datetime.now().isoformat(), prospect_id))
+        ''', (current_step + 1, sent_at.isoformat(),
+              self._next_due_at(sequence, current_step + 1, sent_at), prospect_id))
         
         conn.commit()
         conn.close()
@@ -560,6 +1057,106 @@ Kenneth""",
         
         return True
     
+    def send_due_messages(self, as_of: Optional[datetime] = None,
+                          additional_data: Optional[Dict] = None) -> List[Dict]:
+        """
+        Build the queue of every message due across all sequences.
+
+        Due prospects are selected in one query on the next_due_at index, all
+        messages are logged with executemany and every prospect advances to its
+        next step in the same transaction.
+        """
+        sent_at = as_of or datetime.now()
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        rows = self._select_due_rows(cursor, sent_at)
+        queue = self._dispatch_due_rows(cursor, rows, sent_at, additional_data)
+        
+        conn.commit()
+        conn.close()
+        
+        return queue
+    
+    def _select_due_rows(self, cursor, as_of: datetime) -> List[sqlite3.Row]:
+        """
+        Fetch every prospect whose next step is due, oldest first
+        """
+        cursor.execute('''
+            SELECT id, profile_url, first_name, last_name, title, company, industry,
+                   location, mutual_connections, sequence_name, current_step,
+                   sender_account
+            FROM linkedin_prospects
+            WHERE next_due_at IS NOT NULL AND next_due_at <= ?
+            ORDER BY next_due_at
+        ''', (as_of.isoformat(),))
+        return cursor.fetchall()
+    
+    def _next_template(self, row: sqlite3.Row) -> Optional[LinkedInMessage]:
+        """
+        Template for a prospect's current step, or None if nothing is left to send
+        """
+        sequence = self.message_templates.get(row['sequence_name'])
+        if not sequence or row['current_step'] >= len(sequence):
+            return None
+        return sequence[row['current_step']]
+    
+    def _dispatch_due_rows(self, cursor, rows: List[sqlite3.Row], sent_at: datetime,
+                           additional_data: Optional[Dict] = None) -> List[Dict]:
+        """
+        Render, log and advance a batch of due prospects without committing
+        """
+        sent_date = sent_at.isoformat()
+        queue = []
+        message_rows = []
+        progress_rows = []
+        sent_counts: Dict[Tuple[str, int, str], int] = {}
+        
+        for row in rows:
+            current_step = row['current_step']
+            template = self._next_template(row)
+            
+            if template is None:
+                # Nothing left to send; drop the prospect from the due index
+                progress_rows.append((current_step, None, None, row['id']))
+                continue
+            
+            sequence = self.message_templates[row['sequence_name']]
+            message = self.personalize_message(template, self._row_to_prospect(row), additional_data)
+            
+            queue.append({
+                'prospect_id': row['id'],
+                'sequence_name': row['sequence_name'],
+                'step': current_step,
+                'template_name': template.template_name,
+                'message_type': template.message_type,
+                'message': message
+            })
+            message_rows.append((row['id'], template.template_name, template.message_type, sent_date,
+                                 row['sequence_name'], current_step))
+            counter_key = (row['sequence_name'], current_step, template.template_name)
+            sent_counts[counter_key] = sent_counts.get(counter_key, 0) + 1
+            progress_rows.append((current_step + 1, sent_date,
+                                  self._next_due_at(sequence, current_step + 1, sent_at), row['id']))
+        
+        cursor.executemany('''
+            INSERT INTO linkedin_messages
+            (prospect_id, template_name, message_type, sent_date, sequence_name, step)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', message_rows)
+        
+        self._bump_funnel_counters(cursor, sent_counts, 'messages_sent')
+        
+        cursor.executemany('''
+            UPDATE linkedin_prospects
+            SET current_step = ?, last_contacted = COALESCE(?, last_contacted), next_due_at = ?
+            WHERE id = ?
+        ''', progress_rows)
+        
+        return queue
+    
     def get_outreach_metrics(self) -> Dict:
         """
         Get LinkedIn outreach performance metrics
@@ -590,39 +1187,564 @@ Kenneth""",
         
         return {'total_prospects': 0}
     
-    def generate_message_variations(self, base_template: str, variations_count: int = 3) -> List[str]:
+    def _bump_funnel_counters(self, cursor, increments: Dict[Tuple[str, int, str], int], column: str):
         """
-        Generate A/B test variations of LinkedIn messages
+        Add to one funnel counter column for each (sequence, step, template) key
         """
-        variations = []
+        if column not in ('messages_sent', 'connections', 'responses', 'conversions'):
+            raise ValueError(f"Unknown funnel counter {column}")
         
-        # Different opening variations
-        openings = [
-            "Hi {{first_name}},",
-            "Hello {{first_name}},",
-            "Hey {{first_name}},",
-            "{{first_name}},"
-        ]
+        cursor.executemany(f'''
+            INSERT INTO linkedin_funnel_counters (sequence_name, step, template_name, {column})
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (sequence_name, step, template_name)
+            DO UPDATE SET {column} = {column} + excluded.{column}
+        ''', [(sequence_name, step, template_name, count)
+              for (sequence_name, step, template_name), count in increments.items()
+              if sequence_name is not None and count])
+    
+    def _record_message_outcome(self, prospect_id: int, flag_column: str, counter_column: str,
+                                message_type: Optional[str] = None,
+                                prospect_updates: str = "", timestamp_column: Optional[str] = None) -> bool:
+        """
+        Flag the prospect's latest message and bump its funnel counter once
+        """
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
         
-        # Different closing variations
-        closings = [
-            "Best regards,\nKenneth",
-            "Best,\nKenneth",
-            "Cheers,\nKenneth",
-            "Thanks,\nKenneth"
-        ]
+        type_filter = "AND message_type = ?" if message_type else ""
+        params = (prospect_id, message_type) if message_type else (prospect_id,)
+        cursor.execute(f'''
+            SELECT id, sequence_name, step, template_name, {flag_column} AS flagged
+            FROM linkedin_messages
+            WHERE prospect_id = ? {type_filter}
+            ORDER BY id DESC LIMIT 1
+        ''', params)
+        message = cursor.fetchone()
+        
+        if not message or message['flagged']:
+            conn.close()
+            return False
+        
+        timestamp_update = f", {timestamp_column} = ?" if timestamp_column else ""
+        timestamp_params = (datetime.now().isoformat(),) if timestamp_column else ()
+        cursor.execute(f'''
+            UPDATE linkedin_messages SET {flag_column} = TRUE{timestamp_update} WHERE id = ?
+        ''', timestamp_params + (message['id'],))
+        
+        if prospect_updates:
+            cursor.execute(f'''
+                UPDATE linkedin_prospects SET {prospect_updates} WHERE id = ?
+            ''', (prospect_id,))
         
-        for i in range(variations_count):
-            opening = random.choice(openings)
-            closing = random.choice(closings)
+        self._bump_funnel_counters(
+            cursor, {(message['sequence_name'], message['step'], message['template_name']): 1}, counter_column
+        )
+        
+        conn.commit()
+        conn.close()
+        return True
+    
+    def record_connection_accepted(self, prospect_id: int) -> bool:
+        """
+        Record that a prospect accepted our connection request
+        """
+        return self._record_message_outcome(
+            prospect_id, 'connection_accepted', 'connections', message_type='connection_request',
+            prospect_updates="connection_status = 'connected'"
+        )
+    
+    def record_response(self, prospect_id: int) -> bool:
+        """
+        Record a reply to the prospect's latest message and stop their sequence
+        """
+        return self._record_message_outcome(
+            prospect_id, 'response_received', 'responses',
+            prospect_updates="response_received = TRUE, next_due_at = NULL",
+            timestamp_column='response_date'
+        )
+    
+    def record_conversion(self, prospect_id: int) -> bool:
+        """
+        Record that a prospect converted, credited to their latest message
+        """
+        return self._record_message_outcome(
+            prospect_id, 'conversion_achieved', 'conversions',
+            prospect_updates="converted = TRUE"
+        )
+    
+    def sync_outreach_export(self, file_path: str, event_type: Optional[str] = None) -> Dict:
+        """
+        Apply an export of accepted connections and/or replies in one transaction.
+
+        Rows are staged into a temp table keyed by canonical profile URL hash and
+        applied with set-based UPDATEs. event_type ("accepted" or "replied")
+        applies to every row, otherwise each row's event_type column is used.
+        Prospects who replied have their sequence stopped.
+        """
+        started = time.perf_counter()
+        summary = {'rows_read': 0, 'invalid_rows': 0}
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            
+            cursor.execute('''
+                CREATE TEMP TABLE sync_events (
+                    profile_url_hash TEXT,
+                    event_type TEXT,
+                    event_date TEXT
+                )
+            ''')
+            
+            def staged_rows():
+                now = datetime.now().isoformat()
+                for record in self._read_export_records(file_path):
+                    summary['rows_read'] += 1
+                    row_event = event_type or record.get('event_type')
+                    raw_url = record.get('profile_url') or record.get('linkedin_url') or record.get('url') or ""
+                    canonical_url = canonicalize_profile_url(raw_url)
+                    if row_event not in ('accepted', 'replied') or not canonical_url:
+                        summary['invalid_rows'] += 1
+                        continue
+                    event_date = (record.get('event_date') or record.get('accepted_at')
+                                  or record.get('replied_at') or now)
+                    yield (profile_url_hash(canonical_url, canonical=True), row_event, event_date)
+            
+            cursor.executemany('''
+                INSERT INTO sync_events (profile_url_hash, event_type, event_date) VALUES (?, ?, ?)
+            ''', staged_rows())
+            
+            # Resolve each (prospect, event) once, keeping the earliest event date
+            cursor.execute('''
+                CREATE TEMP TABLE sync_matches (
+                    prospect_id INTEGER,
+                    event_type TEXT,
+                    event_date TEXT
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO sync_matches (prospect_id, event_type, event_date)
+                SELECT p.id, e.event_type, MIN(e.event_date)
+                FROM sync_events e
+                JOIN linkedin_prospects p ON p.profile_url_hash = e.profile_url_hash
+                GROUP BY p.id, e.event_type
+            ''')
+            cursor.execute('CREATE INDEX temp.idx_sync_matches ON sync_matches (event_type, prospect_id)')
+            
+            # Target message per prospect: latest connection request / latest message
+            cursor.execute('''
+                CREATE TEMP TABLE sync_targets (
+                    message_id INTEGER,
+                    event_type TEXT,
+                    event_date TEXT
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO sync_targets (message_id, event_type, event_date)
+                SELECT MAX(m.id), s.event_type, s.event_date
+                FROM sync_matches s
+                JOIN linkedin_messages m ON m.prospect_id = s.prospect_id
+                WHERE s.event_type = 'replied'
+                   OR (s.event_type = 'accepted' AND m.message_type = 'connection_request')
+                GROUP BY s.prospect_id, s.event_type
+            ''')
+            cursor.execute('''
+                DELETE FROM sync_targets
+                WHERE rowid IN (
+                    SELECT t.rowid FROM sync_targets t
+                    JOIN linkedin_messages m ON m.id = t.message_id
+                    WHERE (t.event_type = 'accepted' AND m.connection_accepted)
+                       OR (t.event_type = 'replied' AND m.response_received)
+                )
+            ''')
+            cursor.execute('CREATE INDEX temp.idx_sync_targets ON sync_targets (message_id)')
+            
+            for sync_event, counter_column in (('accepted', 'connections'), ('replied', 'responses')):
+                cursor.execute(f'''
+                    INSERT INTO linkedin_funnel_counters (sequence_name, step, template_name, {counter_column})
+                    SELECT m.sequence_name, m.step, m.template_name, COUNT(*)
+                    FROM sync_targets t
+                    JOIN linkedin_messages m ON m.id = t.message_id
+                    WHERE t.event_type = ? AND m.sequence_name IS NOT NULL
+                    GROUP BY m.sequence_name, m.step, m.template_name
+                    ON CONFLICT (sequence_name, step, template_name)
+                    DO UPDATE SET {counter_column} = {counter_column} + excluded.{counter_column}
+                ''', (sync_event,))
+            
+            cursor.execute('''
+                UPDATE linkedin_messages SET connection_accepted = TRUE
+                WHERE id IN (SELECT message_id FROM sync_targets WHERE event_type = 'accepted')
+            ''')
+            summary['connections_recorded'] = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE linkedin_messages
+                SET response_received = TRUE,
+                    response_date = (SELECT event_date FROM sync_targets t
+                                     WHERE t.message_id = linkedin_messages.id AND t.event_type = 'replied')
+                WHERE id IN (SELECT message_id FROM sync_targets WHERE event_type = 'replied')
+            ''')
+            summary['responses_recorded'] = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE linkedin_prospects SET connection_status = 'connected'
+                WHERE id IN (SELECT prospect_id FROM sync_matches WHERE event_type = 'accepted')
+                  AND connection_status IS NOT 'connected'
+            ''')
+            summary['prospects_connected'] = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE linkedin_prospects SET response_received = TRUE, next_due_at = NULL
+                WHERE id IN (SELECT prospect_id FROM sync_matches WHERE event_type = 'replied')
+                  AND (next_due_at IS NOT NULL OR response_received IS NOT TRUE)
+            ''')
+            summary['sequences_stopped'] = cursor.rowcount
             
-            # Replace opening and closing in base template
-            variation = base_template.replace("Hi {{first_name}},", opening)
-            variation = variation.replace("Kenneth", closing.split('\n')[1])
+            cursor.execute('SELECT COUNT(DISTINCT prospect_id) FROM sync_matches')
+            summary['matched_prospects'] = cursor.fetchone()[0]
             
-            variations.append(variation)
+            conn.commit()
+            cursor.execute('DROP TABLE temp.sync_events')
+            cursor.execute('DROP TABLE temp.sync_matches')
+            cursor.execute('DROP TABLE temp.sync_targets')
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['rows_read'] / elapsed) if elapsed > 0 else summary['rows_read']
+        return summary
+    
+    def rebuild_funnel_counters(self):
+        """
+        Recompute funnel counters from linkedin_messages (one-off maintenance scan)
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM linkedin_funnel_counters')
+        cursor.execute('''
+            INSERT INTO linkedin_funnel_counters
+            (sequence_name, step, template_name, messages_sent, connections, responses, conversions)
+            SELECT sequence_name, step, template_name, COUNT(*),
+                   COUNT(CASE WHEN connection_accepted = TRUE THEN 1 END),
+                   COUNT(CASE WHEN response_received = TRUE THEN 1 END),
+                   COUNT(CASE WHEN conversion_achieved = TRUE THEN 1 END)
+            FROM linkedin_messages
+            WHERE sequence_name IS NOT NULL
+            GROUP BY sequence_name, step, template_name
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    def _funnel_rates(self, sent: int, connections: int, responses: int, conversions: int) -> Dict:
+        return {
+            'messages_sent': sent,
+            'connections': connections,
+            'responses': responses,
+            'conversions': conversions,
+            'connection_rate': round((connections / sent) * 100, 2) if sent > 0 else 0,
+            'response_rate': round((responses / sent) * 100, 2) if sent > 0 else 0,
+            'conversion_rate': round((conversions / sent) * 100, 2) if sent > 0 else 0
+        }
+    
+    def get_sequence_funnel(self, sequence_name: str) -> List[Dict]:
+        """
+        Per-step funnel for a sequence, read from the maintained counters
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT step, template_name, messages_sent, connections, responses, conversions
+            FROM linkedin_funnel_counters
+            WHERE sequence_name = ?
+            ORDER BY step
+        ''', (sequence_name,))
         
-        return variations
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {'step': step, 'template_name': template_name,
+             **self._funnel_rates(sent, connections, responses, conversions)}
+            for step, template_name, sent, connections, responses, conversions in rows
+        ]
+    
+    def get_template_metrics(self) -> Dict[str, Dict]:
+        """
+        Funnel rates per template across all sequences
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT template_name, SUM(messages_sent), SUM(connections), SUM(responses), SUM(conversions)
+            FROM linkedin_funnel_counters
+            GROUP BY template_name
+        ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            template_name: self._funnel_rates(sent, connections, responses, conversions)
+            for template_name, sent, connections, responses, conversions in rows
+        }
+    
+    def get_variation_engine(self, base_template: str, variations_count: int = 3,
+                             seed: int = 0) -> "MessageVariationEngine":
+        """
+        Cached variation engine for a base template, count and seed
+        """
+        key = (base_template, variations_count, seed)
+        engine = self.variation_engines.get(key)
+        if engine is None:
+            engine = MessageVariationEngine(base_template, variations_count, seed)
+            self.variation_engines[key] = engine
+        return engine
+    
+    def generate_message_variations(self, base_template: str, variations_count: int = 3,
+                                    seed: int = 0) -> List[str]:
+        """
+        Generate A/B test variations of LinkedIn messages
+        """
+        return [variant.text for variant in self.get_variation_engine(base_template, variations_count, seed).variants]
+    
+    def personalize_variant(self, template: LinkedInMessage, prospect: LinkedInProspect,
+                            variations_count: int = 3, seed: int = 0,
+                            additional_data: Optional[Dict] = None) -> Tuple[int, str]:
+        """
+        Render the A/B variant a prospect is assigned to by stable hash
+        """
+        engine = self.get_variation_engine(template.message_template, variations_count, seed)
+        # URL variants of one profile must land on the same variant
+        variant = engine.assign(profile_url_hash(prospect.profile_url))
+        variant_template = replace(template, message_template=variant.text)
+        message, _ = self.render_message(variant_template, self.get_personalization_values(prospect, additional_data))
+        return variant.variant_id, message
+
+@dataclass
+class SenderAccount:
+    account_id: str
+    daily_limits: Dict[str, int]  # message_type -> max messages per day
+
+class SenderQuotaScheduler:
+    """
+    Spread the daily due queue across several LinkedIn sender accounts
+    without exceeding any account's per-message-type daily limit
+    """
+    
+    def __init__(self, manager: LinkedInOutreachManager, accounts: List[SenderAccount]):
+        self.manager = manager
+        self.db_path = manager.db_path
+        self.accounts = {account.account_id: account for account in accounts}
+        self.init_database()
+    
+    def init_database(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS linkedin_sender_usage (
+                account_id TEXT,
+                usage_date TEXT,
+                message_type TEXT,
+                sent_count INTEGER DEFAULT 0,
+                PRIMARY KEY (account_id, usage_date, message_type)
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def get_default_daily_limits() -> Dict[str, int]:
+        """
+        Conservative per-account daily limits for each message type
+        """
+        return {
+            "connection_request": 20,
+            "first_message": 50,
+            "follow_up": 50
+        }
+    
+    def get_remaining_quota(self, cursor, usage_date: str) -> Dict[str, Dict[str, int]]:
+        """
+        Remaining messages per account and message type for a day
+        """
+        cursor.execute('''
+            SELECT account_id, message_type, sent_count
+            FROM linkedin_sender_usage
+            WHERE usage_date = ?
+        ''', (usage_date,))
+        used = {(account_id, message_type): count for account_id, message_type, count in cursor.fetchall()}
+        
+        return {
+            account_id: {
+                message_type: max(0, limit - used.get((account_id, message_type), 0))
+                for message_type, limit in account.daily_limits.items()
+            }
+            for account_id, account in self.accounts.items()
+        }
+    
+    @staticmethod
+    def _water_fill(remaining: Dict[str, int], count: int) -> Dict[str, int]:
+        """
+        Split count messages across accounts, leveling their leftover capacity
+        """
+        if count >= sum(remaining.values()):
+            return dict(remaining)
+        
+        # Largest level L such that the capacity above L still covers count
+        low, high = 0, max(remaining.values())
+        while low < high:
+            level = (low + high + 1) // 2
+            if sum(max(0, left - level) for left in remaining.values()) >= count:
+                low = level
+            else:
+                high = level - 1
+        
+        allocation = {account_id: max(0, left - low - 1) for account_id, left in remaining.items()}
+        extra = count - sum(allocation.values())
+        for account_id, left in remaining.items():
+            if extra == 0:
+                break
+            if left > low:
+                allocation[account_id] += 1
+                extra -= 1
+        
+        return allocation
+    
+    def schedule_day(self, as_of: Optional[datetime] = None,
+                     additional_data: Optional[Dict] = None) -> Dict:
+        """
+        Assign the due queue to sender accounts and dispatch what fits today's quota.
+
+        Prospects keep the account that sent their first message. Unassigned
+        prospects are packed into the capacity left after sticky traffic, per
+        message type, so the number of messages sent is maximized. Anything that
+        does not fit stays due and is picked up by the next run.
+        """
+        sent_at = as_of or datetime.now()
+        usage_date = sent_at.date().isoformat()
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        # Lock before reading usage so concurrent schedulers cannot spend the same quota
+        cursor.execute('BEGIN IMMEDIATE')
+        remaining = self.get_remaining_quota(cursor, usage_date)
+        
+        # Bucket due prospects by message type, sticky ones by their account
+        finished = []
+        sticky: Dict[Tuple[str, str], List[sqlite3.Row]] = {}
+        unassigned: Dict[str, List[sqlite3.Row]] = {}
+        for row in self.manager._select_due_rows(cursor, sent_at):
+            template = self.manager._next_template(row)
+            if template is None:
+                finished.append(row)
+            elif row['sender_account'] in self.accounts:
+                sticky.setdefault((row['sender_account'], template.message_type), []).append(row)
+            else:
+                unassigned.setdefault(template.message_type, []).append(row)
+        
+        assignments = {}
+        deferred = 0
+        
+        for (account_id, message_type), rows in sticky.items():
+            left = remaining[account_id].get(message_type, 0)
+            for row in rows[:left]:
+                assignments[row['id']] = account_id
+            remaining[account_id][message_type] = max(0, left - len(rows))
+            deferred += max(0, len(rows) - left)
+        
+        for message_type, rows in unassigned.items():
+            capacity = {account_id: quota.get(message_type, 0) for account_id, quota in remaining.items()}
+            offset = 0
+            for account_id, take in self._water_fill(capacity, len(rows)).items():
+                for row in rows[offset:offset + take]:
+                    assignments[row['id']] = account_id
+                remaining[account_id][message_type] = capacity[account_id] - take
+                offset += take
+            deferred += len(rows) - offset
+        
+        dispatch_rows = finished + [row for rows in sticky.values() for row in rows if row['id'] in assignments]
+        dispatch_rows += [row for rows in unassigned.values() for row in rows if row['id'] in assignments]
+        queue = self.manager._dispatch_due_rows(cursor, dispatch_rows, sent_at, additional_data)
+        
+        usage = {}
+        for item in queue:
+            item['sender_account'] = assignments[item['prospect_id']]
+            key = (item['sender_account'], item['message_type'])
+            usage[key] = usage.get(key, 0) + 1
+        
+        cursor.executemany('''
+            UPDATE linkedin_prospects SET sender_account = ? WHERE id = ?
+        ''', [(account_id, prospect_id) for prospect_id, account_id in assignments.items()])
+        
+        cursor.executemany('''
+            INSERT INTO linkedin_sender_usage (account_id, usage_date, message_type, sent_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (account_id, usage_date, message_type)
+            DO UPDATE SET sent_count = sent_count + excluded.sent_count
+        ''', [(account_id, usage_date, message_type, count)
+              for (account_id, message_type), count in usage.items()])
+        
+        conn.commit()
+        conn.close()
+        
+        return {
+            'queue': queue,
+            'scheduled': len(queue),
+            'deferred': deferred,
+            'remaining_quota': remaining
+        }
+
+def benchmark_response_sync(db_path: str = "linkedin_sync_benchmark.db", rows: int = 500000) -> Dict:
+    """
+    Build a fixture of prospects with sent connection requests and time
+    sync_outreach_export on a mixed accepted/replied export of the given size
+    """
+    export_path = db_path + ".jsonl"
+    manager = LinkedInOutreachManager(db_path)
+    sent_date = datetime.now().isoformat()
+    
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT OR IGNORE INTO linkedin_prospects
+        (profile_url, first_name, last_name, connection_status, sequence_name,
+         current_step, next_due_at, profile_url_hash)
+        VALUES (?, 'Bench', 'Prospect', 'not_connected', 'cold_connection', 1, ?, ?)
+    ''', ((f"linkedin.com/in/bench-{i}", sent_date, profile_url_hash(f"linkedin.com/in/bench-{i}"))
+          for i in range(rows)))
+    conn.execute('''
+        INSERT INTO linkedin_messages
+        (prospect_id, template_name, message_type, sent_date, sequence_name, step)
+        SELECT id, 'cold_connection_request', 'connection_request', ?, 'cold_connection', 0
+        FROM linkedin_prospects WHERE profile_url LIKE 'linkedin.com/in/bench-%'
+    ''', (sent_date,))
+    conn.commit()
+    conn.close()
+    
+    with open(export_path, "w", encoding="utf-8") as export_file:
+        for i in range(rows):
+            event = "replied" if i % 4 == 0 else "accepted"
+            export_file.write(json.dumps({
+                "profile_url": f"https://www.linkedin.com/in/bench-{i}/?trk=export",
+                "event_type": event,
+                "event_date": sent_date
+            }) + "\n")
+    
+    return manager.sync_outreach_export(export_path)
 
 def main():
     """
@@ -4,15 +4,40 @@ Partner Referral Program Management System
 Comprehensive system for managing partner relationships and referral commissions
 """
 
+import atexit
+import bisect
 import json
+import logging
+import os
+import random
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from decimal import Decimal
 import uuid
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
+# Activity loggers that still need their buffers written out at process exit
+_open_activity_loggers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_activity_loggers():
+    for activity_logger in list(_open_activity_loggers):
+        try:
+            activity_logger.flush()
+        except Exception:
+            logger.warning("Could not flush partner activities for %s at exit", activity_logger.db_path,
+                           exc_info=True)
+
 class PartnerTier(Enum):
     BRONZE = "bronze"
     SILVER = "silver"
@@ -26,6 +51,13 @@ class ReferralStatus(Enum):
     PAID = "paid"
     DECLINED = "declined"
 
+class LedgerAccount(Enum):
+    REFERRED_DEALS = "referred_deals"
+    PARTNER_REVENUE = "partner_revenue"
+    COMMISSION_EXPENSE = "commission_expense"
+    PARTNER_PAYABLE = "partner_payable"
+    CASH = "cash"
+
 @dataclass
 class Partner:
     id: str
@@ -71,12 +103,259 @@ class CommissionPayout:
     payment_reference: str
     status: str  # pending, paid, failed
 
+class PartnerActivityLogger:
+    """
+    Buffers partner activity entries in memory and writes them in batches to
+    monthly partition tables (partner_activities_YYYY_MM) of a separate
+    activity database. Partitions older than the retention window are
+    dropped when a new month's partition is created.
+    """
+    
+    PARTITION_PATTERN = re.compile(r"^partner_activities_(\d{4})_(\d{2})$")
+    # CRM exports often carry US-style dates instead of ISO
+    DATE_FORMATS = ("%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y")
+    
+    def __init__(self, db_path: str, max_buffer: int = 500, flush_interval_seconds: float = 5.0,
+                 retention_months: int = 24):
+        self.db_path = db_path
+        self.max_buffer = max_buffer
+        self.flush_interval_seconds = flush_interval_seconds
+        self.retention_months = retention_months
+        self.entries_written = 0
+        self.flushes = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._partitions = None
+        # Whatever is still buffered when the process exits gets written out,
+        # unless close() has done so already
+        _open_activity_loggers.add(self)
+    
+    def close(self):
+        """
+        Write out the buffer and stop tracking this logger for the exit flush
+        """
+        self.flush()
+        _open_activity_loggers.discard(self)
+    
+    def log(self, partner_id: str, activity_type: str, description: str, activity_date: Optional[str] = None):
+        """
+        Buffer one activity entry
+        """
+        self.log_many([(partner_id, activity_type, description, activity_date or datetime.now().isoformat())])
+    
+    def log_many(self, entries: List[Tuple[str, str, str, str]], prune: bool = True):
+        """
+        Buffer (partner_id, activity_type, description, activity_date) entries,
+        flushing when the buffer is full or the flush interval has passed.
+        Dates are normalized to ISO first; if any is unrecognized, ValueError
+        is raised and nothing is buffered. prune is passed on to flush().
+        """
+        entries = [entry[:3] + (self.normalize_date(entry[3]),) for entry in entries]
+        with self._lock:
+            self._buffer.extend(entries)
+            due = (len(self._buffer) >= self.max_buffer or
+                   time.monotonic() - self._last_flush >= self.flush_interval_seconds)
+        if due:
+            self.flush(prune)
+    
+    def buffered(self) -> int:
+        """
+        Number of entries waiting for the next flush
+        """
+        with self._lock:
+            return len(self._buffer)
+    
+    def flush(self, prune: bool = True) -> int:
+        """
+        Write all buffered entries to their monthly partitions in one
+        transaction. Creating a new partition also drops expired ones unless
+        prune is False.
+        """
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not entries:
+                return 0
+            
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                by_partition = {}
+                for entry in entries:
+                    by_partition.setdefault(self.partition_for(entry[3]), []).append(entry)
+                
+                cursor = conn.cursor()
+                new_partitions = [table for table in by_partition if table not in self._known_partitions(cursor)]
+                for table in new_partitions:
+                    self._create_partition(cursor, table)
+                for table, rows in by_partition.items():
+                    cursor.executemany(f'''
+                        INSERT INTO {table}
+                        (partner_id, activity_type, activity_description, activity_date)
+                        VALUES (?, ?, ?, ?)
+                    ''', rows)
+                if new_partitions and prune:
+                    self._drop_expired_partitions(cursor)
+                conn.commit()
+            except Exception:
+                # Keep the entries for the next flush rather than losing them
+                conn.rollback()
+                self._buffer[:0] = entries
+                self._partitions = None
+                raise
+            finally:
+                conn.close()
+            
+            self.entries_written += len(entries)
+            self.flushes += 1
+            return len(entries)
+    
+    def normalize_date(self, value: Optional[str]) -> str:
+        """
+        ISO form of an ISO or US-style (MM/DD/YYYY) date; now when value is empty
+        """
+        if not value:
+            return datetime.now().isoformat()
+        try:
+            return datetime.fromisoformat(value).isoformat()
+        except ValueError:
+            pass
+        for date_format in self.DATE_FORMATS:
+            try:
+                return datetime.strptime(value, date_format).isoformat()
+            except ValueError:
+                continue
+        raise ValueError(f"Unrecognized date: {value!r}")
+    
+    def partition_for(self, activity_date: str) -> str:
+        """
+        Partition table name for an ISO activity date
+        """
+        day = datetime.fromisoformat(activity_date)
+        return f"partner_activities_{day.year:04d}_{day.month:02d}"
+    
+    def _known_partitions(self, cursor) -> set:
+        if self._partitions is None:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'partner_activities_%'")
+            self._partitions = {row[0] for row in cursor.fetchall() if self.PARTITION_PATTERN.match(row[0])}
+        return self._partitions
+    
+    def _create_partition(self, cursor, table: str):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                partner_id TEXT,
+                activity_type TEXT,
+                activity_description TEXT,
+                activity_date TEXT
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_partner
+            ON {table} (partner_id, activity_date)
+        ''')
+        self._partitions.add(table)
+    
+    def _drop_expired_partitions(self, cursor, now: Optional[datetime] = None) -> List[str]:
+        now = now or datetime.now()
+        oldest_kept = now.year * 12 + now.month - self.retention_months
+        expired = []
+        for table in sorted(self._known_partitions(cursor)):
+            year, month = self.PARTITION_PATTERN.match(table).groups()
+            if int(year) * 12 + int(month) <= oldest_kept:
+                cursor.execute(f"DROP TABLE {table}")
+                expired.append(table)
+        self._partitions.difference_update(expired)
+        if expired:
+            logger.info("Dropping partner activity partitions past the %d-month retention window: %s",
+                        self.retention_months, ", ".join(expired))
+        return expired
+    
+    def apply_retention(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Drop partitions older than the retention window; returns their names
+        """
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                expired = self._drop_expired_partitions(conn.cursor(), now)
+                conn.commit()
+            finally:
+                conn.close()
+        return expired
+    
+    def query(self, partner_id: Optional[str] = None, activity_type: Optional[str] = None,
+              start_date: Optional[str] = None, end_date: Optional[str] = None,
+              limit: Optional[int] = 100) -> List[Dict]:
+        """
+        Activities across the partitions overlapping start_date..end_date,
+        newest first. Buffered entries are flushed first.
+        """
+        self.flush()
+        
+        conditions, params = [], []
+        if partner_id is not None:
+            conditions.append("partner_id = ?")
+            params.append(partner_id)
+        if activity_type is not None:
+            conditions.append("activity_type = ?")
+            params.append(activity_type)
+        if start_date is not None:
+            conditions.append("activity_date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("activity_date <= ?")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            with self._lock:
+                # Other processes may have created partitions since the last look
+                self._partitions = None
+                partitions = sorted(self._known_partitions(cursor))
+            first = self.partition_for(start_date) if start_date else None
+            last = self.partition_for(end_date) if end_date else None
+            partitions = [table for table in partitions
+                          if (first is None or table >= first) and (last is None or table <= last)]
+            if not partitions:
+                return []
+            
+            union = " UNION ALL ".join(
+                f"SELECT partner_id, activity_type, activity_description, activity_date FROM {table} {where}"
+                for table in partitions
+            )
+            sql = f"SELECT * FROM ({union}) ORDER BY activity_date DESC"
+            query_params = params * len(partitions)
+            if limit is not None:
+                sql += " LIMIT ?"
+                query_params.append(limit)
+            cursor.execute(sql, query_params)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        return [{
+            'partner_id': row[0],
+            'activity_type': row[1],
+            'activity_description': row[2],
+            'activity_date': row[3]
+        } for row in rows]
+
 class PartnerReferralManager:
-    def __init__(self, db_path="partner_referral.db"):
+    def __init__(self, db_path="partner_referral.db", activity_db_path=None):
         self.db_path = db_path
+        # Nested manager calls join the active unit of work of their thread
+        self._local = threading.local()
+        # Ledger entries a partner may accumulate before a balance snapshot is written
+        self.ledger_snapshot_interval = 50
+        self.activity_logger = PartnerActivityLogger(
+            activity_db_path or f"{os.path.splitext(db_path)[0]}_activity.db")
         self.init_database()
         self.tier_requirements = self.get_tier_requirements()
         self.commission_structure = self.get_commission_structure()
+        self.deal_value_bands = self.get_deal_value_bands()
     
     def init_database(self):
         conn = sqlite3.connect(self.db_path)
@@ -132,24 +411,243 @@ class PartnerReferralManager:
                 payment_method TEXT,
                 payment_reference TEXT,
                 status TEXT,
+                payout_period TEXT,
                 FOREIGN KEY (partner_id) REFERENCES partners (id)
             )
         ''')
         
+        # Batch payout runs create at most one payout per partner and period
+        self._ensure_column(cursor, 'commission_payouts', 'payout_period', 'TEXT')
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS partner_activities (
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_commission_payouts_period
+            ON commission_payouts (partner_id, payout_period)
+            WHERE payout_period IS NOT NULL
+        ''')
+        
+        # Unpaid converted referrals are what every payout reads
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_referrals_unpaid
+            ON referrals (partner_id)
+            WHERE status = 'converted' AND payment_date IS NULL
+        ''')
+        
+        # Quarterly volume bonuses aggregate each partner's conversions by date
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_referrals_partner_conversion
+            ON referrals (partner_id, conversion_date)
+        ''')
+        
+        # Leaderboards read partners and per-quarter revenue in rank order
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_partners_leaderboard
+            ON partners (status, total_revenue_generated DESC)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_partners_tier_leaderboard
+            ON partners (status, tier, total_revenue_generated DESC)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partner_quarterly_revenue (
+                partner_id TEXT,
+                quarter TEXT,
+                revenue REAL DEFAULT 0,
+                conversions INTEGER DEFAULT 0,
+                PRIMARY KEY (partner_id, quarter),
+                FOREIGN KEY (partner_id) REFERENCES partners (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_partner_quarterly_revenue_rank
+            ON partner_quarterly_revenue (quarter, revenue DESC)
+        ''')
+        
+        # Converted and paid referrals count towards the quarter they converted in
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS partner_quarterly_revenue_referral_insert
+            AFTER INSERT ON referrals
+            WHEN NEW.status IN ('converted', 'paid') AND NEW.conversion_date IS NOT NULL
+            BEGIN
+                INSERT INTO partner_quarterly_revenue (partner_id, quarter, revenue, conversions)
+                VALUES (NEW.partner_id, substr(NEW.conversion_date, 1, 4) || '-Q' || ((CAST(substr(NEW.conversion_date, 6, 2) AS INTEGER) + 2) / 3), COALESCE(NEW.deal_value, 0), 1)
+                ON CONFLICT (partner_id, quarter) DO UPDATE SET
+                    revenue = revenue + excluded.revenue,
+                    conversions = conversions + 1;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS partner_quarterly_revenue_referral_update
+            AFTER UPDATE OF status, deal_value, conversion_date ON referrals
+            WHEN (OLD.status IN ('converted', 'paid')) IS NOT (NEW.status IN ('converted', 'paid'))
+              OR OLD.deal_value IS NOT NEW.deal_value
+              OR OLD.conversion_date IS NOT NEW.conversion_date
+            BEGIN
+                UPDATE partner_quarterly_revenue SET
+                    revenue = revenue - COALESCE(OLD.deal_value, 0),
+                    conversions = conversions - 1
+                WHERE OLD.status IN ('converted', 'paid') AND OLD.conversion_date IS NOT NULL
+                  AND partner_id = OLD.partner_id AND quarter = substr(OLD.conversion_date, 1, 4) || '-Q' || ((CAST(substr(OLD.conversion_date, 6, 2) AS INTEGER) + 2) / 3);
+                INSERT INTO partner_quarterly_revenue (partner_id, quarter, revenue, conversions)
+                SELECT NEW.partner_id, substr(NEW.conversion_date, 1, 4) || '-Q' || ((CAST(substr(NEW.conversion_date, 6, 2) AS INTEGER) + 2) / 3), COALESCE(NEW.deal_value, 0), 1
+                WHERE NEW.status IN ('converted', 'paid') AND NEW.conversion_date IS NOT NULL
+                ON CONFLICT (partner_id, quarter) DO UPDATE SET
+                    revenue = revenue + excluded.revenue,
+                    conversions = conversions + 1;
+            END
+        ''')
+        
+        cursor.execute('SELECT 1 FROM partner_quarterly_revenue LIMIT 1')
+        if cursor.fetchone() is None:
+            self._fill_partner_quarterly_revenue(cursor)
+        
+        # Activities now live in the partitioned activity log; move any rows
+        # left in the old main-database table over to it. History is moved in
+        # full: expired partitions are only dropped by later retention runs.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'partner_activities'")
+        if cursor.fetchone():
+            cursor.execute('''
+                SELECT partner_id, activity_type, activity_description, activity_date
+                FROM partner_activities ORDER BY id
+            ''')
+            migrated = 0
+            while True:
+                rows = cursor.fetchmany(self.activity_logger.max_buffer)
+                if not rows:
+                    break
+                self.activity_logger.log_many(rows, prune=False)
+                migrated += len(rows)
+            self.activity_logger.flush(prune=False)
+            cursor.execute('DROP TABLE partner_activities')
+            logger.info("Moved %d partner activities to the partitioned activity log", migrated)
+        
+        # Append-only double-entry ledger behind the partner balance columns
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS commission_ledger (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 partner_id TEXT,
-                activity_type TEXT,
-                activity_description TEXT,
-                activity_date TEXT,
+                entry_date TEXT,
+                entry_type TEXT,
+                debit_account TEXT,
+                credit_account TEXT,
+                amount REAL,
+                reference_id TEXT,
                 FOREIGN KEY (partner_id) REFERENCES partners (id)
             )
         ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_commission_ledger_partner
+            ON commission_ledger (partner_id, id)
+        ''')
+        
+        # A partner earns at most one volume bonus per quarter
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_commission_ledger_volume_bonus
+            ON commission_ledger (reference_id, partner_id)
+            WHERE entry_type = 'quarterly_volume_bonus'
+        ''')
+        
+        # Each snapshot holds a partner's balances up to and including ledger_entry_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partner_balance_snapshots (
+                partner_id TEXT,
+                ledger_entry_id INTEGER,
+                snapshot_date TEXT,
+                total_revenue_generated REAL,
+                total_commissions_earned REAL,
+                total_commissions_paid REAL,
+                PRIMARY KEY (partner_id, ledger_entry_id),
+                FOREIGN KEY (partner_id) REFERENCES partners (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_partner_balance_snapshots_date
+            ON partner_balance_snapshots (partner_id, snapshot_date, ledger_entry_id)
+        ''')
+        
+        # Databases that predate the ledger open it with each partner's current balances
+        cursor.execute('SELECT 1 FROM commission_ledger LIMIT 1')
+        if cursor.fetchone() is None:
+            opened_at = datetime.now().isoformat()
+            for column, debit_account, credit_account in [
+                ("total_revenue_generated", LedgerAccount.REFERRED_DEALS, LedgerAccount.PARTNER_REVENUE),
+                ("total_commissions_earned", LedgerAccount.COMMISSION_EXPENSE, LedgerAccount.PARTNER_PAYABLE),
+                ("total_commissions_paid", LedgerAccount.PARTNER_PAYABLE, LedgerAccount.CASH)
+            ]:
+                cursor.execute(f'''
+                    INSERT INTO commission_ledger
+                    (partner_id, entry_date, entry_type, debit_account, credit_account, amount, reference_id)
+                    SELECT id, ?, 'opening_balance', ?, ?, {column}, NULL
+                    FROM partners
+                    WHERE {column} != 0
+                ''', (opened_at, debit_account.value, credit_account.value))
         
         conn.commit()
         conn.close()
     
+    def _fill_partner_quarterly_revenue(self, cursor):
+        cursor.execute('''
+            INSERT INTO partner_quarterly_revenue (partner_id, quarter, revenue, conversions)
+            SELECT partner_id, substr(conversion_date, 1, 4) || '-Q' || ((CAST(substr(conversion_date, 6, 2) AS INTEGER) + 2) / 3), SUM(COALESCE(deal_value, 0)), COUNT(*)
+            FROM referrals
+            WHERE status IN ('converted', 'paid') AND conversion_date IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+    
+    def close(self):
+        """
+        Write out buffered partner activities
+        """
+        self.activity_logger.close()
+    
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """
+        Add a column to an existing table if it is missing
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    @contextmanager
+    def unit_of_work(self, write: bool = True):
+        """
+        One connection and one transaction for a whole business operation.
+        Manager methods called inside join it; the outermost unit commits on
+        success and rolls everything back on error.
+        """
+        active = getattr(self._local, 'cursor', None)
+        if active is not None:
+            yield active
+            return
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        
+        # Writers take the lock up front so read-then-write steps can't interleave
+        cursor.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        self._local.cursor = cursor
+        self._local.activities = []
+        try:
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            # Activities of a rolled-back unit are never logged. The unit has
+            # committed by now, so a failed flush must not be reported as a
+            # failed operation; the logger keeps the entries for its next flush.
+            try:
+                self.activity_logger.log_many(self._local.activities)
+            except Exception:
+                logger.warning("Partner activity flush failed; %d entries buffered for the next flush",
+                               self.activity_logger.buffered(), exc_info=True)
+        finally:
+            self._local.cursor = active
+            self._local.activities = None
+            conn.close()
+    
     def get_tier_requirements(self) -> Dict[PartnerTier, Dict]:
         """
         Define requirements for each partner tier
@@ -230,6 +728,18 @@ class PartnerReferralManager:
             }
         }
     
+    def get_deal_value_bands(self) -> Tuple[List[float], List[float]]:
+        """
+        Lower bounds of the deal value bands above the first, and the multiplier
+        of every band, for bisect lookups
+        """
+        multipliers = self.commission_structure["deal_value_multipliers"]
+        return (
+            [10000, 50000, 100000],
+            [multipliers["under_10k"], multipliers["10k_to_50k"],
+             multipliers["50k_to_100k"], multipliers["over_100k"]]
+        )
+    
     def create_partner(self, company_name: str, contact_name: str, email: str,
                       phone: str, website: str, industry: str) -> str:
         """
@@ -255,101 +765,90 @@ class PartnerReferralManager:
             total_commissions_paid=0.0
         )
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO partners
-                (id, company_name, contact_name, email, phone, website, industry,
-                 tier, commission_rate, join_date, status, total_referrals,
-                 total_revenue_generated, total_commissions_earned, 
-                 total_commissions_paid, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                partner.id, partner.company_name, partner.contact_name, partner.email,
-                partner.phone, partner.website, partner.industry, partner.tier.value,
-                partner.commission_rate, partner.join_date, partner.status,
-                partner.total_referrals, partner.total_revenue_generated,
-                partner.total_commissions_earned, partner.total_commissions_paid,
-                datetime.now().isoformat()
-            ))
-            
-            conn.commit()
-            
-            # Log activity
-            self.log_partner_activity(partner_id, "partner_created", 
-                                    f"New partner account created for {company_name}")
+            with self.unit_of_work() as cursor:
+                cursor.execute('''
+                    INSERT INTO partners
+                    (id, company_name, contact_name, email, phone, website, industry,
+                     tier, commission_rate, join_date, status, total_referrals,
+                     total_revenue_generated, total_commissions_earned,
+                     total_commissions_paid, created_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    partner.id, partner.company_name, partner.contact_name, partner.email,
+                    partner.phone, partner.website, partner.industry, partner.tier.value,
+                    partner.commission_rate, partner.join_date, partner.status,
+                    partner.total_referrals, partner.total_revenue_generated,
+                    partner.total_commissions_earned, partner.total_commissions_paid,
+                    datetime.now().isoformat()
+                ))
+                
+                # Log activity
+                self.log_partner_activity(partner_id, "partner_created",
+                                        f"New partner account created for {company_name}")
             
             return partner_id
-            
+        
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def create_referral(self, partner_id: str, prospect_email: str, prospect_name: str,
                        prospect_company: str, notes: str = "") -> str:
         """
         Create a new referral
         """
-        # Get partner info
-        partner = self.get_partner_by_id(partner_id)
-        if not partner:
-            return None
-        
-        referral_id = str(uuid.uuid4())
-        
-        referral = Referral(
-            id=referral_id,
-            partner_id=partner_id,
-            prospect_email=prospect_email,
-            prospect_name=prospect_name,
-            prospect_company=prospect_company,
-            referral_date=datetime.now().isoformat(),
-            status=ReferralStatus.PENDING,
-            deal_value=0.0,
-            commission_rate=partner.commission_rate,
-            commission_amount=0.0,
-            conversion_date=None,
-            payment_date=None,
-            notes=notes
-        )
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO referrals
-            (id, partner_id, prospect_email, prospect_name, prospect_company,
-             referral_date, status, deal_value, commission_rate, commission_amount,
-             conversion_date, payment_date, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            referral.id, referral.partner_id, referral.prospect_email,
-            referral.prospect_name, referral.prospect_company, referral.referral_date,
-            referral.status.value, referral.deal_value, referral.commission_rate,
-            referral.commission_amount, referral.conversion_date,
-            referral.payment_date, referral.notes
-        ))
-        
-        # Update partner referral count
-        cursor.execute('''
-            UPDATE partners 
-            SET total_referrals = total_referrals + 1
-            WHERE id = ?
-        ''', (partner_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        # Log activity
-        self.log_partner_activity(partner_id, "referral_created",
-                                f"New referral created for {prospect_name} at {prospect_company}")
-        
-        # Check for first referral bonus
-        if partner.total_referrals == 0:
-            self.apply_first_referral_bonus(partner_id)
+        with self.unit_of_work() as cursor:
+            # Get partner info
+            partner = self.get_partner_by_id(partner_id)
+            if not partner:
+                return None
+            
+            referral_id = str(uuid.uuid4())
+            
+            referral = Referral(
+                id=referral_id,
+                partner_id=partner_id,
+                prospect_email=prospect_email,
+                prospect_name=prospect_name,
+                prospect_company=prospect_company,
+                referral_date=datetime.now().isoformat(),
+                status=ReferralStatus.PENDING,
+                deal_value=0.0,
+                commission_rate=partner.commission_rate,
+                commission_amount=0.0,
+                conversion_date=None,
+                payment_date=None,
+                notes=notes
+            )
+            
+            cursor.execute('''
+                INSERT INTO referrals
+                (id, partner_id, prospect_email, prospect_name, prospect_company,
+                 referral_date, status, deal_value, commission_rate, commission_amount,
+                 conversion_date, payment_date, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                referral.id, referral.partner_id, referral.prospect_email,
+                referral.prospect_name, referral.prospect_company, referral.referral_date,
+                referral.status.value, referral.deal_value, referral.commission_rate,
+                referral.commission_amount, referral.conversion_date,
+                referral.payment_date, referral.notes
+            ))
+            
+            # Update partner referral count
+            cursor.execute('''
+                UPDATE partners
+                SET total_referrals = total_referrals + 1
+                WHERE id = ?
+            ''', (partner_id,))
+            
+            # Log activity
+            self.log_partner_activity(partner_id, "referral_created",
+                                    f"New referral created for {prospect_name} at {prospect_company}")
+            
+            # Check for first referral bonus
+            if partner.total_referrals == 0:
+                self.apply_first_referral_bonus(partner_id)
         
         return referral_id
     
@@ -357,67 +856,174 @@ class PartnerReferralManager:
         """
         Convert a referral to a paying customer
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get referral details
-        cursor.execute('SELECT * FROM referrals WHERE id = ?', (referral_id,))
-        referral_data = cursor.fetchone()
-        
-        if not referral_data:
-            conn.close()
-            return False
-        
-        partner_id = referral_data[1]
-        commission_rate = referral_data[8]
-        
-        # Calculate commission with multipliers
-        commission_amount = self.calculate_commission(deal_value, commission_rate)
-        
-        # Update referral
-        cursor.execute('''
-            UPDATE referrals
-            SET status = ?, deal_value = ?, commission_amount = ?, conversion_date = ?
-            WHERE id = ?
-        ''', (ReferralStatus.CONVERTED.value, deal_value, commission_amount,
-              datetime.now().isoformat(), referral_id))
-        
-        # Update partner totals
-        cursor.execute('''
-            UPDATE partners
-            SET total_revenue_generated = total_revenue_generated + ?,
-                total_commissions_earned = total_commissions_earned + ?
-            WHERE id = ?
-        ''', (deal_value, commission_amount, partner_id))
-        
-        conn.commit()
-        conn.close()
+        with self.unit_of_work() as cursor:
+            # Get referral details
+            cursor.execute('SELECT partner_id, commission_rate FROM referrals WHERE id = ?', (referral_id,))
+            referral_data = cursor.fetchone()
+            
+            if not referral_data:
+                return False
+            
+            partner_id, commission_rate = referral_data
+            
+            # Calculate commission with multipliers
+            commission_amount = self.calculate_commission(deal_value, commission_rate)
+            
+            # Update referral
+            cursor.execute('''
+                UPDATE referrals
+                SET status = ?, deal_value = ?, commission_amount = ?, conversion_date = ?
+                WHERE id = ?
+            ''', (ReferralStatus.CONVERTED.value, deal_value, commission_amount,
+                  datetime.now().isoformat(), referral_id))
+            
+            # Update partner totals
+            cursor.execute('''
+                UPDATE partners
+                SET total_revenue_generated = total_revenue_generated + ?,
+                    total_commissions_earned = total_commissions_earned + ?
+                WHERE id = ?
+            ''', (deal_value, commission_amount, partner_id))
+            
+            self._post_ledger_entries(cursor, [
+                (partner_id, "referral_converted", LedgerAccount.REFERRED_DEALS, LedgerAccount.PARTNER_REVENUE,
+                 deal_value, referral_id),
+                (partner_id, "referral_converted", LedgerAccount.COMMISSION_EXPENSE, LedgerAccount.PARTNER_PAYABLE,
+                 commission_amount, referral_id)
+            ])
+            
+            # Log activity
+            self.log_partner_activity(partner_id, "referral_converted",
+                                    f"Referral converted: ${deal_value:,.2f} deal, ${commission_amount:,.2f} commission")
+            
+            # Check if partner qualifies for tier upgrade
+            self.check_tier_upgrade(partner_id)
         
-        # Log activity
-        self.log_partner_activity(partner_id, "referral_converted",
-                                f"Referral converted: ${deal_value:,.2f} deal, ${commission_amount:,.2f} commission")
+        return True
+    
+    def convert_referrals_bulk(self, conversions: List[Tuple[str, float]],
+                               conversion_date: Optional[str] = None) -> Dict:
+        """
+        Convert many referrals from a CRM closed-won export in one transaction.
+
+        conversions is a list of (referral_id, deal_value). Referrals that are
+        already converted or paid are skipped, so re-syncing an export is safe.
+        Partner totals and activity logs are applied once per partner, and tiers
+        are re-evaluated once per affected partner at the end.
+        """
+        # Stored and logged as ISO so quarters and activity partitions derive from it
+        conversion_date = self.activity_logger.normalize_date(conversion_date)
         
-        # Check if partner qualifies for tier upgrade
-        self.check_tier_upgrade(partner_id)
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                CREATE TEMP TABLE bulk_conversion_input (
+                    referral_id TEXT PRIMARY KEY,
+                    deal_value REAL
+                )
+            ''')
+            # A referral repeated in the export keeps its last deal value
+            cursor.executemany('''
+                INSERT OR REPLACE INTO bulk_conversion_input (referral_id, deal_value) VALUES (?, ?)
+            ''', conversions)
+            
+            cursor.execute('''
+                SELECT i.referral_id, r.partner_id, r.commission_rate, i.deal_value, r.status
+                FROM bulk_conversion_input i
+                LEFT JOIN referrals r ON r.id = i.referral_id
+            ''')
+            rows = cursor.fetchall()
+            
+            eligible = [row for row in rows if row[4] in (ReferralStatus.PENDING.value, ReferralStatus.QUALIFIED.value)]
+            not_found = sum(1 for row in rows if row[4] is None)
+            commissions = self.calculate_commissions([row[3] for row in eligible], [row[2] for row in eligible])
+            
+            cursor.execute('''
+                CREATE TEMP TABLE bulk_conversions (
+                    referral_id TEXT PRIMARY KEY,
+                    partner_id TEXT,
+                    deal_value REAL,
+                    commission_amount REAL
+                )
+            ''')
+            cursor.executemany('''
+                INSERT INTO bulk_conversions (referral_id, partner_id, deal_value, commission_amount)
+                VALUES (?, ?, ?, ?)
+            ''', [(row[0], row[1], row[3], commission) for row, commission in zip(eligible, commissions)])
+            
+            cursor.execute('''
+                UPDATE referrals
+                SET status = ?, deal_value = c.deal_value, commission_amount = c.commission_amount,
+                    conversion_date = ?
+                FROM bulk_conversions c
+                WHERE referrals.id = c.referral_id
+            ''', (ReferralStatus.CONVERTED.value, conversion_date))
+            
+            cursor.execute('''
+                SELECT partner_id, COUNT(*), SUM(deal_value), SUM(commission_amount)
+                FROM bulk_conversions
+                GROUP BY partner_id
+            ''')
+            partner_totals = cursor.fetchall()
+            
+            cursor.executemany('''
+                UPDATE partners
+                SET total_revenue_generated = total_revenue_generated + ?,
+                    total_commissions_earned = total_commissions_earned + ?
+                WHERE id = ?
+            ''', [(revenue, commission, partner_id) for partner_id, _, revenue, commission in partner_totals])
+            
+            ledger_entries = []
+            for row, commission in zip(eligible, commissions):
+                ledger_entries.append((row[1], "referral_converted", LedgerAccount.REFERRED_DEALS,
+                                       LedgerAccount.PARTNER_REVENUE, row[3], row[0]))
+                ledger_entries.append((row[1], "referral_converted", LedgerAccount.COMMISSION_EXPENSE,
+                                       LedgerAccount.PARTNER_PAYABLE, commission, row[0]))
+            self._post_ledger_entries(cursor, ledger_entries)
+            
+            self.log_partner_activities([
+                (partner_id, "referral_converted",
+                 f"{count} referrals converted: ${revenue:,.2f} in deals, ${commission:,.2f} commission",
+                 conversion_date)
+                for partner_id, count, revenue, commission in partner_totals
+            ])
+            
+            # Tier re-evaluation once per affected partner
+            cursor.execute('''
+                SELECT p.id, p.tier, p.total_referrals, p.total_revenue_generated
+                FROM partners p
+                WHERE p.id IN (SELECT DISTINCT partner_id FROM bulk_conversions)
+            ''')
+            tier_changes = self._apply_tier_changes(cursor, cursor.fetchall())
+            
+            cursor.execute('DROP TABLE temp.bulk_conversion_input')
+            cursor.execute('DROP TABLE temp.bulk_conversions')
         
-        return True
+        return {
+            'requested': len(rows),
+            'converted': len(eligible),
+            'already_converted': len(rows) - len(eligible) - not_found,
+            'not_found': not_found,
+            'partners_updated': len(partner_totals),
+            'tier_changes': len(tier_changes),
+            'total_deal_value': round(sum(row[3] for row in eligible), 2),
+            'total_commission': round(sum(commissions), 2)
+        }
     
     def calculate_commission(self, deal_value: float, base_rate: float) -> float:
         """
         Calculate commission with multipliers based on deal value
         """
-        multiplier = 1.0
-        
-        if deal_value >= 100000:
-            multiplier = self.commission_structure["deal_value_multipliers"]["over_100k"]
-        elif deal_value >= 50000:
-            multiplier = self.commission_structure["deal_value_multipliers"]["50k_to_100k"]
-        elif deal_value >= 10000:
-            multiplier = self.commission_structure["deal_value_multipliers"]["10k_to_50k"]
-        else:
-            multiplier = self.commission_structure["deal_value_multipliers"]["under_10k"]
-        
-        return deal_value * base_rate * multiplier
+        return self.calculate_commissions([deal_value], [base_rate])[0]
+    
+    def calculate_commissions(self, deal_values: List[float], base_rates: List[float]) -> List[float]:
+        """
+        Commissions for many deals at once: each deal value is placed in its
+        multiplier band with a binary search over the band bounds
+        """
+        bounds, multipliers = self.deal_value_bands
+        band = bisect.bisect_right
+        return [deal_value * base_rate * multipliers[band(bounds, deal_value)]
+                for deal_value, base_rate in zip(deal_values, base_rates)]
     
     def apply_first_referral_bonus(self, partner_id: str):
         """
@@ -425,131 +1031,426 @@ class PartnerReferralManager:
         """
         bonus_amount = self.commission_structure["bonus_structures"]["first_referral_bonus"]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE partners
-            SET total_commissions_earned = total_commissions_earned + ?
-            WHERE id = ?
-        ''', (bonus_amount, partner_id))
-        
-        conn.commit()
-        conn.close()
-        
-        self.log_partner_activity(partner_id, "bonus_applied",
-                                f"First referral bonus applied: ${bonus_amount}")
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                UPDATE partners
+                SET total_commissions_earned = total_commissions_earned + ?
+                WHERE id = ?
+            ''', (bonus_amount, partner_id))
+            
+            self._post_ledger_entries(cursor, [
+                (partner_id, "first_referral_bonus", LedgerAccount.COMMISSION_EXPENSE, LedgerAccount.PARTNER_PAYABLE,
+                 bonus_amount, None)
+            ])
+            
+            self.log_partner_activity(partner_id, "bonus_applied",
+                                    f"First referral bonus applied: ${bonus_amount}")
     
     def check_tier_upgrade(self, partner_id: str):
         """
         Check if partner qualifies for tier upgrade
         """
-        partner = self.get_partner_by_id(partner_id)
-        if not partner:
-            return
-        
-        current_tier = PartnerTier(partner.tier.value if hasattr(partner.tier, 'value') else partner.tier)
-        new_tier = current_tier
+        with self.unit_of_work():
+            partner = self.get_partner_by_id(partner_id)
+            if not partner:
+                return
+            
+            current_tier = PartnerTier(partner.tier.value if hasattr(partner.tier, 'value') else partner.tier)
+            new_tier = self.qualifying_tier(partner.total_referrals, partner.total_revenue_generated)
+            
+            if new_tier != current_tier:
+                self.upgrade_partner_tier(partner_id, new_tier)
+    
+    def qualifying_tier(self, total_referrals: int, total_revenue: float) -> PartnerTier:
+        """
+        Highest tier whose referral and revenue requirements are both met
+        """
+        new_tier = PartnerTier.BRONZE
         
         # Check tier requirements in descending order
         for tier in [PartnerTier.PLATINUM, PartnerTier.GOLD, PartnerTier.SILVER, PartnerTier.BRONZE]:
             requirements = self.tier_requirements[tier]
-            if (partner.total_referrals >= requirements["min_referrals"] and
-                partner.total_revenue_generated >= requirements["min_revenue"]):
+            if (total_referrals >= requirements["min_referrals"] and
+                total_revenue >= requirements["min_revenue"]):
                 new_tier = tier
                 break
         
-        if new_tier != current_tier:
-            self.upgrade_partner_tier(partner_id, new_tier)
+        return new_tier
     
-    def upgrade_partner_tier(self, partner_id: str, new_tier: PartnerTier):
+    def get_tier_bands(self) -> Tuple[List[PartnerTier], List[int], List[float]]:
         """
-        Upgrade partner to new tier
+        Tiers in ascending order with their referral and revenue minimums
         """
-        new_commission_rate = self.tier_requirements[new_tier]["commission_rate"]
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        tiers = sorted(self.tier_requirements,
+                       key=lambda tier: (self.tier_requirements[tier]["min_referrals"],
+                                         self.tier_requirements[tier]["min_revenue"]))
+        return (
+            tiers,
+            [self.tier_requirements[tier]["min_referrals"] for tier in tiers],
+            [self.tier_requirements[tier]["min_revenue"] for tier in tiers]
+        )
+    
+    def qualifying_tiers(self, total_referrals: List[int], total_revenues: List[float]) -> List[PartnerTier]:
+        """
+        qualifying_tier for many partners at once. When both minimums rise with
+        the tier, the result is the lower of the two band positions found by
+        binary search; otherwise each partner is checked individually.
+        """
+        tiers, min_referrals, min_revenues = self.get_tier_bands()
+        if min_referrals[0] > 0 or min_revenues[0] > 0 or min_revenues != sorted(min_revenues):
+            return [self.qualifying_tier(referrals, revenue)
+                    for referrals, revenue in zip(total_referrals, total_revenues)]
+        
+        band = bisect.bisect_right
+        return [tiers[max(min(band(min_referrals, referrals), band(min_revenues, revenue)), 1) - 1]
+                for referrals, revenue in zip(total_referrals, total_revenues)]
+    
+    def _apply_tier_changes(self, cursor, partners: List[Tuple]) -> List[Tuple[str, PartnerTier]]:
+        """
+        Move every (id, tier, total_referrals, total_revenue_generated) row whose
+        qualifying tier differs from its current one, with bulk writes
+        """
+        target_tiers = self.qualifying_tiers([row[2] for row in partners], [row[3] for row in partners])
+        tier_changes = [(row[0], new_tier) for row, new_tier in zip(partners, target_tiers)
+                        if new_tier.value != row[1]]
+        if not tier_changes:
+            return tier_changes
         
-        cursor.execute('''
+        cursor.executemany('''
             UPDATE partners
             SET tier = ?, commission_rate = ?
             WHERE id = ?
-        ''', (new_tier.value, new_commission_rate, partner_id))
+        ''', [(new_tier.value, self.tier_requirements[new_tier]["commission_rate"], partner_id)
+              for partner_id, new_tier in tier_changes])
         
-        conn.commit()
-        conn.close()
+        changed_at = datetime.now().isoformat()
+        self.log_partner_activities([
+            (partner_id, "tier_upgraded", f"Partner upgraded to {new_tier.value.title()} tier", changed_at)
+            for partner_id, new_tier in tier_changes
+        ])
         
-        self.log_partner_activity(partner_id, "tier_upgraded",
-                                f"Partner upgraded to {new_tier.value.title()} tier")
+        return tier_changes
     
-    def create_commission_payout(self, partner_id: str, payment_method: str = "bank_transfer") -> str:
+    def reevaluate_all_tiers(self) -> Dict:
         """
-        Create commission payout for partner's unpaid referrals
+        Re-tier the whole program in one transaction, e.g. after the tier
+        requirements change. Only partners whose tier changes are written.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                SELECT id, tier, total_referrals, total_revenue_generated FROM partners
+            ''')
+            partners = cursor.fetchall()
+            tier_changes = self._apply_tier_changes(cursor, partners)
         
-        # Get unpaid referrals
-        cursor.execute('''
-            SELECT id, commission_amount FROM referrals
-            WHERE partner_id = ? AND status = 'converted' AND payment_date IS NULL
-        ''', (partner_id,))
+        changes_by_tier = {}
+        for _, new_tier in tier_changes:
+            changes_by_tier[new_tier.value] = changes_by_tier.get(new_tier.value, 0) + 1
         
-        unpaid_referrals = cursor.fetchall()
+        return {
+            'partners_evaluated': len(partners),
+            'tier_changes': len(tier_changes),
+            'changes_by_tier': changes_by_tier
+        }
+    
+    def upgrade_partner_tier(self, partner_id: str, new_tier: PartnerTier):
+        """
+        Upgrade partner to new tier
+        """
+        new_commission_rate = self.tier_requirements[new_tier]["commission_rate"]
         
-        if not unpaid_referrals:
-            conn.close()
-            return None
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                UPDATE partners
+                SET tier = ?, commission_rate = ?
+                WHERE id = ?
+            ''', (new_tier.value, new_commission_rate, partner_id))
+            
+            self.log_partner_activity(partner_id, "tier_upgraded",
+                                    f"Partner upgraded to {new_tier.value.title()} tier")
+    
+    def create_commission_payout(self, partner_id: str, payment_method: str = "bank_transfer") -> str:
+        """
+        Create commission payout for partner's unpaid referrals
+        """
+        with self.unit_of_work() as cursor:
+            # Get unpaid referrals
+            cursor.execute('''
+                SELECT id, commission_amount FROM referrals
+                WHERE partner_id = ? AND status = 'converted' AND payment_date IS NULL
+            ''', (partner_id,))
+            
+            unpaid_referrals = cursor.fetchall()
+            
+            if not unpaid_referrals:
+                return None
+            
+            payout_id = str(uuid.uuid4())
+            referral_ids = [ref[0] for ref in unpaid_referrals]
+            total_amount = sum(ref[1] for ref in unpaid_referrals)
+            
+            # Create payout record
+            cursor.execute('''
+                INSERT INTO commission_payouts
+                (id, partner_id, referral_ids, payout_amount, payout_date,
+                 payment_method, payment_reference, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                payout_id, partner_id, json.dumps(referral_ids), total_amount,
+                datetime.now().isoformat(), payment_method, f"PAY-{payout_id[:8]}", "pending"
+            ))
+            
+            # Mark referrals as paid; the write lock keeps this the same set as selected
+            cursor.execute('''
+                UPDATE referrals
+                SET status = 'paid', payment_date = ?
+                WHERE partner_id = ? AND status = 'converted' AND payment_date IS NULL
+            ''', (datetime.now().isoformat(), partner_id))
+            
+            # Update partner paid commissions
+            cursor.execute('''
+                UPDATE partners
+                SET total_commissions_paid = total_commissions_paid + ?
+                WHERE id = ?
+            ''', (total_amount, partner_id))
+            
+            self._post_ledger_entries(cursor, [
+                (partner_id, "payout_created", LedgerAccount.PARTNER_PAYABLE, LedgerAccount.CASH,
+                 total_amount, payout_id)
+            ])
+            
+            self.log_partner_activity(partner_id, "payout_created",
+                                    f"Commission payout created: ${total_amount:,.2f}")
         
-        payout_id = str(uuid.uuid4())
-        referral_ids = [ref[0] for ref in unpaid_referrals]
-        total_amount = sum(ref[1] for ref in unpaid_referrals)
+        return payout_id
+    
+    def run_payout_batch(self, period: str, payment_method: str = "bank_transfer",
+                         cutoff: Optional[str] = None) -> Dict:
+        """
+        Pay every partner's unpaid converted referrals (converted up to cutoff)
+        in one set-based transaction. Re-running the same period skips partners
+        that already have a payout for it.
+        """
+        cutoff = cutoff or datetime.now().isoformat()
+        payout_date = datetime.now().isoformat()
         
-        # Create payout record
-        cursor.execute('''
-            INSERT INTO commission_payouts
-            (id, partner_id, referral_ids, payout_amount, payout_date,
-             payment_method, payment_reference, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            payout_id, partner_id, json.dumps(referral_ids), total_amount,
-            datetime.now().isoformat(), payment_method, f"PAY-{payout_id[:8]}", "pending"
-        ))
-        
-        # Mark referrals as paid
-        for referral_id in referral_ids:
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                SELECT r.partner_id, SUM(r.commission_amount), json_group_array(r.id)
+                FROM referrals r
+                WHERE r.status = 'converted' AND r.payment_date IS NULL AND r.conversion_date <= ?
+                  AND NOT EXISTS (SELECT 1 FROM commission_payouts p
+                                  WHERE p.partner_id = r.partner_id AND p.payout_period = ?)
+                GROUP BY r.partner_id
+            ''', (cutoff, period))
+            unpaid = cursor.fetchall()
+            
+            payouts = []
+            for partner_id, total_amount, referral_ids in unpaid:
+                payout_id = str(uuid.uuid4())
+                payouts.append((payout_id, partner_id, referral_ids, total_amount, payout_date,
+                                payment_method, f"PAY-{payout_id[:8]}", "pending", period))
+            
+            cursor.executemany('''
+                INSERT INTO commission_payouts
+                (id, partner_id, referral_ids, payout_amount, payout_date,
+                 payment_method, payment_reference, status, payout_period)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', payouts)
+            
+            cursor.execute('''
+                CREATE TEMP TABLE payout_assignments (
+                    referral_id TEXT PRIMARY KEY,
+                    payout_id TEXT
+                )
+            ''')
+            cursor.executemany('''
+                INSERT INTO payout_assignments (referral_id, payout_id)
+                SELECT value, ? FROM json_each(?)
+            ''', [(payout[0], payout[2]) for payout in payouts])
+            
             cursor.execute('''
                 UPDATE referrals
                 SET status = 'paid', payment_date = ?
+                FROM payout_assignments a
+                WHERE referrals.id = a.referral_id
+            ''', (payout_date,))
+            referrals_paid = cursor.rowcount
+            
+            cursor.executemany('''
+                UPDATE partners
+                SET total_commissions_paid = total_commissions_paid + ?
                 WHERE id = ?
-            ''', (datetime.now().isoformat(), referral_id))
+            ''', [(payout[3], payout[1]) for payout in payouts])
+            
+            self._post_ledger_entries(cursor, [
+                (payout[1], "payout_created", LedgerAccount.PARTNER_PAYABLE, LedgerAccount.CASH, payout[3], payout[0])
+                for payout in payouts
+            ])
+            
+            self.log_partner_activities([
+                (payout[1], "payout_created", f"Commission payout created: ${payout[3]:,.2f}", payout_date)
+                for payout in payouts
+            ])
+            
+            cursor.execute('DROP TABLE temp.payout_assignments')
         
-        # Update partner paid commissions
-        cursor.execute('''
-            UPDATE partners
-            SET total_commissions_paid = total_commissions_paid + ?
-            WHERE id = ?
-        ''', (total_amount, partner_id))
+        return {
+            'period': period,
+            'payouts_created': len(payouts),
+            'referrals_paid': referrals_paid,
+            'total_amount': round(sum(payout[3] for payout in payouts), 2)
+        }
+    
+    def _post_ledger_entries(self, cursor, entries: List[Tuple]):
+        """
+        Append (partner_id, entry_type, debit_account, credit_account, amount,
+        reference_id) entries, then snapshot partners whose ledger tail is long
+        """
+        if not entries:
+            return
         
-        conn.commit()
-        conn.close()
+        entry_date = datetime.now().isoformat()
+        cursor.executemany('''
+            INSERT INTO commission_ledger
+            (partner_id, entry_date, entry_type, debit_account, credit_account, amount, reference_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(partner_id, entry_date, entry_type, debit_account.value, credit_account.value, amount, reference_id)
+              for partner_id, entry_type, debit_account, credit_account, amount, reference_id in entries])
         
-        self.log_partner_activity(partner_id, "payout_created",
-                                f"Commission payout created: ${total_amount:,.2f}")
+        self._snapshot_balances(cursor, sorted({entry[0] for entry in entries}), self.ledger_snapshot_interval)
+    
+    def _ledger_balances_query(self, targets: str) -> str:
+        """
+        Balances for the partner ids selected by targets: each partner's latest
+        snapshot plus the ledger entries after it
+        """
+        return f'''
+            WITH targets AS ({targets}),
+            latest AS (
+                SELECT t.partner_id, s.ledger_entry_id, s.total_revenue_generated,
+                       s.total_commissions_earned, s.total_commissions_paid
+                FROM targets t
+                LEFT JOIN partner_balance_snapshots s
+                  ON s.partner_id = t.partner_id
+                 AND s.ledger_entry_id = (SELECT MAX(ledger_entry_id) FROM partner_balance_snapshots
+                                          WHERE partner_id = t.partner_id)
+            )
+            SELECT lt.partner_id AS partner_id,
+                   COALESCE(MAX(l.id), lt.ledger_entry_id) AS last_entry_id,
+                   MAX(l.entry_date) AS last_entry_date,
+                   COALESCE(lt.total_revenue_generated, 0) +
+                       COALESCE(SUM(CASE WHEN l.credit_account = '{LedgerAccount.PARTNER_REVENUE.value}' THEN l.amount END), 0) AS revenue,
+                   COALESCE(lt.total_commissions_earned, 0) +
+                       COALESCE(SUM(CASE WHEN l.credit_account = '{LedgerAccount.PARTNER_PAYABLE.value}' THEN l.amount END), 0) AS earned,
+                   COALESCE(lt.total_commissions_paid, 0) +
+                       COALESCE(SUM(CASE WHEN l.debit_account = '{LedgerAccount.PARTNER_PAYABLE.value}' THEN l.amount END), 0) AS paid,
+                   COUNT(l.id) AS tail_entries
+            FROM latest lt
+            LEFT JOIN commission_ledger l
+              ON l.partner_id = lt.partner_id AND l.id > COALESCE(lt.ledger_entry_id, 0)
+            GROUP BY lt.partner_id
+        '''
+    
+    def _snapshot_balances(self, cursor, partner_ids: Optional[List[str]], min_tail: int) -> int:
+        """
+        Snapshot the given partners (all when None) whose ledger tail has at
+        least min_tail entries
+        """
+        if partner_ids is None:
+            targets, params = "SELECT id AS partner_id FROM partners", ()
+        else:
+            targets, params = "SELECT DISTINCT value AS partner_id FROM json_each(?)", (json.dumps(partner_ids),)
+        
+        cursor.execute(f'''
+            INSERT INTO partner_balance_snapshots
+            (partner_id, ledger_entry_id, snapshot_date, total_revenue_generated,
+             total_commissions_earned, total_commissions_paid)
+            SELECT partner_id, last_entry_id, last_entry_date, revenue, earned, paid
+            FROM ({self._ledger_balances_query(targets)}) AS balances
+            WHERE tail_entries >= ?
+        ''', params + (max(min_tail, 1),))
+        return cursor.rowcount
+    
+    def snapshot_balances(self, partner_ids: Optional[List[str]] = None, min_tail: int = 1) -> int:
+        """
+        Periodic snapshot job; returns the number of snapshots written
+        """
+        with self.unit_of_work() as cursor:
+            return self._snapshot_balances(cursor, partner_ids, min_tail)
+    
+    def get_partner_balance(self, partner_id: str, as_of: Optional[str] = None) -> Dict:
+        """
+        Ledger balance of a partner, currently or as of a past timestamp: the
+        last snapshot at or before as_of plus the ledger tail after it
+        """
+        as_of = as_of or datetime.max.isoformat()
         
-        return payout_id
+        with self.unit_of_work(write=False) as cursor:
+            cursor.execute('''
+                SELECT ledger_entry_id, total_revenue_generated, total_commissions_earned, total_commissions_paid
+                FROM partner_balance_snapshots
+                WHERE partner_id = ? AND snapshot_date <= ?
+                ORDER BY snapshot_date DESC, ledger_entry_id DESC
+                LIMIT 1
+            ''', (partner_id, as_of))
+            snapshot = cursor.fetchone() or (0, 0, 0, 0)
+            
+            cursor.execute('''
+                SELECT
+                    COALESCE(SUM(CASE WHEN credit_account = ? THEN amount END), 0),
+                    COALESCE(SUM(CASE WHEN credit_account = ? THEN amount END), 0),
+                    COALESCE(SUM(CASE WHEN debit_account = ? THEN amount END), 0),
+                    COUNT(*)
+                FROM commission_ledger
+                WHERE partner_id = ? AND id > ? AND entry_date <= ?
+            ''', (LedgerAccount.PARTNER_REVENUE.value, LedgerAccount.PARTNER_PAYABLE.value,
+                  LedgerAccount.PARTNER_PAYABLE.value, partner_id, snapshot[0], as_of))
+            tail = cursor.fetchone()
+        
+        earned = snapshot[2] + tail[1]
+        paid = snapshot[3] + tail[2]
+        return {
+            'partner_id': partner_id,
+            'as_of': as_of,
+            'total_revenue_generated': round(snapshot[1] + tail[0], 2),
+            'total_commissions_earned': round(earned, 2),
+            'total_commissions_paid': round(paid, 2),
+            'outstanding_commissions': round(earned - paid, 2),
+            'tail_entries': tail[3]
+        }
+    
+    def audit_partner_balances(self, tolerance: float = 0.01) -> List[Dict]:
+        """
+        Partners whose balance columns disagree with their ledger balances
+        """
+        with self.unit_of_work(write=False) as cursor:
+            cursor.execute(f'''
+                SELECT p.id, p.total_revenue_generated, p.total_commissions_earned, p.total_commissions_paid,
+                       b.revenue, b.earned, b.paid
+                FROM ({self._ledger_balances_query("SELECT id AS partner_id FROM partners")}) AS b
+                JOIN partners p ON p.id = b.partner_id
+                WHERE abs(p.total_revenue_generated - b.revenue) > ?
+                   OR abs(p.total_commissions_earned - b.earned) > ?
+                   OR abs(p.total_commissions_paid - b.paid) > ?
+            ''', (tolerance, tolerance, tolerance))
+            rows = cursor.fetchall()
+        
+        return [{
+            'partner_id': row[0],
+            'recorded': {'total_revenue_generated': row[1], 'total_commissions_earned': row[2],
+                         'total_commissions_paid': row[3]},
+            'ledger': {'total_revenue_generated': round(row[4], 2), 'total_commissions_earned': round(row[5], 2),
+                       'total_commissions_paid': round(row[6], 2)}
+        } for row in rows]
     
     def get_partner_by_id(self, partner_id: str) -> Optional[Partner]:
         """
         Get partner details by ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM partners WHERE id = ?', (partner_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with self.unit_of_work(write=False) as cursor:
+            cursor.execute('SELECT * FROM partners WHERE id = ?', (partner_id,))
+            result = cursor.fetchone()
         
         if result:
             return Partner(
@@ -576,49 +1477,46 @@ class PartnerReferralManager:
         """
         Get comprehensive dashboard data for partner
         """
-        partner = self.get_partner_by_id(partner_id)
-        if not partner:
-            return {}
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get referral statistics
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_referrals,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_referrals,
-                COUNT(CASE WHEN status = 'qualified' THEN 1 END) as qualified_referrals,
-                COUNT(CASE WHEN status = 'converted' THEN 1 END) as converted_referrals,
-                COALESCE(SUM(CASE WHEN status = 'converted' THEN deal_value END), 0) as total_revenue,
-                COALESCE(SUM(CASE WHEN status = 'converted' THEN commission_amount END), 0) as total_commissions
-            FROM referrals
-            WHERE partner_id = ?
-        ''', (partner_id,))
-        
-        referral_stats = cursor.fetchone()
-        
-        # Get recent referrals
-        cursor.execute('''
-            SELECT prospect_name, prospect_company, referral_date, status, deal_value, commission_amount
-            FROM referrals
-            WHERE partner_id = ?
-            ORDER BY referral_date DESC
-            LIMIT 10
-        ''', (partner_id,))
-        
-        recent_referrals = cursor.fetchall()
-        
-        # Get unpaid commissions
-        cursor.execute('''
-            SELECT COALESCE(SUM(commission_amount), 0)
-            FROM referrals
-            WHERE partner_id = ? AND status = 'converted' AND payment_date IS NULL
-        ''', (partner_id,))
-        
-        unpaid_commissions = cursor.fetchone()[0]
-        
-        conn.close()
+        # One read transaction so every figure comes from the same snapshot
+        with self.unit_of_work(write=False) as cursor:
+            partner = self.get_partner_by_id(partner_id)
+            if not partner:
+                return {}
+            
+            # Get referral statistics
+            cursor.execute('''
+                SELECT
+                    COUNT(*) as total_referrals,
+                    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_referrals,
+                    COUNT(CASE WHEN status = 'qualified' THEN 1 END) as qualified_referrals,
+                    COUNT(CASE WHEN status = 'converted' THEN 1 END) as converted_referrals,
+                    COALESCE(SUM(CASE WHEN status = 'converted' THEN deal_value END), 0) as total_revenue,
+                    COALESCE(SUM(CASE WHEN status = 'converted' THEN commission_amount END), 0) as total_commissions
+                FROM referrals
+                WHERE partner_id = ?
+            ''', (partner_id,))
+            
+            referral_stats = cursor.fetchone()
+            
+            # Get recent referrals
+            cursor.execute('''
+                SELECT prospect_name, prospect_company, referral_date, status, deal_value, commission_amount
+                FROM referrals
+                WHERE partner_id = ?
+                ORDER BY referral_date DESC
+                LIMIT 10
+            ''', (partner_id,))
+            
+            recent_referrals = cursor.fetchall()
+            
+            # Get unpaid commissions
+            cursor.execute('''
+                SELECT COALESCE(SUM(commission_amount), 0)
+                FROM referrals
+                WHERE partner_id = ? AND status = 'converted' AND payment_date IS NULL
+            ''', (partner_id,))
+            
+            unpaid_commissions = cursor.fetchone()[0]
         
         # Calculate next tier requirements
         current_tier = partner.tier
@@ -686,17 +1584,159 @@ class PartnerReferralManager:
         """
         Log partner activity
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.log_partner_activities([(partner_id, activity_type, description, datetime.now().isoformat())])
+    
+    def log_partner_activities(self, entries: List[Tuple[str, str, str, str]]):
+        """
+        Log (partner_id, activity_type, description, activity_date) entries.
+        Inside a unit of work they reach the activity log when it commits.
+        """
+        pending = getattr(self._local, 'activities', None)
+        if pending is not None:
+            pending.extend(entries)
+        else:
+            self.activity_logger.log_many(entries)
+    
+    def get_partner_activities(self, partner_id: Optional[str] = None, activity_type: Optional[str] = None,
+                               start_date: Optional[str] = None, end_date: Optional[str] = None,
+                               limit: Optional[int] = 100) -> List[Dict]:
+        """
+        Partner activities across the monthly partitions, newest first
+        """
+        return self.activity_logger.query(partner_id, activity_type, start_date, end_date, limit)
+    
+    def quarter_of(self, date: str) -> str:
+        """
+        Leaderboard quarter key (e.g. 2026-Q3) for an ISO date
+        """
+        day = datetime.fromisoformat(date)
+        return f"{day.year}-Q{(day.month + 2) // 3}"
+    
+    def get_partner_leaderboard(self, tier: Optional[PartnerTier] = None, quarter: Optional[str] = None,
+                                limit: int = 10) -> List[Dict]:
+        """
+        Top active partners by revenue, all-time or for one quarter (e.g.
+        2026-Q3), optionally within a tier. Rows are read in index order, so
+        no sort over the partner table is needed.
+        """
+        tier_value = tier.value if hasattr(tier, 'value') else tier
+        
+        with self.unit_of_work(write=False) as cursor:
+            if quarter is None:
+                cursor.execute(f'''
+                    SELECT id, company_name, tier, total_revenue_generated, total_referrals
+                    FROM partners
+                    WHERE status = 'active' {"AND tier = ?" if tier_value else ""}
+                    ORDER BY total_revenue_generated DESC
+                    LIMIT ?
+                ''', ((tier_value,) if tier_value else ()) + (limit,))
+            else:
+                cursor.execute(f'''
+                    SELECT p.id, p.company_name, p.tier, q.revenue, q.conversions
+                    FROM partner_quarterly_revenue q
+                    JOIN partners p ON p.id = q.partner_id
+                    WHERE q.quarter = ? AND q.revenue > 0 AND p.status = 'active'
+                      {"AND p.tier = ?" if tier_value else ""}
+                    ORDER BY q.revenue DESC
+                    LIMIT ?
+                ''', (quarter,) + ((tier_value,) if tier_value else ()) + (limit,))
+            rows = cursor.fetchall()
+        
+        return [{
+            'rank': rank,
+            'partner_id': row[0],
+            'company_name': row[1],
+            'tier': row[2],
+            'revenue': row[3],
+            'referrals' if quarter is None else 'conversions': row[4]
+        } for rank, row in enumerate(rows, start=1)]
+    
+    def quarter_start(self, day: datetime) -> datetime:
+        """
+        Midnight on the first day of the quarter containing day
+        """
+        return datetime(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    
+    def run_quarterly_volume_bonuses(self, start_date: Optional[str] = None,
+                                     end_date: Optional[str] = None) -> Dict:
+        """
+        Award quarterly_volume_bonus for every partner and quarter in
+        [start_date, end_date) whose converted deal volume reaches the
+        threshold. Defaults to the four quarters before the current one.
+        The window is narrowed to whole quarters (start rounded up, end
+        rounded down) so a partial quarter is never awarded on part of its
+        volume. Bonuses already in the ledger are skipped, so runs can be
+        repeated.
+        """
+        bonus_terms = self.commission_structure["bonus_structures"]["quarterly_volume_bonus"]
+        current_quarter = self.quarter_start(datetime.now())
+        window_end = self.quarter_start(datetime.fromisoformat(end_date)) if end_date else current_quarter
+        if start_date:
+            window_start = self.quarter_start(datetime.fromisoformat(start_date))
+            if window_start < datetime.fromisoformat(start_date):
+                window_start = self.quarter_start(window_start + timedelta(days=93))
+        else:
+            window_start = current_quarter.replace(year=current_quarter.year - 1)
+        start_date, end_date = window_start.isoformat(), window_end.isoformat()
         
-        cursor.execute('''
-            INSERT INTO partner_activities
-            (partner_id, activity_type, activity_description, activity_date)
-            VALUES (?, ?, ?, ?)
-        ''', (partner_id, activity_type, description, datetime.now().isoformat()))
+        with self.unit_of_work() as cursor:
+            cursor.execute('''
+                SELECT partner_id, substr(conversion_date, 1, 4) || '-Q' || ((CAST(substr(conversion_date, 6, 2) AS INTEGER) + 2) / 3) AS quarter, SUM(deal_value), COUNT(*)
+                FROM referrals
+                WHERE conversion_date >= ? AND conversion_date < ?
+                  AND status IN ('converted', 'paid')
+                GROUP BY partner_id, quarter
+                HAVING SUM(deal_value) >= ?
+            ''', (start_date, end_date, bonus_terms["threshold"]))
+            qualifying = cursor.fetchall()
+            
+            quarters = sorted({row[1] for row in qualifying})
+            cursor.execute('''
+                SELECT partner_id, reference_id FROM commission_ledger
+                WHERE entry_type = 'quarterly_volume_bonus'
+                  AND reference_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(quarters),))
+            awarded = set(cursor.fetchall())
+            
+            bonuses = [(partner_id, quarter, volume, round(volume * bonus_terms["bonus_rate"], 2))
+                       for partner_id, quarter, volume, _ in qualifying
+                       if (partner_id, quarter) not in awarded]
+            
+            self._post_ledger_entries(cursor, [
+                (partner_id, "quarterly_volume_bonus", LedgerAccount.COMMISSION_EXPENSE,
+                 LedgerAccount.PARTNER_PAYABLE, bonus, quarter)
+                for partner_id, quarter, _, bonus in bonuses
+            ])
+            
+            cursor.executemany('''
+                UPDATE partners
+                SET total_commissions_earned = total_commissions_earned + ?
+                WHERE id = ?
+            ''', [(bonus, partner_id) for partner_id, _, _, bonus in bonuses])
+            
+            self.log_partner_activities([
+                (partner_id, "bonus_applied",
+                 f"Quarterly volume bonus for {quarter}: ${bonus:,.2f} on ${volume:,.2f} in deals",
+                 datetime.now().isoformat())
+                for partner_id, quarter, volume, bonus in bonuses
+            ])
         
-        conn.commit()
-        conn.close()
+        return {
+            'window': f"{start_date} to {end_date}",
+            'quarters': quarters,
+            'qualifying_partner_quarters': len(qualifying),
+            'bonuses_created': len(bonuses),
+            'already_awarded': len(qualifying) - len(bonuses),
+            'total_bonus': round(sum(bonus[3] for bonus in bonuses), 2)
+        }
+    
+    def rebuild_partner_leaderboard(self):
+        """
+        Recompute per-quarter partner revenue from referrals
+        """
+        with self.unit_of_work() as cursor:
+            cursor.execute('DELETE FROM partner_quarterly_revenue')
+            self._fill_partner_quarterly_revenue(cursor)
     
     def generate_partner_report(self, start_date: str, end_date: str) -> Dict:
         """
@@ -789,6 +1829,349 @@ class PartnerReferralManager:
             ]
         }
 
+def benchmark_unit_of_work(db_path: str = "partner_uow_benchmark.db", partners: int = 100,
+                           referrals_per_partner: int = 5) -> Dict:
+    """
+    Operations per second for the same partner/referral workload with one
+    connection per manager call (before) and shared units of work (after)
+    """
+    class PerCallConnectionManager(PartnerReferralManager):
+        @contextmanager
+        def unit_of_work(self, write: bool = True):
+            # The way the manager worked before units of work were shared: a
+            # connection per call with every statement committed on its own
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.isolation_level = None
+            try:
+                yield conn.cursor()
+            finally:
+                conn.close()
+    
+    results = {}
+    for label, manager_class in (("per_call_connections", PerCallConnectionManager),
+                                 ("unit_of_work", PartnerReferralManager)):
+        referral_manager = manager_class(db_path)
+        run = uuid.uuid4().hex[:8]
+        operations = 0
+        
+        started = time.perf_counter()
+        for p in range(partners):
+            partner_id = referral_manager.create_partner(
+                f"Bench Partner {p}", "Bench Contact", f"{label}-{run}-{p}@partners.example.com",
+                "+1-555-0100", "partners.example.com", "Technology"
+            )
+            operations += 1
+            for r in range(referrals_per_partner):
+                referral_id = referral_manager.create_referral(
+                    partner_id, f"lead{r}@prospect.example.com", f"Lead {r}", "ProspectCorp"
+                )
+                operations += 1
+                if r % 2 == 0:
+                    referral_manager.convert_referral(referral_id, 20000.0 + r * 15000)
+                    operations += 1
+            referral_manager.get_partner_dashboard(partner_id)
+            operations += 1
+        elapsed = time.perf_counter() - started
+        referral_manager.close()
+        
+        results[label] = {
+            'operations': operations,
+            'seconds': round(elapsed, 3),
+            'operations_per_second': round(operations / elapsed) if elapsed > 0 else operations
+        }
+    
+    before = results["per_call_connections"]["operations_per_second"]
+    after = results["unit_of_work"]["operations_per_second"]
+    results['speedup'] = round(after / before, 2) if before else 0.0
+    return results
+
+def benchmark_payout_run(db_path: str = "partner_payout_benchmark.db", partners: int = 5000,
+                         referrals_per_partner: int = 4, per_partner_sample: int = 200) -> Dict:
+    """
+    Time one batch payout run over all partners against per-partner
+    create_commission_payout calls (timed on a sample and extrapolated)
+    """
+    referral_manager = PartnerReferralManager(db_path)
+    run = uuid.uuid4().hex[:8]
+    converted_at = datetime.now().isoformat()
+    
+    def seed(label: str, count: int) -> List[str]:
+        partner_ids = [str(uuid.uuid4()) for _ in range(count)]
+        with referral_manager.unit_of_work() as cursor:
+            cursor.executemany('''
+                INSERT INTO partners
+                (id, company_name, contact_name, email, phone, website, industry, tier,
+                 commission_rate, join_date, status, created_date)
+                VALUES (?, ?, 'Bench Contact', ?, '', '', 'Technology', 'bronze', 0.10, ?, 'active', ?)
+            ''', [(partner_id, f"Bench {i}", f"{label}-{run}-{i}@partners.example.com", converted_at, converted_at)
+                  for i, partner_id in enumerate(partner_ids)])
+            cursor.executemany('''
+                INSERT INTO referrals
+                (id, partner_id, prospect_email, prospect_name, prospect_company, referral_date,
+                 status, deal_value, commission_rate, commission_amount, conversion_date, notes)
+                VALUES (?, ?, 'lead@prospect.example.com', 'Lead', 'ProspectCorp', ?, 'converted', 20000, 0.10, 2200, ?, '')
+            ''', [(str(uuid.uuid4()), partner_id, converted_at, converted_at)
+                  for partner_id in partner_ids for _ in range(referrals_per_partner)])
+        return partner_ids
+    
+    seed("batch", partners)
+    sample_ids = seed("single", per_partner_sample)
+    
+    # The sample partners are paid one by one first so the batch only sees the rest
+    started = time.perf_counter()
+    for partner_id in sample_ids:
+        referral_manager.create_commission_payout(partner_id)
+    per_partner_seconds = time.perf_counter() - started
+    
+    period = f"bench-{run}"
+    started = time.perf_counter()
+    result = referral_manager.run_payout_batch(period)
+    batch_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    rerun = referral_manager.run_payout_batch(period)
+    rerun_seconds = time.perf_counter() - started
+    
+    per_partner_rate = per_partner_sample / per_partner_seconds if per_partner_seconds > 0 else float(per_partner_sample)
+    referral_manager.close()
+    
+    return {
+        'partners': result['payouts_created'],
+        'referrals_paid': result['referrals_paid'],
+        'batch_seconds': round(batch_seconds, 3),
+        'per_partner_estimated_seconds': round(partners / per_partner_rate, 3),
+        'speedup': round((partners / per_partner_rate) / batch_seconds, 1) if batch_seconds > 0 else 0.0,
+        'rerun_payouts_created': rerun['payouts_created'],
+        'rerun_seconds': round(rerun_seconds, 3)
+    }
+
+def benchmark_bulk_conversion(db_path: str = "partner_conversion_benchmark.db", partners: int = 500,
+                              referrals: int = 10000, per_row_sample: int = 300) -> Dict:
+    """
+    Compare convert_referrals_bulk with per-row convert_referral (timed on a
+    sample and extrapolated) for a nightly closed-won sync
+    """
+    referral_manager = PartnerReferralManager(db_path)
+    run = uuid.uuid4().hex[:8]
+    created_at = datetime.now().isoformat()
+    partner_ids = [str(uuid.uuid4()) for _ in range(partners)]
+    referral_rows = [(str(uuid.uuid4()), partner_ids[i % partners]) for i in range(referrals + per_row_sample)]
+    
+    with referral_manager.unit_of_work() as cursor:
+        cursor.executemany('''
+            INSERT INTO partners
+            (id, company_name, contact_name, email, phone, website, industry, tier,
+             commission_rate, join_date, status, total_referrals, created_date)
+            VALUES (?, ?, 'Bench Contact', ?, '', '', 'Technology', 'bronze', 0.10, ?, 'active', ?, ?)
+        ''', [(partner_id, f"Bench {i}", f"convert-{run}-{i}@partners.example.com", created_at,
+               (referrals + per_row_sample) // partners, created_at)
+              for i, partner_id in enumerate(partner_ids)])
+        cursor.executemany('''
+            INSERT INTO referrals
+            (id, partner_id, prospect_email, prospect_name, prospect_company, referral_date,
+             status, commission_rate, notes)
+            VALUES (?, ?, 'lead@prospect.example.com', 'Lead', 'ProspectCorp', ?, 'pending', 0.10, '')
+        ''', [(referral_id, partner_id, created_at) for referral_id, partner_id in referral_rows])
+    
+    deal_values = [5000 + (i * 7919) % 150000 for i in range(len(referral_rows))]
+    sample = [(referral_rows[i][0], deal_values[i]) for i in range(per_row_sample)]
+    export = [(referral_rows[i][0], deal_values[i]) for i in range(per_row_sample, len(referral_rows))]
+    
+    started = time.perf_counter()
+    for referral_id, deal_value in sample:
+        referral_manager.convert_referral(referral_id, deal_value)
+    per_row_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    result = referral_manager.convert_referrals_bulk(export)
+    bulk_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    resync = referral_manager.convert_referrals_bulk(export)
+    resync_seconds = time.perf_counter() - started
+    
+    per_row_rate = per_row_sample / per_row_seconds if per_row_seconds > 0 else float(per_row_sample)
+    referral_manager.close()
+    
+    return {
+        'converted': result['converted'],
+        'tier_changes': result['tier_changes'],
+        'bulk_seconds': round(bulk_seconds, 3),
+        'per_row_estimated_seconds': round(referrals / per_row_rate, 3),
+        'speedup': round((referrals / per_row_rate) / bulk_seconds, 1) if bulk_seconds > 0 else 0.0,
+        'resync_converted': resync['converted'],
+        'resync_seconds': round(resync_seconds, 3)
+    }
+
+def benchmark_tier_reevaluation(db_path: str = "partner_tier_benchmark.db", partners: int = 50000,
+                                per_partner_sample: int = 500) -> Dict:
+    """
+    Compare reevaluate_all_tiers with per-partner check_tier_upgrade calls
+    (timed on a sample and extrapolated) over a freshly seeded program
+    """
+    referral_manager = PartnerReferralManager(db_path)
+    rng = random.Random(46)
+    run = uuid.uuid4().hex[:8]
+    created_at = datetime.now().isoformat()
+    
+    def seed(label: str, count: int) -> List[str]:
+        partner_ids = [str(uuid.uuid4()) for _ in range(count)]
+        with referral_manager.unit_of_work() as cursor:
+            cursor.executemany('''
+                INSERT INTO partners
+                (id, company_name, contact_name, email, phone, website, industry, tier,
+                 commission_rate, join_date, status, total_referrals, total_revenue_generated, created_date)
+                VALUES (?, ?, 'Bench Contact', ?, '', '', 'Technology', 'bronze', 0.10, ?, 'active', ?, ?, ?)
+            ''', [(partner_id, f"Bench {i}", f"{label}-{run}-{i}@partners.example.com", created_at,
+                   rng.randint(0, 40), rng.randint(0, 600) * 1000, created_at)
+                  for i, partner_id in enumerate(partner_ids)])
+        return partner_ids
+    
+    sample_ids = seed("single", per_partner_sample)
+    started = time.perf_counter()
+    for partner_id in sample_ids:
+        referral_manager.check_tier_upgrade(partner_id)
+    per_partner_seconds = time.perf_counter() - started
+    
+    seed("batch", partners)
+    started = time.perf_counter()
+    result = referral_manager.reevaluate_all_tiers()
+    batch_seconds = time.perf_counter() - started
+    
+    per_partner_rate = per_partner_sample / per_partner_seconds if per_partner_seconds > 0 else float(per_partner_sample)
+    referral_manager.close()
+    
+    return {
+        'partners_evaluated': result['partners_evaluated'],
+        'tier_changes': result['tier_changes'],
+        'batch_seconds': round(batch_seconds, 3),
+        'per_partner_estimated_seconds': round(partners / per_partner_rate, 3),
+        'speedup': round((partners / per_partner_rate) / batch_seconds, 1) if batch_seconds > 0 else 0.0
+    }
+
+def benchmark_leaderboard(db_path: str = "partner_leaderboard_benchmark.db", partners: int = 20000,
+                          referrals_per_partner: int = 5, reads: int = 200) -> Dict:
+    """
+    Leaderboard reads per second (all-time, per tier, per quarter) against
+    sorting the full partner list in Python for each read
+    """
+    referral_manager = PartnerReferralManager(db_path)
+    rng = random.Random(49)
+    run = uuid.uuid4().hex[:8]
+    created_at = datetime.now().isoformat()
+    partner_ids = [str(uuid.uuid4()) for _ in range(partners)]
+    tiers = [tier.value for tier in PartnerTier]
+    
+    with referral_manager.unit_of_work() as cursor:
+        cursor.executemany('''
+            INSERT INTO partners
+            (id, company_name, contact_name, email, phone, website, industry, tier,
+             commission_rate, join_date, status, created_date)
+            VALUES (?, ?, 'Bench Contact', ?, '', '', 'Technology', ?, 0.10, ?, 'active', ?)
+        ''', [(partner_id, f"Bench {i}", f"leaderboard-{run}-{i}@partners.example.com", rng.choice(tiers),
+               created_at, created_at)
+              for i, partner_id in enumerate(partner_ids)])
+        cursor.executemany('''
+            INSERT INTO referrals
+            (id, partner_id, prospect_email, prospect_name, prospect_company, referral_date,
+             status, commission_rate, notes)
+            VALUES (?, ?, 'lead@prospect.example.com', 'Lead', 'ProspectCorp', ?, 'pending', 0.10, '')
+        ''', [(str(uuid.uuid4()), partner_id, created_at)
+              for partner_id in partner_ids for _ in range(referrals_per_partner)])
+        cursor.execute('SELECT id FROM referrals WHERE partner_id IN (SELECT value FROM json_each(?))',
+                       (json.dumps(partner_ids),))
+        referral_ids = [row[0] for row in cursor.fetchall()]
+    
+    started = time.perf_counter()
+    referral_manager.convert_referrals_bulk([(referral_id, rng.randint(1000, 200000)) for referral_id in referral_ids])
+    conversion_seconds = time.perf_counter() - started
+    
+    quarter = referral_manager.quarter_of(created_at)
+    started = time.perf_counter()
+    for i in range(reads):
+        referral_manager.get_partner_leaderboard()
+        referral_manager.get_partner_leaderboard(tier=PartnerTier(tiers[i % len(tiers)]))
+        referral_manager.get_partner_leaderboard(quarter=quarter)
+    indexed_seconds = time.perf_counter() - started
+    
+    sample_reads = max(1, reads // 20)
+    started = time.perf_counter()
+    for _ in range(sample_reads):
+        with referral_manager.unit_of_work(write=False) as cursor:
+            cursor.execute("SELECT id, company_name, tier, total_revenue_generated FROM partners WHERE status = 'active'")
+            sorted(cursor.fetchall(), key=lambda row: row[3], reverse=True)[:10]
+    sort_seconds = (time.perf_counter() - started) * reads * 3 / sample_reads
+    
+    top_partner = referral_manager.get_partner_leaderboard(quarter=quarter, limit=1)
+    referral_manager.close()
+    
+    return {
+        'partners': partners,
+        'conversion_seconds': round(conversion_seconds, 3),
+        'leaderboard_reads': reads * 3,
+        'indexed_seconds': round(indexed_seconds, 3),
+        'full_sort_estimated_seconds': round(sort_seconds, 3),
+        'speedup': round(sort_seconds / indexed_seconds, 1) if indexed_seconds > 0 else 0.0,
+        'top_partner_this_quarter': top_partner
+    }
+
+def benchmark_volume_bonuses(db_path: str = "partner_bonus_benchmark.db", partners: int = 10000,
+                             conversions_per_partner: int = 12) -> Dict:
+    """
+    One volume bonus run over a year of converted referrals for all partners,
+    followed by a repeat run that must award nothing
+    """
+    referral_manager = PartnerReferralManager(db_path)
+    rng = random.Random(50)
+    run = uuid.uuid4().hex[:8]
+    window_end = referral_manager.quarter_start(datetime.now())
+    window_start = window_end.replace(year=window_end.year - 1)
+    partner_ids = [str(uuid.uuid4()) for _ in range(partners)]
+    
+    with referral_manager.unit_of_work() as cursor:
+        cursor.executemany('''
+            INSERT INTO partners
+            (id, company_name, contact_name, email, phone, website, industry, tier,
+             commission_rate, join_date, status, created_date)
+            VALUES (?, ?, 'Bench Contact', ?, '', '', 'Technology', 'bronze', 0.10, ?, 'active', ?)
+        ''', [(partner_id, f"Bench {i}", f"bonus-{run}-{i}@partners.example.com",
+               window_start.isoformat(), window_start.isoformat())
+              for i, partner_id in enumerate(partner_ids)])
+        conversions = []
+        for partner_id in partner_ids:
+            for _ in range(conversions_per_partner):
+                converted_at = window_start + timedelta(seconds=rng.randint(0, 364 * 86400))
+                deal_value = rng.randint(1000, 40000)
+                conversions.append((str(uuid.uuid4()), partner_id, converted_at.isoformat(), deal_value,
+                                    deal_value * 0.10, converted_at.isoformat()))
+        cursor.executemany('''
+            INSERT INTO referrals
+            (id, partner_id, prospect_email, prospect_name, prospect_company, referral_date,
+             status, deal_value, commission_rate, commission_amount, conversion_date, notes)
+            VALUES (?, ?, 'lead@prospect.example.com', 'Lead', 'ProspectCorp', ?, 'converted', ?, 0.10, ?, ?, '')
+        ''', conversions)
+    
+    started = time.perf_counter()
+    result = referral_manager.run_quarterly_volume_bonuses(window_start.isoformat(), window_end.isoformat())
+    run_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    rerun = referral_manager.run_quarterly_volume_bonuses(window_start.isoformat(), window_end.isoformat())
+    rerun_seconds = time.perf_counter() - started
+    
+    referral_manager.close()
+    
+    return {
+        'partners': partners,
+        'conversions': len(conversions),
+        'quarters': result['quarters'],
+        'bonuses_created': result['bonuses_created'],
+        'total_bonus': result['total_bonus'],
+        'run_seconds': round(run_seconds, 3),
+        'rerun_bonuses_created': rerun['bonuses_created'],
+        'rerun_seconds': round(rerun_seconds, 3)
+    }
+
 def main():
     """
     Example usage of partner referral program system
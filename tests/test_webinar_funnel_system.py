@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webinar_funnel_system import WebinarFunnelManager
+
+
+class ReRegistrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "webinar.db")
+        self.manager = WebinarFunnelManager(self.db_path)
+        self.webinar_id = self.manager.create_webinar_event(
+            "revenue_automation_masterclass", (datetime.now() + timedelta(days=3)).isoformat()
+        )
+        self.steps = [email["type"] for email in self.manager.email_sequences["registration_confirmation"].emails]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def register(self):
+        return self.manager.register_attendee(self.webinar_id, "ann@example.com", "Ann", "Lee", "Acme")
+
+    def dispatch_all(self):
+        return self.manager.dispatch_due_emails(now=datetime.now() + timedelta(days=30), sender=lambda email: True)
+
+    def assert_one_email_per_step(self, sent):
+        self.assertEqual(Counter(email["email_type"] for email in sent), Counter(self.steps))
+
+    def test_reregistering_after_cancel_sends_one_email_per_step(self):
+        registrant_id = self.register()
+        self.assertTrue(self.manager.cancel_registration(registrant_id))
+        self.assertEqual(self.register(), registrant_id)
+
+        sent = self.dispatch_all()
+
+        self.assert_one_email_per_step(sent)
+        self.assertEqual({email["registrant_id"] for email in sent}, {registrant_id})
+
+    def test_reactivation_skips_rows_left_pending_by_an_old_cancellation(self):
+        registrant_id = self.register()
+        self.manager.cancel_registration(registrant_id)
+        # Cancellations made before queued emails were skipped left them pending
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE webinar_email_outbox SET status = 'pending' WHERE registrant_id = ?", (registrant_id,))
+        conn.commit()
+        conn.close()
+
+        self.register()
+
+        self.assert_one_email_per_step(self.dispatch_all())
+
+    def test_cancelled_registrant_gets_no_emails(self):
+        self.manager.cancel_registration(self.register())
+
+        self.assertEqual(self.dispatch_all(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
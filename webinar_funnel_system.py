@@ -4,11 +4,18 @@ Webinar Funnel System for Closing High-Value Deals
 Complete webinar automation from registration to conversion
 """
 
+import bisect
+import csv
 import json
+import queue
+import random
+import re
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional, Any
+from dataclasses import dataclass, asdict, astuple
+from typing import List, Dict, Optional, Any, Iterator, Callable
 # Removed external dependencies for testing
 # from email.mime.text import MIMEText, MIMEMultipart
 # import smtplib
@@ -43,7 +50,7 @@ class WebinarRegistrant:
     title: str
     phone: str
     registration_date: str
-    attendance_status: str  # registered, attended, no_show
+    attendance_status: str  # registered, waitlisted, cancelled, attended, no_show
     engagement_score: int
     converted: bool
     conversion_value: float
@@ -54,12 +61,64 @@ class WebinarSequence:
     emails: List[Dict[str, Any]]
     triggers: List[str]
 
+@dataclass
+class RecurrenceRule:
+    start: str  # first session, ISO datetime
+    interval_minutes: int
+    weekdays: Optional[List[int]] = None  # 0 = Monday; None runs every day
+    daily_start_hour: int = 0
+    daily_end_hour: int = 24
+    
+    def occurrences(self, after: Optional[datetime], until: datetime) -> Iterator[datetime]:
+        """
+        Session start times strictly after `after` (from the start when None) up to `until`
+        """
+        start = datetime.fromisoformat(self.start)
+        interval = timedelta(minutes=self.interval_minutes)
+        
+        current = start
+        if after is not None and after >= start:
+            current = start + interval * ((after - start) // interval + 1)
+        
+        while current <= until:
+            if ((self.weekdays is None or current.weekday() in self.weekdays)
+                    and self.daily_start_hour <= current.hour < self.daily_end_hour):
+                yield current
+            current += interval
+
 class WebinarFunnelManager:
+    EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+    PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+    # Zoom-style US timestamps accepted in attendance reports besides ISO
+    ATTENDANCE_TIME_FORMATS = ("%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %I:%M %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M")
+    WATCH_POINTS = 70
+    # Attendance statuses that still receive outbox emails
+    SENDABLE_STATUSES = ("registered", "attended", "no_show")
+    OFFER_CONTEXT = {
+        'offer_title': 'Revenue Automation Implementation Program',
+        'regular_price': '4,997',
+        'special_price': '2,997',
+        'replay_price': '3,497',
+        'savings': '2,000',
+        'resources_link': 'https://resources.example.com/toolkit',
+        'offer_link': 'https://offer.example.com/revenue-automation',
+        'booking_link': 'https://calendar.example.com/book-call',
+        'calendar_link': 'https://calendar.example.com/add-event',
+        'prep_link': 'https://prep.example.com/questionnaire'
+    }
+    
     def __init__(self, db_path="webinar_funnel.db"):
         self.db_path = db_path
         self.init_database()
         self.email_sequences = self.load_email_sequences()
+        self.email_configs = {
+            (sequence.name, email_config["type"]): email_config
+            for sequence in self.email_sequences.values()
+            for email_config in sequence.emails
+        }
         self.webinar_templates = self.load_webinar_templates()
+        # webinar_id -> (context_version, webinar half of the email context)
+        self.webinar_context_cache: Dict[str, tuple] = {}
     
     def init_database(self):
         conn = sqlite3.connect(self.db_path)
@@ -81,10 +140,59 @@ class WebinarFunnelManager:
                 target_audience TEXT,
                 offer_price REAL,
                 offer_description TEXT,
+                created_date TEXT,
+                seats_taken INTEGER DEFAULT 0,
+                waitlist_count INTEGER DEFAULT 0,
+                context_version INTEGER DEFAULT 0,
+                series_id TEXT
+            )
+        ''')
+        
+        # Seat counters maintained on every registration and cancellation
+        if self._ensure_column(cursor, 'webinar_events', 'seats_taken', 'INTEGER DEFAULT 0'):
+            cursor.execute('''
+                UPDATE webinar_events SET seats_taken = (
+                    SELECT COUNT(*) FROM webinar_registrants r
+                    WHERE r.webinar_id = webinar_events.id
+                      AND r.attendance_status IN ('registered', 'attended', 'no_show')
+                )
+            ''')
+        self._ensure_column(cursor, 'webinar_events', 'waitlist_count', 'INTEGER DEFAULT 0')
+        self._ensure_column(cursor, 'webinar_events', 'context_version', 'INTEGER DEFAULT 0')
+        self._ensure_column(cursor, 'webinar_events', 'series_id', 'TEXT')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_events_series
+            ON webinar_events (series_id, date_time)
+            WHERE series_id IS NOT NULL
+        ''')
+        
+        # Evergreen series: sessions are materialized up to generated_until
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webinar_series (
+                id TEXT PRIMARY KEY,
+                template_name TEXT,
+                presenter TEXT,
+                recurrence_rule TEXT,
+                max_attendees INTEGER,
+                generated_until TEXT,
+                status TEXT DEFAULT 'active',
                 created_date TEXT
             )
         ''')
         
+        # Bump the version whenever a field used for email personalization changes
+        # so cached webinar contexts get rebuilt; seat counter updates don't count
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS webinar_events_context_version
+            AFTER UPDATE OF title, description, presenter, date_time, duration_minutes,
+                            zoom_link, replay_url, offer_price, offer_description
+            ON webinar_events
+            BEGIN
+                UPDATE webinar_events SET context_version = context_version + 1 WHERE id = NEW.id;
+            END
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS webinar_registrants (
                 id TEXT PRIMARY KEY,
@@ -104,6 +212,107 @@ class WebinarFunnelManager:
             )
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_registrants_webinar
+            ON webinar_registrants (webinar_id)
+        ''')
+        
+        # Oldest waitlisted registrant is promoted when a seat frees up
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_registrants_waitlist
+            ON webinar_registrants (webinar_id, attendance_status, registration_date)
+        ''')
+        
+        # Acknowledged write-behind registrations that could not be written
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webinar_registration_retry (
+                registrant_id TEXT PRIMARY KEY,
+                registrant_row TEXT,
+                error TEXT,
+                failed_at TEXT
+            )
+        ''')
+        
+        # Per-webinar rollups read by the metrics APIs; kept current by triggers
+        # inside whichever transaction writes the registrant row
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webinar_rollups (
+                webinar_id TEXT PRIMARY KEY,
+                registered INTEGER DEFAULT 0,
+                attended INTEGER DEFAULT 0,
+                no_shows INTEGER DEFAULT 0,
+                converted INTEGER DEFAULT 0,
+                revenue REAL DEFAULT 0,
+                FOREIGN KEY (webinar_id) REFERENCES webinar_events (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS webinar_rollups_new_webinar
+            AFTER INSERT ON webinar_events
+            BEGIN
+                INSERT OR IGNORE INTO webinar_rollups (webinar_id) VALUES (NEW.id);
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS webinar_rollups_registrant_insert
+            AFTER INSERT ON webinar_registrants
+            BEGIN
+                UPDATE webinar_rollups SET
+                    registered = registered + 1,
+                    attended = attended + (NEW.attendance_status = 'attended'),
+                    no_shows = no_shows + (NEW.attendance_status = 'no_show'),
+                    converted = converted + (NEW.converted = TRUE),
+                    revenue = revenue + COALESCE(NEW.conversion_value, 0)
+                WHERE webinar_id = NEW.webinar_id;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS webinar_rollups_registrant_update
+            AFTER UPDATE OF attendance_status, converted, conversion_value ON webinar_registrants
+            WHEN OLD.attendance_status IS NOT NEW.attendance_status
+              OR OLD.converted IS NOT NEW.converted
+              OR OLD.conversion_value IS NOT NEW.conversion_value
+            BEGIN
+                UPDATE webinar_rollups SET
+                    attended = attended + (NEW.attendance_status = 'attended') - (OLD.attendance_status = 'attended'),
+                    no_shows = no_shows + (NEW.attendance_status = 'no_show') - (OLD.attendance_status = 'no_show'),
+                    converted = converted + (NEW.converted = TRUE) - (OLD.converted = TRUE),
+                    revenue = revenue + COALESCE(NEW.conversion_value, 0) - COALESCE(OLD.conversion_value, 0)
+                WHERE webinar_id = NEW.webinar_id;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS webinar_rollups_registrant_delete
+            AFTER DELETE ON webinar_registrants
+            BEGIN
+                UPDATE webinar_rollups SET
+                    registered = registered - 1,
+                    attended = attended - (OLD.attendance_status = 'attended'),
+                    no_shows = no_shows - (OLD.attendance_status = 'no_show'),
+                    converted = converted - (OLD.converted = TRUE),
+                    revenue = revenue - COALESCE(OLD.conversion_value, 0)
+                WHERE webinar_id = OLD.webinar_id;
+            END
+        ''')
+        
+        # Webinars created before rollups existed get theirs computed once
+        cursor.execute('''
+            INSERT INTO webinar_rollups (webinar_id, registered, attended, no_shows, converted, revenue)
+            SELECT w.id, COUNT(r.id),
+                   COUNT(CASE WHEN r.attendance_status = 'attended' THEN 1 END),
+                   COUNT(CASE WHEN r.attendance_status = 'no_show' THEN 1 END),
+                   COUNT(CASE WHEN r.converted = TRUE THEN 1 END),
+                   COALESCE(SUM(r.conversion_value), 0)
+            FROM webinar_events w
+            LEFT JOIN webinar_registrants r ON r.webinar_id = w.id
+            WHERE w.id NOT IN (SELECT webinar_id FROM webinar_rollups)
+            GROUP BY w.id
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS webinar_emails (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -117,6 +326,51 @@ class WebinarFunnelManager:
             )
         ''')
         
+        # Emails waiting to be sent; rendered only when a dispatcher claims them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webinar_email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                registrant_id TEXT,
+                sequence_name TEXT,
+                email_type TEXT,
+                due_at TEXT,
+                status TEXT DEFAULT 'pending',
+                claim_token TEXT,
+                claimed_at TEXT,
+                FOREIGN KEY (registrant_id) REFERENCES webinar_registrants (id)
+            )
+        ''')
+        
+        # Claims are leases: rows claimed before claimed_at existed are treated as expired
+        self._ensure_column(cursor, 'webinar_email_outbox', 'claimed_at', 'TEXT')
+        cursor.execute('''
+            UPDATE webinar_email_outbox SET claimed_at = '1970-01-01T00:00:00'
+            WHERE status = 'claimed' AND claimed_at IS NULL
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_email_outbox_pending
+            ON webinar_email_outbox (due_at)
+            WHERE status = 'pending'
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_email_outbox_claim
+            ON webinar_email_outbox (claim_token)
+        ''')
+        
+        # Cancelling a registration skips whatever is still queued for it
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_email_outbox_registrant
+            ON webinar_email_outbox (registrant_id)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webinar_email_outbox_lease
+            ON webinar_email_outbox (claimed_at)
+            WHERE status = 'claimed'
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS webinar_conversions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -130,9 +384,97 @@ class WebinarFunnelManager:
             )
         ''')
         
+        # One registration per webinar and normalized email; also serves
+        # attendance-report matching and the re-registration lookup
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_webinar_registrants_email_unique'
+        ''')
+        if not cursor.fetchone():
+            self._merge_duplicate_registrants(cursor)
+            cursor.execute('DROP INDEX IF EXISTS idx_webinar_registrants_email')
+            cursor.execute('''
+                CREATE UNIQUE INDEX idx_webinar_registrants_email_unique
+                ON webinar_registrants (webinar_id, lower(trim(email)))
+            ''')
+        
         conn.commit()
         conn.close()
     
+    def _merge_duplicate_registrants(self, cursor) -> int:
+        """
+        Fold registrants sharing a webinar and normalized email into the earliest
+        one so the unique index can be built; returns the rows removed
+        """
+        cursor.execute('''
+            CREATE TEMP TABLE duplicate_registrants (
+                id TEXT PRIMARY KEY,
+                keeper_id TEXT,
+                webinar_id TEXT
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO duplicate_registrants (id, keeper_id, webinar_id)
+            SELECT r.id, k.id, r.webinar_id
+            FROM (SELECT webinar_id, lower(trim(email)) AS email_key, MIN(rowid) AS keeper_rowid
+                  FROM webinar_registrants
+                  GROUP BY webinar_id, lower(trim(email))
+                  HAVING COUNT(*) > 1) d
+            JOIN webinar_registrants k ON k.rowid = d.keeper_rowid
+            JOIN webinar_registrants r
+              ON r.webinar_id = d.webinar_id AND lower(trim(r.email)) = d.email_key AND r.rowid != d.keeper_rowid
+        ''')
+        removed = cursor.rowcount
+        
+        if removed > 0:
+            # Drop the duplicates' unsent emails, keep their history on the survivor
+            cursor.execute('''
+                DELETE FROM webinar_email_outbox
+                WHERE status = 'pending' AND registrant_id IN (SELECT id FROM duplicate_registrants)
+            ''')
+            for table in ("webinar_email_outbox", "webinar_emails", "webinar_conversions"):
+                cursor.execute(f'''
+                    UPDATE {table}
+                    SET registrant_id = (SELECT keeper_id FROM duplicate_registrants d WHERE d.id = {table}.registrant_id)
+                    WHERE registrant_id IN (SELECT id FROM duplicate_registrants)
+                ''')
+            cursor.execute('''
+                UPDATE webinar_registrants SET
+                    converted = TRUE,
+                    conversion_value = MAX(COALESCE(conversion_value, 0), (
+                        SELECT MAX(r.conversion_value) FROM duplicate_registrants d
+                        JOIN webinar_registrants r ON r.id = d.id
+                        WHERE d.keeper_id = webinar_registrants.id AND r.converted = TRUE))
+                WHERE id IN (SELECT d.keeper_id FROM duplicate_registrants d
+                             JOIN webinar_registrants r ON r.id = d.id
+                             WHERE r.converted = TRUE)
+            ''')
+            cursor.execute('''
+                DELETE FROM webinar_registrants WHERE id IN (SELECT id FROM duplicate_registrants)
+            ''')
+            cursor.execute('''
+                UPDATE webinar_events SET
+                    seats_taken = (SELECT COUNT(*) FROM webinar_registrants r
+                                   WHERE r.webinar_id = webinar_events.id
+                                     AND r.attendance_status IN ('registered', 'attended', 'no_show')),
+                    waitlist_count = (SELECT COUNT(*) FROM webinar_registrants r
+                                      WHERE r.webinar_id = webinar_events.id
+                                        AND r.attendance_status = 'waitlisted')
+                WHERE id IN (SELECT webinar_id FROM duplicate_registrants)
+            ''')
+        
+        cursor.execute('DROP TABLE temp.duplicate_registrants')
+        return removed
+    
+    def _ensure_column(self, cursor, table: str, column: str, definition: str) -> bool:
+        """
+        Add a column to an existing table if it is missing; True if it was added
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column in {row[1] for row in cursor.fetchall()}:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    
     def load_webinar_templates(self) -> Dict[str, Dict]:
         """
         Load webinar templates for different industries and audiences
@@ -440,16 +782,29 @@ Kenneth"""
         if not template:
             raise ValueError(f"Template {template_name} not found")
         
-        webinar_id = str(uuid.uuid4())
+        webinar_event = self._build_webinar_event(template, date_time, presenter)
         
-        webinar_event = WebinarEvent(
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        self.insert_webinar_events(cursor, [webinar_event])
+        
+        conn.commit()
+        conn.close()
+        
+        return webinar_event.id
+    
+    def _build_webinar_event(self, template: Dict, date_time: str, presenter: str,
+                             max_attendees: int = 500) -> WebinarEvent:
+        webinar_id = str(uuid.uuid4())
+        return WebinarEvent(
             id=webinar_id,
             title=template["title"],
             description=template["description"],
             presenter=presenter,
             date_time=date_time,
             duration_minutes=template["duration_minutes"],
-            max_attendees=500,
+            max_attendees=max_attendees,
             registration_url=f"https://registration.example.com/{webinar_id}",
             zoom_link=f"https://zoom.us/j/{webinar_id}",
             replay_url=f"https://replay.example.com/{webinar_id}",
@@ -458,44 +813,117 @@ Kenneth"""
             offer_price=template["offer"]["price"],
             offer_description=template["offer"]["description"]
         )
+    
+    def insert_webinar_events(self, cursor, webinar_events: List[WebinarEvent],
+                              series_id: Optional[str] = None):
+        """
+        Insert webinar events in one executemany without committing
+        """
+        created_date = datetime.now().isoformat()
+        cursor.executemany('''
+            INSERT INTO webinar_events
+            (id, title, description, presenter, date_time, duration_minutes,
+             max_attendees, registration_url, zoom_link, replay_url, status,
+             target_audience, offer_price, offer_description, created_date, series_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [astuple(webinar_event) + (created_date, series_id) for webinar_event in webinar_events])
+    
+    def create_webinar_series(self, template_name: str, rule: RecurrenceRule, horizon_days: int = 90,
+                              presenter: str = "Kenneth", max_attendees: int = 500,
+                              now: Optional[datetime] = None) -> str:
+        """
+        Create an evergreen series and materialize its sessions for the horizon
+        """
+        if template_name not in self.webinar_templates:
+            raise ValueError(f"Template {template_name} not found")
+        if rule.interval_minutes <= 0:
+            raise ValueError("interval_minutes must be positive")
+        
+        now = now or datetime.now()
+        series_id = str(uuid.uuid4())
         
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO webinar_events
-            (id, title, description, presenter, date_time, duration_minutes,
-             max_attendees, registration_url, zoom_link, replay_url, status,
-             target_audience, offer_price, offer_description, created_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            webinar_event.id,
-            webinar_event.title,
-            webinar_event.description,
-            webinar_event.presenter,
-            webinar_event.date_time,
-            webinar_event.duration_minutes,
-            webinar_event.max_attendees,
-            webinar_event.registration_url,
-            webinar_event.zoom_link,
-            webinar_event.replay_url,
-            webinar_event.status,
-            webinar_event.target_audience,
-            webinar_event.offer_price,
-            webinar_event.offer_description,
-            datetime.now().isoformat()
-        ))
+            INSERT INTO webinar_series
+            (id, template_name, presenter, recurrence_rule, max_attendees, generated_until, status, created_date)
+            VALUES (?, ?, ?, ?, ?, NULL, 'active', ?)
+        ''', (series_id, template_name, presenter, json.dumps(asdict(rule)), max_attendees, now.isoformat()))
         
         conn.commit()
         conn.close()
         
-        return webinar_id
+        self.extend_series_horizon(series_id, now + timedelta(days=horizon_days))
+        return series_id
+    
+    def extend_series_horizon(self, series_id: str, until: datetime) -> int:
+        """
+        Materialize the sessions between the series' generated_until and `until`;
+        sessions that already exist are never recreated. Returns sessions added.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # Lock first so two processes cannot generate the same window twice
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT template_name, presenter, recurrence_rule, max_attendees, generated_until
+            FROM webinar_series WHERE id = ?
+        ''', (series_id,))
+        series = cursor.fetchone()
+        if not series:
+            conn.rollback()
+            conn.close()
+            raise ValueError(f"Series {series_id} not found")
+        
+        template_name, presenter, rule_json, max_attendees, generated_until = series
+        # NULL means nothing has been generated yet
+        generated_until = datetime.fromisoformat(generated_until) if generated_until else None
+        if generated_until is not None and until <= generated_until:
+            conn.rollback()
+            conn.close()
+            return 0
+        
+        template = self.webinar_templates[template_name]
+        rule = RecurrenceRule(**json.loads(rule_json))
+        webinar_events = [
+            self._build_webinar_event(template, occurrence.isoformat(), presenter, max_attendees)
+            for occurrence in rule.occurrences(generated_until, until)
+        ]
+        
+        self.insert_webinar_events(cursor, webinar_events, series_id)
+        cursor.execute('''
+            UPDATE webinar_series SET generated_until = ? WHERE id = ?
+        ''', (until.isoformat(), series_id))
+        
+        conn.commit()
+        conn.close()
+        
+        return len(webinar_events)
+    
+    def regenerate_series_horizons(self, horizon_days: int = 90, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Roll every active series forward so it always has horizon_days of sessions
+        """
+        until = (now or datetime.now()) + timedelta(days=horizon_days)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM webinar_series
+            WHERE status = 'active' AND (generated_until IS NULL OR generated_until < ?)
+        ''', (until.isoformat(),))
+        series_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        return {series_id: self.extend_series_horizon(series_id, until) for series_id in series_ids}
     
     def register_attendee(self, webinar_id: str, email: str, first_name: str,
                          last_name: str, company: str, title: str = "",
                          phone: str = "") -> str:
         """
-        Register a new attendee for webinar
+        Register a new attendee for webinar (waitlisted once the webinar is full)
         """
         registrant_id = str(uuid.uuid4())
         
@@ -519,222 +947,785 @@ Kenneth"""
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO webinar_registrants
-                (id, webinar_id, email, first_name, last_name, company,
-                 title, phone, registration_date, attendance_status,
-                 engagement_score, converted, conversion_value)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                registrant.id,
-                registrant.webinar_id,
-                registrant.email,
-                registrant.first_name,
-                registrant.last_name,
-                registrant.company,
-                registrant.title,
-                registrant.phone,
-                registrant.registration_date,
-                registrant.attendance_status,
-                registrant.engagement_score,
-                registrant.converted,
-                registrant.conversion_value
-            ))
+            # Form retries resubmit the same email: answer them with one indexed read
+            existing_id = self.find_registrant(cursor, webinar_id, email)
+            if existing_id:
+                return existing_id
             
+            # Seat reservation, insert and confirmation emails share one transaction.
+            # A concurrent submission may have registered the email since the read,
+            # and a cancelled registration is reactivated under its original id.
+            _, registrant_id = self.insert_registrants(cursor, [astuple(registrant)])[0]
             conn.commit()
-            
-            # Trigger registration confirmation sequence
-            self.start_email_sequence(registrant_id, "registration_confirmation")
-            
             return registrant_id
-            
-        except sqlite3.IntegrityError:
-            return None
         finally:
             conn.close()
     
-    def start_email_sequence(self, registrant_id: str, sequence_name: str):
+    def find_registrant(self, cursor, webinar_id: str, email: str) -> Optional[str]:
         """
-        Start email sequence for a registrant
+        Id of the active (not cancelled) registrant with this normalized email
+        for the webinar, if any
+        """
+        cursor.execute('''
+            SELECT id FROM webinar_registrants
+            WHERE webinar_id = ? AND lower(trim(email)) = lower(trim(?))
+              AND attendance_status != 'cancelled'
+        ''', (webinar_id, email))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def register_attendees_bulk(self, webinar_id: str, attendees: List[Dict],
+                                chunk_size: int = 1000) -> List[Dict]:
+        """
+        Register a list of attendees (partner / ad-platform imports).
+
+        Rows are validated and deduped by (webinar_id, email) against the batch
+        and the database; each chunk of registrants is inserted together with its
+        seat reservations and confirmation emails in one transaction. Returns one
+        outcome per input row (registered, waitlisted, duplicate or invalid).
         """
-        sequence = self.email_sequences.get(sequence_name)
-        if not sequence:
-            return False
-        
-        # Get registrant and webinar data
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT r.*, w.* FROM webinar_registrants r
-            JOIN webinar_events w ON r.webinar_id = w.id
-            WHERE r.id = ?
-        ''', (registrant_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            return False
-        
-        # Schedule each email in the sequence
-        for email_config in sequence.emails:
-            self.schedule_email(registrant_id, sequence_name, email_config, result)
-        
-        return True
-    
-    def schedule_email(self, registrant_id: str, sequence_name: str, 
-                      email_config: Dict, registrant_webinar_data: tuple):
-        """
-        Schedule individual email from sequence
-        """
-        # Parse registrant and webinar data
-        registrant_data = registrant_webinar_data[:13]  # First 13 columns are registrant
-        webinar_data = registrant_webinar_data[13:]    # Rest are webinar
-        
-        # Personalization data
-        template_data = {
-            'first_name': registrant_data[3],
-            'last_name': registrant_data[4],
-            'company': registrant_data[5],
-            'webinar_title': webinar_data[1],
-            'webinar_date': datetime.fromisoformat(webinar_data[4]).strftime("%B %d, %Y"),
-            'webinar_time': datetime.fromisoformat(webinar_data[4]).strftime("%I:%M %p"),
-            'duration': str(webinar_data[5]),
-            'webinar_link': webinar_data[8],
-            'replay_link': webinar_data[9],
-            'offer_title': 'Revenue Automation Implementation Program',
-            'regular_price': '4,997',
-            'special_price': '2,997',
-            'replay_price': '3,497',
-            'savings': '2,000',
-            'expiry_time': (datetime.now() + timedelta(hours=48)).strftime("%B %d at %I:%M %p"),
-            'resources_link': 'https://resources.example.com/toolkit',
-            'offer_link': 'https://offer.example.com/revenue-automation',
-            'booking_link': 'https://calendar.example.com/book-call',
-            'calendar_link': 'https://calendar.example.com/add-event',
-            'prep_link': 'https://prep.example.com/questionnaire'
-        }
+        cursor.execute('SELECT 1 FROM webinar_events WHERE id = ?', (webinar_id,))
+        if not cursor.fetchone():
+            conn.close()
+            raise ValueError(f"Webinar {webinar_id} not found")
         
-        # Personalize email with simple replacement
-        personalized_subject = email_config["subject"]
-        personalized_body = email_config["template"]
+        cursor.execute('''
+            SELECT lower(trim(email)), id, attendance_status FROM webinar_registrants WHERE webinar_id = ?
+        ''', (webinar_id,))
+        known_emails = {}
+        cancelled_ids = {}
+        for normalized_email, registrant_id, status in cursor.fetchall():
+            (cancelled_ids if status == "cancelled" else known_emails)[normalized_email] = registrant_id
         
-        # Replace placeholders
-        for key, value in template_data.items():
-            placeholder = "{{" + key + "}}"
-            personalized_subject = personalized_subject.replace(placeholder, str(value))
-            personalized_body = personalized_body.replace(placeholder, str(value))
+        outcomes = []
+        chunk = []
+        chunk_outcomes = []
         
-        # Calculate send time
-        send_time = datetime.now() + timedelta(hours=email_config["delay_hours"])
+        def flush():
+            # Duplicates were registered concurrently since known_emails was loaded
+            for outcome, (status, registrant_id) in zip(chunk_outcomes, self.insert_registrants(cursor, chunk)):
+                outcome['status'] = status
+                outcome['registrant_id'] = registrant_id
+            conn.commit()
+            chunk.clear()
+            chunk_outcomes.clear()
         
-        # Log the scheduled email
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        for row_number, attendee in enumerate(attendees):
+            email = (attendee.get('email') or "").strip()
+            normalized_email = email.lower()
+            
+            if not self.EMAIL_PATTERN.match(email):
+                outcomes.append({'row': row_number, 'email': email, 'status': 'invalid',
+                                 'registrant_id': None, 'error': 'invalid email'})
+                continue
+            
+            if normalized_email in known_emails:
+                outcomes.append({'row': row_number, 'email': email, 'status': 'duplicate',
+                                 'registrant_id': known_emails[normalized_email], 'error': None})
+                continue
+            
+            # Cancelled registrations are reactivated under their original id
+            registrant_id = cancelled_ids.get(normalized_email) or str(uuid.uuid4())
+            known_emails[normalized_email] = registrant_id
+            chunk.append((
+                registrant_id, webinar_id, email,
+                attendee.get('first_name', ''), attendee.get('last_name', ''),
+                attendee.get('company', ''), attendee.get('title', ''), attendee.get('phone', ''),
+                datetime.now().isoformat(), "registered", 0, False, 0.0
+            ))
+            outcomes.append({'row': row_number, 'email': email, 'status': 'registered',
+                             'registrant_id': registrant_id, 'error': None})
+            chunk_outcomes.append(outcomes[-1])
+            
+            if len(chunk) >= chunk_size:
+                flush()
         
-        cursor.execute('''
-            INSERT INTO webinar_emails
-            (registrant_id, sequence_name, email_type, sent_date)
-            VALUES (?, ?, ?, ?)
-        ''', (registrant_id, sequence_name, email_config["type"], send_time.isoformat()))
+        if chunk:
+            flush()
         
-        conn.commit()
         conn.close()
-        
-        print(f"Scheduled email: {email_config['type']} for {registrant_data[3]} at {send_time}")
-        print(f"Subject: {personalized_subject}")
-        print("-" * 50)
+        return outcomes
     
-    def mark_attendance(self, registrant_id: str, attended: bool):
+    def insert_registrants(self, cursor, registrant_rows: List[tuple]) -> List[tuple]:
         """
-        Mark attendee as attended or no-show
+        Reserve seats, insert registrant rows and queue confirmation emails
+        without committing. Rows beyond a webinar's max_attendees are stored as
+        waitlisted; rows whose email is already registered for the webinar (or
+        repeated in the batch) are skipped as duplicate, and a cancelled
+        registration for the email is reactivated in place. Returns a
+        (status, registrant_id) pair per row, where the id is that of the
+        stored registration.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if not cursor.connection.in_transaction:
+            # Take the write lock first so no other process can move the seat count
+            cursor.execute('BEGIN IMMEDIATE')
         
-        status = "attended" if attended else "no_show"
+        seen: Dict[tuple, str] = {}
+        duplicates: Dict[int, str] = {}
+        reactivated: Dict[int, str] = {}
+        for index, row in enumerate(registrant_rows):
+            key = (row[1], row[2].strip().lower())
+            if key in seen:
+                duplicates[index] = seen[key]
+                continue
+            cursor.execute('''
+                SELECT id, attendance_status FROM webinar_registrants
+                WHERE webinar_id = ? AND lower(trim(email)) = ?
+            ''', key)
+            existing = cursor.fetchone()
+            if existing is None:
+                seen[key] = row[0]
+            elif existing[1] == "cancelled":
+                seen[key] = reactivated[index] = existing[0]
+            else:
+                seen[key] = duplicates[index] = existing[0]
         
-        cursor.execute('''
-            UPDATE webinar_registrants
-            SET attendance_status = ?
+        requested: Dict[str, int] = {}
+        for index, row in enumerate(registrant_rows):
+            if index not in duplicates:
+                requested[row[1]] = requested.get(row[1], 0) + 1
+        
+        seats_available = {}
+        counter_updates = []
+        for webinar_id, count in requested.items():
+            cursor.execute('''
+                SELECT max_attendees, seats_taken FROM webinar_events WHERE id = ?
+            ''', (webinar_id,))
+            capacity = cursor.fetchone()
+            if capacity is None or capacity[0] is None:
+                granted = count
+            else:
+                granted = max(0, min(count, capacity[0] - (capacity[1] or 0)))
+            seats_available[webinar_id] = granted
+            counter_updates.append((granted, count - granted, webinar_id))
+        
+        cursor.executemany('''
+            UPDATE webinar_events
+            SET seats_taken = seats_taken + ?, waitlist_count = waitlist_count + ?
             WHERE id = ?
-        ''', (status, registrant_id))
+        ''', counter_updates)
         
-        conn.commit()
-        conn.close()
+        rows = []
+        reactivated_rows = []
+        results = []
+        for index, row in enumerate(registrant_rows):
+            if index in duplicates:
+                results.append(("duplicate", duplicates[index]))
+                continue
+            if seats_available[row[1]] > 0:
+                seats_available[row[1]] -= 1
+                status = "registered"
+            else:
+                status = "waitlisted"
+            if index in reactivated:
+                reactivated_rows.append(row[3:9] + (status, reactivated[index]))
+            else:
+                rows.append(row[:9] + (status,) + row[10:])
+            results.append((status, reactivated.get(index, row[0])))
         
-        # Trigger appropriate follow-up sequence
-        if attended:
-            self.start_email_sequence(registrant_id, "attendee_followup")
-        else:
-            self.start_email_sequence(registrant_id, "no_show_followup")
+        cursor.executemany('''
+            INSERT INTO webinar_registrants
+            (id, webinar_id, email, first_name, last_name, company,
+             title, phone, registration_date, attendance_status,
+             engagement_score, converted, conversion_value)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        cursor.executemany('''
+            UPDATE webinar_registrants
+            SET first_name = ?, last_name = ?, company = ?, title = ?, phone = ?,
+                registration_date = ?, attendance_status = ?
+            WHERE id = ?
+        ''', reactivated_rows)
+        # A reactivated registration starts its sequence over; anything still
+        # queued from the cancelled one would otherwise be sent twice
+        cursor.execute('''
+            UPDATE webinar_email_outbox SET status = 'skipped'
+            WHERE registrant_id IN (SELECT value FROM json_each(?)) AND status IN ('pending', 'claimed')
+        ''', (json.dumps(list(reactivated.values())),))
+        self.enqueue_email_sequence(
+            cursor, [registrant_id for status, registrant_id in results if status == "registered"],
+            "registration_confirmation"
+        )
+        
+        return results
     
-    def record_conversion(self, registrant_id: str, conversion_type: str, 
-                         conversion_value: float):
+    def cancel_registration(self, registrant_id: str) -> bool:
         """
-        Record a conversion from webinar attendee
+        Cancel a registration, release its seat and promote the oldest waitlisted registrant
         """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
         
-        # Update registrant
-        cursor.execute('''
-            UPDATE webinar_registrants
-            SET converted = TRUE, conversion_value = ?
-            WHERE id = ?
-        ''', (conversion_value, registrant_id))
-        
-        # Get webinar_id
         cursor.execute('''
-            SELECT webinar_id FROM webinar_registrants WHERE id = ?
+            SELECT webinar_id, attendance_status FROM webinar_registrants WHERE id = ?
         ''', (registrant_id,))
+        registrant = cursor.fetchone()
         
-        webinar_id = cursor.fetchone()[0]
+        if not registrant or registrant[1] not in ("registered", "waitlisted"):
+            conn.rollback()
+            conn.close()
+            return False
         
-        # Record conversion
+        webinar_id, previous_status = registrant
         cursor.execute('''
-            INSERT INTO webinar_conversions
-            (webinar_id, registrant_id, conversion_type, conversion_value, conversion_date)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (webinar_id, registrant_id, conversion_type, conversion_value, datetime.now().isoformat()))
+            UPDATE webinar_registrants SET attendance_status = 'cancelled' WHERE id = ?
+        ''', (registrant_id,))
+        # Nothing still queued for a cancelled registration gets sent
+        cursor.execute('''
+            UPDATE webinar_email_outbox SET status = 'skipped'
+            WHERE registrant_id = ? AND status IN ('pending', 'claimed')
+        ''', (registrant_id,))
+        
+        if previous_status == "waitlisted":
+            cursor.execute('''
+                UPDATE webinar_events SET waitlist_count = waitlist_count - 1 WHERE id = ?
+            ''', (webinar_id,))
+        else:
+            cursor.execute('''
+                SELECT id FROM webinar_registrants
+                WHERE webinar_id = ? AND attendance_status = 'waitlisted'
+                ORDER BY registration_date
+                LIMIT 1
+            ''', (webinar_id,))
+            promoted = cursor.fetchone()
+            
+            if promoted:
+                # The freed seat passes straight to the waitlist
+                cursor.execute('''
+                    UPDATE webinar_registrants SET attendance_status = 'registered' WHERE id = ?
+                ''', (promoted[0],))
+                cursor.execute('''
+                    UPDATE webinar_events SET waitlist_count = waitlist_count - 1 WHERE id = ?
+                ''', (webinar_id,))
+                self.enqueue_email_sequence(cursor, [promoted[0]], "registration_confirmation")
+            else:
+                cursor.execute('''
+                    UPDATE webinar_events SET seats_taken = seats_taken - 1 WHERE id = ?
+                ''', (webinar_id,))
         
         conn.commit()
         conn.close()
+        return True
     
-    def get_webinar_metrics(self, webinar_id: str) -> Dict:
+    def start_email_sequence(self, registrant_id: str, sequence_name: str):
         """
-        Get comprehensive metrics for a webinar
+        Start email sequence for a registrant
         """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Registration metrics
+        queued = self.enqueue_email_sequence(cursor, [registrant_id], sequence_name)
+        
+        conn.commit()
+        conn.close()
+        
+        return queued > 0
+    
+    def enqueue_email_sequence(self, cursor, registrant_ids: List[str], sequence_name: str,
+                               start_time: Optional[datetime] = None) -> int:
+        """
+        Add outbox rows for every email of a sequence without rendering or committing
+        """
+        sequence = self.email_sequences.get(sequence_name)
+        if not sequence or not registrant_ids:
+            return 0
+        
+        start_time = start_time or datetime.now()
+        due_times = [
+            (email_config["type"], (start_time + timedelta(hours=email_config["delay_hours"])).isoformat())
+            for email_config in sequence.emails
+        ]
+        
+        cursor.executemany('''
+            INSERT INTO webinar_email_outbox (registrant_id, sequence_name, email_type, due_at)
+            VALUES (?, ?, ?, ?)
+        ''', [
+            (registrant_id, sequence_name, email_type, due_at)
+            for registrant_id in registrant_ids
+            for email_type, due_at in due_times
+        ])
+        
+        return len(registrant_ids) * len(due_times)
+    
+    def dispatch_due_emails(self, batch_size: int = 500, now: Optional[datetime] = None,
+                            sender: Optional[Callable[[Dict], bool]] = None,
+                            lease_seconds: int = 300) -> List[Dict]:
+        """
+        Claim a batch of due outbox rows and render them.
+
+        A claim is a lease: rows a crashed dispatcher left claimed are claimed
+        again once lease_seconds have passed. With a sender, each email is
+        marked sent only when sender returns True and released for a retry
+        otherwise; without one, the caller delivers the returned emails and
+        confirms them with confirm_emails_sent (or release_emails). Rows of
+        registrants who cancelled or are still waitlisted are marked skipped.
+        """
+        now = now or datetime.now()
+        claim_token = str(uuid.uuid4())
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        
+        # Claim atomically so concurrent dispatchers never send the same row
+        cursor.execute('BEGIN IMMEDIATE')
         cursor.execute('''
-            SELECT 
-                COUNT(*) as total_registered,
-                COUNT(CASE WHEN attendance_status = 'attended' THEN 1 END) as attended,
-                COUNT(CASE WHEN attendance_status = 'no_show' THEN 1 END) as no_shows,
-                COUNT(CASE WHEN converted = TRUE THEN 1 END) as converted,
-                COALESCE(SUM(conversion_value), 0) as total_revenue
-            FROM webinar_registrants
-            WHERE webinar_id = ?
+            UPDATE webinar_email_outbox
+            SET claim_token = ?, claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM webinar_email_outbox
+                WHERE status = 'claimed' AND claimed_at <= ?
+                ORDER BY claimed_at
+                LIMIT ?
+            )
+        ''', (claim_token, now.isoformat(), (now - timedelta(seconds=lease_seconds)).isoformat(), batch_size))
+        reclaimed = cursor.rowcount
+        cursor.execute('''
+            UPDATE webinar_email_outbox
+            SET status = 'claimed', claim_token = ?, claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM webinar_email_outbox
+                WHERE status = 'pending' AND due_at <= ?
+                ORDER BY due_at
+                LIMIT ?
+            )
+        ''', (claim_token, now.isoformat(), now.isoformat(), batch_size - reclaimed))
+        conn.commit()
+        
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT o.id AS outbox_id, o.sequence_name, o.email_type,
+                   r.id AS registrant_id, r.webinar_id, r.email, r.first_name, r.last_name, r.company,
+                   r.attendance_status, w.context_version
+            FROM webinar_email_outbox o
+            JOIN webinar_registrants r ON r.id = o.registrant_id
+            JOIN webinar_events w ON w.id = r.webinar_id
+            WHERE o.claim_token = ?
+        ''', (claim_token,))
+        claimed = cursor.fetchall()
+        
+        # Time-dependent values are the same for the whole batch
+        batch_context = {
+            'expiry_time': (now + timedelta(hours=48)).strftime("%B %d at %I:%M %p")
+        }
+        
+        emails = []
+        skipped = []
+        for row in claimed:
+            email_config = self.email_configs.get((row['sequence_name'], row['email_type']))
+            # Cancelled and waitlisted registrants get nothing; neither do emails
+            # that no longer exist in their sequence
+            if not email_config or row['attendance_status'] not in self.SENDABLE_STATUSES:
+                skipped.append(row['outbox_id'])
+                continue
+            
+            webinar_context = self.get_webinar_context(cursor, row['webinar_id'], row['context_version'])
+            subject, body = self.render_email(email_config, row, webinar_context, batch_context)
+            emails.append({
+                'outbox_id': row['outbox_id'],
+                'claim_token': claim_token,
+                'registrant_id': row['registrant_id'],
+                'email': row['email'],
+                'sequence_name': row['sequence_name'],
+                'email_type': row['email_type'],
+                'subject': subject,
+                'body': body
+            })
+        
+        cursor.execute('''
+            UPDATE webinar_email_outbox SET status = 'skipped'
+            WHERE claim_token = ? AND id IN (SELECT value FROM json_each(?))
+        ''', (claim_token, json.dumps(skipped)))
+        conn.commit()
+        conn.close()
+        
+        if sender is None:
+            return emails
+        
+        delivered, failed = [], []
+        for email in emails:
+            try:
+                confirmed = sender(email)
+            except Exception:
+                confirmed = False
+            (delivered if confirmed else failed).append(email)
+        
+        self.confirm_emails_sent(delivered, now)
+        self.release_emails(failed)
+        return delivered
+    
+    def confirm_emails_sent(self, emails: List[Dict], sent_at: Optional[datetime] = None) -> int:
+        """
+        Mark delivered emails (as returned by dispatch_due_emails) sent and log
+        them. Rows whose lease was taken over by another dispatcher are left alone.
+        """
+        sent_date = (sent_at or datetime.now()).isoformat()
+        claims = json.dumps([[email['outbox_id'], email['claim_token']] for email in emails])
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            CREATE TEMP TABLE confirmed_outbox AS
+            SELECT o.id, o.registrant_id, o.sequence_name, o.email_type
+            FROM json_each(?) c
+            JOIN webinar_email_outbox o
+              ON o.id = json_extract(c.value, '$[0]') AND o.claim_token = json_extract(c.value, '$[1]')
+            WHERE o.status = 'claimed'
+        ''', (claims,))
+        cursor.execute('''
+            INSERT INTO webinar_emails (registrant_id, sequence_name, email_type, sent_date)
+            SELECT registrant_id, sequence_name, email_type, ? FROM confirmed_outbox
+        ''', (sent_date,))
+        confirmed = cursor.rowcount
+        cursor.execute('''
+            UPDATE webinar_email_outbox SET status = 'sent'
+            WHERE id IN (SELECT id FROM confirmed_outbox)
+        ''')
+        cursor.execute('DROP TABLE temp.confirmed_outbox')
+        conn.commit()
+        conn.close()
+        
+        return confirmed
+    
+    def release_emails(self, emails: List[Dict]) -> int:
+        """
+        Return undelivered emails to the pending queue for the next dispatch
+        """
+        claims = json.dumps([[email['outbox_id'], email['claim_token']] for email in emails])
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE webinar_email_outbox
+            SET status = 'pending', claim_token = NULL, claimed_at = NULL
+            WHERE status = 'claimed' AND EXISTS (
+                SELECT 1 FROM json_each(?) c
+                WHERE json_extract(c.value, '$[0]') = webinar_email_outbox.id
+                  AND json_extract(c.value, '$[1]') = webinar_email_outbox.claim_token
+            )
+        ''', (claims,))
+        released = cursor.rowcount
+        conn.commit()
+        conn.close()
+        
+        return released
+    
+    def get_webinar_context(self, cursor, webinar_id: str, context_version: int) -> Dict[str, str]:
+        """
+        Webinar half of the email context, built once per webinar and version
+        """
+        cached = self.webinar_context_cache.get(webinar_id)
+        if cached and cached[0] == context_version:
+            return cached[1]
+        
+        cursor.execute('''
+            SELECT title, date_time, duration_minutes, zoom_link, replay_url, context_version
+            FROM webinar_events WHERE id = ?
+        ''', (webinar_id,))
+        webinar = cursor.fetchone()
+        scheduled = datetime.fromisoformat(webinar['date_time'])
+        
+        context = dict(self.OFFER_CONTEXT)
+        context.update({
+            'webinar_title': webinar['title'],
+            'webinar_date': scheduled.strftime("%B %d, %Y"),
+            'webinar_time': scheduled.strftime("%I:%M %p"),
+            'duration': str(webinar['duration_minutes']),
+            'webinar_link': webinar['zoom_link'],
+            'replay_link': webinar['replay_url']
+        })
+        self.webinar_context_cache[webinar_id] = (webinar['context_version'], context)
+        return context
+    
+    def invalidate_webinar_context(self, webinar_id: Optional[str] = None):
+        """
+        Drop cached webinar contexts (all of them when no webinar is given)
+        """
+        if webinar_id is None:
+            self.webinar_context_cache.clear()
+        else:
+            self.webinar_context_cache.pop(webinar_id, None)
+    
+    def render_email(self, email_config: Dict, registrant: sqlite3.Row, webinar_context: Dict[str, str],
+                     batch_context: Optional[Dict[str, str]] = None) -> tuple:
+        """
+        Render subject and body of one email for a registrant row
+        """
+        template_data = dict(webinar_context)
+        if batch_context:
+            template_data.update(batch_context)
+        template_data['first_name'] = registrant['first_name']
+        template_data['last_name'] = registrant['last_name']
+        template_data['company'] = registrant['company']
+        
+        # Unknown placeholders are left as they are
+        def substitute(match):
+            key = match.group(1)
+            return str(template_data[key]) if key in template_data else match.group(0)
+        
+        personalized_subject = self.PLACEHOLDER_PATTERN.sub(substitute, email_config["subject"])
+        personalized_body = self.PLACEHOLDER_PATTERN.sub(substitute, email_config["template"])
+        
+        return personalized_subject, personalized_body
+    
+    def calculate_engagement_score(self, watch_seconds: float, duration_minutes: int,
+                                   interaction_points: float = 0) -> int:
+        """
+        Engagement score (0-100): up to WATCH_POINTS for the share of the
+        webinar watched plus any (already capped) interaction points
+        """
+        points = interaction_points
+        if duration_minutes:
+            points += self.WATCH_POINTS * max(0.0, min(1.0, watch_seconds / (duration_minutes * 60)))
+        return min(100, round(points))
+    
+    def _parse_report_time(self, value: Optional[str]) -> Optional[datetime]:
+        """
+        Join/leave timestamp in ISO or one of the meeting platforms' formats
+        """
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        for time_format in self.ATTENDANCE_TIME_FORMATS:
+            try:
+                return datetime.strptime(value, time_format)
+            except ValueError:
+                continue
+        return None
+    
+    def _read_attendance_report(self, file_path: str) -> Dict[str, float]:
+        """
+        Total watch seconds per normalized email, merging overlapping sessions.
+        Rows without usable timestamps add their reported duration on top.
+        """
+        sessions: Dict[str, List[tuple]] = {}
+        unanchored_seconds: Dict[str, float] = {}
+        
+        with open(file_path, newline="", encoding="utf-8-sig") as report_file:
+            for record in csv.DictReader(report_file):
+                row = {key.strip().lower().replace(" ", "_"): (value or "").strip()
+                       for key, value in record.items() if key}
+                email = (row.get('email') or row.get('user_email') or row.get('attendee_email') or "").strip().lower()
+                if not email:
+                    continue
+                
+                joined = self._parse_report_time(row.get('join_time'))
+                left = self._parse_report_time(row.get('leave_time'))
+                if joined and left:
+                    sessions.setdefault(email, []).append((joined, max(joined, left)))
+                    continue
+                
+                # No usable timestamps: fall back to the reported duration, which
+                # cannot be placed on the timeline and so is never overlap-merged
+                try:
+                    minutes = float(row.get('duration_minutes') or row.get('duration_(minutes)') or 0)
+                except ValueError:
+                    continue
+                if not 0 <= minutes < float("inf"):
+                    continue
+                unanchored_seconds[email] = unanchored_seconds.get(email, 0.0) + minutes * 60
+        
+        watch_seconds = dict(unanchored_seconds)
+        for email, intervals in sessions.items():
+            intervals.sort()
+            total = 0.0
+            current_start, current_end = intervals[0]
+            for start, end in intervals[1:]:
+                if start <= current_end:
+                    current_end = max(current_end, end)
+                else:
+                    total += (current_end - current_start).total_seconds()
+                    current_start, current_end = start, end
+            total += (current_end - current_start).total_seconds()
+            watch_seconds[email] = watch_seconds.get(email, 0.0) + total
+        
+        return watch_seconds
+    
+    def import_attendance_report(self, webinar_id: str, file_path: str) -> Dict:
+        """
+        Apply a meeting-platform attendance report (CSV with email, join and
+        leave times) to a whole webinar in one pass and one transaction.
+
+        Registrants in the report are marked attended with an engagement score
+        from watch duration, everyone else still registered becomes a no-show,
+        and follow-up sequences are queued in bulk for registrants marked for
+        the first time.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT duration_minutes FROM webinar_events WHERE id = ?', (webinar_id,))
+        webinar = cursor.fetchone()
+        if not webinar:
+            conn.close()
+            raise ValueError(f"Webinar {webinar_id} not found")
+        
+        watch_seconds = self._read_attendance_report(file_path)
+        started_at = datetime.now()
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            CREATE TEMP TABLE attendance_report (
+                email TEXT PRIMARY KEY,
+                watch_seconds REAL,
+                engagement_score INTEGER
+            )
+        ''')
+        cursor.executemany('''
+            INSERT INTO attendance_report (email, watch_seconds, engagement_score) VALUES (?, ?, ?)
+        ''', [
+            (email, seconds, self.calculate_engagement_score(seconds, webinar[0]))
+            for email, seconds in watch_seconds.items()
+        ])
+        
+        # Only registrants that had not been marked yet get follow-up sequences
+        cursor.execute('''
+            CREATE TEMP TABLE attendance_first_marked AS
+            SELECT id FROM webinar_registrants
+            WHERE webinar_id = ? AND attendance_status = 'registered'
+        ''', (webinar_id,))
+        
+        # The report only knows watch time: keep a higher score the live stream
+        # aggregator already wrote with interaction points included
+        cursor.execute('''
+            UPDATE webinar_registrants
+            SET attendance_status = CASE
+                    WHEN EXISTS (SELECT 1 FROM attendance_report a
+                                 WHERE a.email = lower(trim(webinar_registrants.email)))
+                    THEN 'attended' ELSE 'no_show' END,
+                engagement_score = MAX(COALESCE(engagement_score, 0),
+                                       COALESCE((SELECT a.engagement_score FROM attendance_report a
+                                                 WHERE a.email = lower(trim(webinar_registrants.email))), 0))
+            WHERE webinar_id = ? AND attendance_status IN ('registered', 'attended', 'no_show')
+        ''', (webinar_id,))
+        
+        # Unary + strips the TEXT affinity from a.email so the comparison can
+        # use the lower(trim(email)) expression index
+        cursor.execute('''
+            SELECT COUNT(*) FROM attendance_report a
+            WHERE NOT EXISTS (SELECT 1 FROM webinar_registrants r
+                              WHERE r.webinar_id = ? AND lower(trim(r.email)) = +a.email)
         ''', (webinar_id,))
+        unmatched = cursor.fetchone()[0]
         
-        metrics = cursor.fetchone()
+        followups_queued = 0
+        for status, sequence_name in (("attended", "attendee_followup"), ("no_show", "no_show_followup")):
+            for email_config in self.email_sequences[sequence_name].emails:
+                cursor.execute('''
+                    INSERT INTO webinar_email_outbox (registrant_id, sequence_name, email_type, due_at)
+                    SELECT r.id, ?, ?, ?
+                    FROM attendance_first_marked f
+                    JOIN webinar_registrants r ON r.id = f.id
+                    WHERE r.attendance_status = ?
+                ''', (sequence_name, email_config["type"],
+                      (started_at + timedelta(hours=email_config["delay_hours"])).isoformat(), status))
+                followups_queued += cursor.rowcount
         
-        # Webinar details
         cursor.execute('''
-            SELECT title, date_time, offer_price FROM webinar_events WHERE id = ?
+            SELECT attendance_status, COUNT(*) FROM webinar_registrants
+            WHERE webinar_id = ? AND attendance_status IN ('attended', 'no_show')
+            GROUP BY attendance_status
         ''', (webinar_id,))
+        status_counts = dict(cursor.fetchall())
         
-        webinar_info = cursor.fetchone()
+        conn.commit()
+        cursor.execute('DROP TABLE temp.attendance_report')
+        cursor.execute('DROP TABLE temp.attendance_first_marked')
         conn.close()
         
-        if metrics and webinar_info:
-            registered, attended, no_shows, converted, revenue = metrics
-            title, date_time, offer_price = webinar_info
-            
+        return {
+            'report_attendees': len(watch_seconds),
+            'unmatched_attendees': unmatched,
+            'attended': status_counts.get('attended', 0),
+            'no_show': status_counts.get('no_show', 0),
+            'followups_queued': followups_queued
+        }
+    
+    def mark_attendance(self, registrant_id: str, attended: bool):
+        """
+        Mark attendee as attended or no-show
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        status = "attended" if attended else "no_show"
+        
+        cursor.execute('''
+            UPDATE webinar_registrants
+            SET attendance_status = ?
+            WHERE id = ?
+        ''', (status, registrant_id))
+        
+        conn.commit()
+        conn.close()
+        
+        # Trigger appropriate follow-up sequence
+        if attended:
+            self.start_email_sequence(registrant_id, "attendee_followup")
+        else:
+            self.start_email_sequence(registrant_id, "no_show_followup")
+    
+    def record_conversion(self, registrant_id: str, conversion_type: str, 
+                         conversion_value: float):
+        """
+        Record a conversion from webinar attendee
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # Update registrant
+        cursor.execute('''
+            UPDATE webinar_registrants
+            SET converted = TRUE, conversion_value = ?
+            WHERE id = ?
+        ''', (conversion_value, registrant_id))
+        
+        # Get webinar_id
+        cursor.execute('''
+            SELECT webinar_id FROM webinar_registrants WHERE id = ?
+        ''', (registrant_id,))
+        
+        webinar_id = cursor.fetchone()[0]
+        
+        # Record conversion
+        cursor.execute('''
+            INSERT INTO webinar_conversions
+            (webinar_id, registrant_id, conversion_type, conversion_value, conversion_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (webinar_id, registrant_id, conversion_type, conversion_value, datetime.now().isoformat()))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_webinar_metrics(self, webinar_id: str) -> Dict:
+        """
+        Get comprehensive metrics for a webinar
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT w.title, w.date_time, w.offer_price,
+                   COALESCE(u.registered, 0), COALESCE(u.attended, 0), COALESCE(u.no_shows, 0),
+                   COALESCE(u.converted, 0), COALESCE(u.revenue, 0)
+            FROM webinar_events w
+            LEFT JOIN webinar_rollups u ON u.webinar_id = w.id
+            WHERE w.id = ?
+        ''', (webinar_id,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            title, date_time, offer_price, registered, attended, no_shows, converted, revenue = row
             return {
                 'webinar_title': title,
                 'webinar_date': date_time,
@@ -758,13 +1749,12 @@ Kenneth"""
         
         cursor.execute('''
             SELECT 
-                COUNT(DISTINCT w.id) as total_webinars,
-                COUNT(r.id) as total_registrants,
-                COUNT(CASE WHEN r.attendance_status = 'attended' THEN 1 END) as total_attendees,
-                COUNT(CASE WHEN r.converted = TRUE THEN 1 END) as total_conversions,
-                COALESCE(SUM(r.conversion_value), 0) as total_revenue
-            FROM webinar_events w
-            LEFT JOIN webinar_registrants r ON w.id = r.webinar_id
+                COUNT(*) as total_webinars,
+                COALESCE(SUM(registered), 0) as total_registrants,
+                COALESCE(SUM(attended), 0) as total_attendees,
+                COALESCE(SUM(converted), 0) as total_conversions,
+                COALESCE(SUM(revenue), 0) as total_revenue
+            FROM webinar_rollups
         ''')
         
         result = cursor.fetchone()
@@ -783,6 +1773,786 @@ Kenneth"""
             }
         
         return {}
+    
+    def rebuild_webinar_rollups(self):
+        """
+        Recompute webinar rollups from webinar_registrants (one-off maintenance scan)
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM webinar_rollups')
+        cursor.execute('''
+            INSERT INTO webinar_rollups (webinar_id, registered, attended, no_shows, converted, revenue)
+            SELECT w.id, COUNT(r.id),
+                   COUNT(CASE WHEN r.attendance_status = 'attended' THEN 1 END),
+                   COUNT(CASE WHEN r.attendance_status = 'no_show' THEN 1 END),
+                   COUNT(CASE WHEN r.converted = TRUE THEN 1 END),
+                   COALESCE(SUM(r.conversion_value), 0)
+            FROM webinar_events w
+            LEFT JOIN webinar_registrants r ON r.webinar_id = w.id
+            GROUP BY w.id
+        ''')
+        
+        conn.commit()
+        conn.close()
+
+class RegistrationWriteBehindQueue:
+    """
+    Absorb registration bursts: each registration is acknowledged immediately
+    with a pre-generated registrant id and a single writer thread drains the
+    queue into group-committed batches, so concurrent callers never contend
+    for the SQLite write lock. Rows that cannot be written (including batches
+    that never got the lock in lock_retries attempts) are kept in
+    webinar_registration_retry, or in memory when even that write fails,
+    until replay_spilled() queues them again.
+    """
+    
+    def __init__(self, funnel_manager: WebinarFunnelManager, batch_size: int = 500,
+                 max_wait_seconds: float = 0.05, lock_retries: int = 5):
+        self.funnel_manager = funnel_manager
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.lock_retries = lock_retries
+        self.pending = queue.Queue()
+        self.written = 0
+        self.duplicates = 0
+        self.failed_batches = 0
+        self.spilled = 0
+        self.unwritten: List[tuple] = []
+        self.resolved_ids: Dict[str, str] = {}
+        self._stopping = threading.Event()
+        self._writer = threading.Thread(target=self._drain, name="registration-writer", daemon=True)
+        self._writer.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def submit(self, webinar_id: str, email: str, first_name: str, last_name: str,
+               company: str, title: str = "", phone: str = "") -> str:
+        """
+        Queue a registration and return its registrant id right away. If the
+        email is already registered for the webinar (or was cancelled and is
+        reactivated) the stored registration keeps its own id; resolve() maps
+        the acknowledged id to it once the row has been written.
+        """
+        registrant_id = str(uuid.uuid4())
+        self.pending.put((
+            registrant_id, webinar_id, email.strip(), first_name, last_name, company,
+            title, phone, datetime.now().isoformat(), "registered", 0, False, 0.0
+        ))
+        return registrant_id
+    
+    def flush(self):
+        """
+        Block until every queued registration has been written
+        """
+        self.pending.join()
+    
+    def resolve(self, registrant_id: str) -> str:
+        """
+        Id of the stored registration for an id returned by submit()
+        """
+        return self.resolved_ids.get(registrant_id, registrant_id)
+    
+    def close(self):
+        """
+        Write everything still queued and stop the writer thread
+        """
+        self._stopping.set()
+        self._writer.join()
+    
+    def _next_batch(self) -> List[tuple]:
+        try:
+            batch = [self.pending.get(timeout=self.max_wait_seconds)]
+        except queue.Empty:
+            return []
+        
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def replay_spilled(self) -> int:
+        """
+        Queue the registrations spilled to webinar_registration_retry (and any
+        kept in memory) again; returns how many were queued
+        """
+        conn = sqlite3.connect(self.funnel_manager.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT registrant_row FROM webinar_registration_retry')
+        rows = [tuple(json.loads(row[0])) for row in cursor.fetchall()]
+        cursor.execute('DELETE FROM webinar_registration_retry')
+        conn.commit()
+        conn.close()
+        
+        rows, self.unwritten = rows + self.unwritten, []
+        for row in rows:
+            self.pending.put(row)
+        return len(rows)
+    
+    def _is_lock_error(self, error: Exception) -> bool:
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+    
+    def _write(self, conn, cursor, rows: List[tuple]):
+        # Lock contention is usually transient: back off and retry a few times
+        for attempt in range(1, self.lock_retries + 1):
+            try:
+                results = self.funnel_manager.insert_registrants(cursor, rows)
+                conn.commit()
+                break
+            except sqlite3.OperationalError as error:
+                conn.rollback()
+                if not self._is_lock_error(error) or attempt == self.lock_retries:
+                    raise
+                time.sleep(min(0.05 * attempt, 1.0))
+        
+        for row, (status, registrant_id) in zip(rows, results):
+            if registrant_id != row[0]:
+                self.resolved_ids[row[0]] = registrant_id
+        duplicates = sum(1 for status, _ in results if status == "duplicate")
+        self.written += len(rows) - duplicates
+        self.duplicates += duplicates
+    
+    def _spill(self, conn, cursor, rows: List[tuple], error: Exception):
+        failed_at = datetime.now().isoformat()
+        try:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO webinar_registration_retry (registrant_id, registrant_row, error, failed_at)
+                VALUES (?, ?, ?, ?)
+            ''', [(row[0], json.dumps(row), repr(error), failed_at) for row in rows])
+            conn.commit()
+            self.spilled += len(rows)
+        except Exception:
+            conn.rollback()
+            self.unwritten.extend(rows)
+    
+    def _drain(self):
+        conn = sqlite3.connect(self.funnel_manager.db_path, timeout=30)
+        cursor = conn.cursor()
+        
+        while not (self._stopping.is_set() and self.pending.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            
+            try:
+                self._write(conn, cursor, batch)
+            except Exception as error:
+                conn.rollback()
+                self.failed_batches += 1
+                if self._is_lock_error(error):
+                    # The lock never came free: set the batch aside and keep draining
+                    self._spill(conn, cursor, batch, error)
+                else:
+                    # Write row by row so one bad row does not take the batch with it;
+                    # rows that still fail go to the retry table (or stay in memory)
+                    for row in batch:
+                        try:
+                            self._write(conn, cursor, [row])
+                        except Exception as row_error:
+                            conn.rollback()
+                            self._spill(conn, cursor, [row], row_error)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+        
+        conn.close()
+
+def load_test_write_behind(db_path: str = "webinar_load_test.db", registrations: int = 20000,
+                           producers: int = 16) -> Dict:
+    """
+    Hammer the write-behind queue from many threads and report acknowledgment
+    latency percentiles and whether every acknowledged registrant was stored
+    """
+    funnel_manager = WebinarFunnelManager(db_path)
+    webinar_id = funnel_manager.create_webinar_event("revenue_automation_masterclass", "2024-04-15T14:00:00")
+    
+    latencies: List[float] = []
+    acknowledged: List[str] = []
+    lock = threading.Lock()
+    per_producer = registrations // producers
+    
+    def producer(producer_index: int):
+        local_latencies = []
+        local_ids = []
+        for i in range(per_producer):
+            started = time.perf_counter()
+            registrant_id = write_behind.submit(webinar_id, f"load{producer_index}-{i}@example.com",
+                                                "Load", str(i), "LoadCorp")
+            local_latencies.append(time.perf_counter() - started)
+            local_ids.append(registrant_id)
+        with lock:
+            latencies.extend(local_latencies)
+            acknowledged.extend(local_ids)
+    
+    started = time.perf_counter()
+    with RegistrationWriteBehindQueue(funnel_manager) as write_behind:
+        threads = [threading.Thread(target=producer, args=(index,)) for index in range(producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        acknowledged_seconds = time.perf_counter() - started
+    drained_seconds = time.perf_counter() - started
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM webinar_registrants WHERE webinar_id = ?', (webinar_id,))
+    stored = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    
+    latencies.sort()
+    return {
+        'registrations': len(acknowledged),
+        'stored': len(stored),
+        'lost': sum(1 for registrant_id in acknowledged if write_behind.resolve(registrant_id) not in stored),
+        'spilled': write_behind.spilled,
+        'p50_ack_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ack_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        'max_ack_ms': round(latencies[-1] * 1000, 3),
+        'acknowledged_seconds': round(acknowledged_seconds, 3),
+        'drained_seconds': round(drained_seconds, 3)
+    }
+
+def benchmark_bulk_registration(db_path: str = "webinar_benchmark.db", rows: int = 20000,
+                                per_row_sample: int = 1000) -> Dict:
+    """
+    Compare register_attendees_bulk with the per-row register_attendee path.
+    The per-row path is timed on a sample and extrapolated to the full size.
+    """
+    funnel_manager = WebinarFunnelManager(db_path)
+    bulk_webinar = funnel_manager.create_webinar_event("revenue_automation_masterclass", "2024-04-15T14:00:00")
+    row_webinar = funnel_manager.create_webinar_event("revenue_automation_masterclass", "2024-04-15T14:00:00")
+    
+    attendees = [
+        {'email': f"attendee{i}@example.com", 'first_name': "Bench", 'last_name': str(i), 'company': "BenchCorp"}
+        for i in range(rows)
+    ]
+    
+    started = time.perf_counter()
+    outcomes = funnel_manager.register_attendees_bulk(bulk_webinar, attendees)
+    bulk_seconds = time.perf_counter() - started
+    
+    sample = attendees[:per_row_sample]
+    started = time.perf_counter()
+    for attendee in sample:
+        funnel_manager.register_attendee(row_webinar, attendee['email'], attendee['first_name'],
+                                         attendee['last_name'], attendee['company'])
+    per_row_seconds = time.perf_counter() - started
+    
+    bulk_rate = rows / bulk_seconds if bulk_seconds > 0 else float(rows)
+    per_row_rate = len(sample) / per_row_seconds if per_row_seconds > 0 else float(len(sample))
+    
+    return {
+        'rows': rows,
+        'stored': sum(1 for outcome in outcomes if outcome['status'] in ('registered', 'waitlisted')),
+        'bulk_seconds': round(bulk_seconds, 3),
+        'bulk_rows_per_second': round(bulk_rate),
+        'per_row_rows_per_second': round(per_row_rate),
+        'per_row_estimated_seconds': round(rows / per_row_rate, 3),
+        'speedup': round(bulk_rate / per_row_rate, 1)
+    }
+
+class SeriesSessionRouter:
+    """
+    Route registrants of evergreen series to the next upcoming session with
+    open seats. Upcoming sessions are held in memory sorted by start time;
+    full sessions are dropped from the index as they fill, so lookups stay
+    O(log n) no matter how many sessions are materialized. The database seat
+    counters stay authoritative: a registration that lands on the waitlist
+    because another process took the last seat is rolled back and retried on
+    the next session.
+    """
+    
+    def __init__(self, funnel_manager: WebinarFunnelManager, series_ids: List[str],
+                 now: Optional[datetime] = None):
+        self.funnel_manager = funnel_manager
+        self.series_ids = list(series_ids)
+        self.starts: List[str] = []
+        self.sessions: List[list] = []  # [webinar_id, open_seats], parallel to starts
+        self.loaded_until = None
+        self.conn = sqlite3.connect(funnel_manager.db_path, timeout=30)
+        self.refresh(now)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def refresh(self, now: Optional[datetime] = None) -> int:
+        """
+        Drop sessions that have started and load ones generated since the last
+        refresh; returns the number of sessions added to the index
+        """
+        now_iso = (now or datetime.now()).isoformat()
+        started = bisect.bisect_right(self.starts, now_iso)
+        del self.starts[:started]
+        del self.sessions[:started]
+        
+        after = max(now_iso, self.loaded_until) if self.loaded_until else now_iso
+        placeholders = ",".join("?" for _ in self.series_ids)
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT id, date_time, max_attendees - seats_taken FROM webinar_events
+            WHERE series_id IN ({placeholders}) AND date_time > ? AND status = 'scheduled'
+            ORDER BY date_time
+        ''', (*self.series_ids, after))
+        
+        added = 0
+        for webinar_id, date_time, open_seats in cursor.fetchall():
+            if open_seats is None or open_seats > 0:
+                # Newer sessions always start after the ones already indexed
+                position = bisect.bisect_right(self.starts, date_time)
+                self.starts.insert(position, date_time)
+                self.sessions.insert(position, [webinar_id, open_seats])
+                added += 1
+            self.loaded_until = max(self.loaded_until or date_time, date_time)
+        return added
+    
+    def next_open_session(self, after: Optional[datetime] = None) -> Optional[tuple]:
+        """
+        (webinar_id, date_time) of the first session after `after` with a free seat
+        """
+        position = bisect.bisect_right(self.starts, (after or datetime.now()).isoformat())
+        if position < len(self.starts):
+            return self.sessions[position][0], self.starts[position]
+        return None
+    
+    def _mark_full(self, webinar_id: str, date_time: str):
+        position = bisect.bisect_left(self.starts, date_time)
+        while position < len(self.starts) and self.starts[position] == date_time:
+            if self.sessions[position][0] == webinar_id:
+                del self.starts[position]
+                del self.sessions[position]
+                return
+            position += 1
+    
+    def register(self, email: str, first_name: str, last_name: str, company: str,
+                 title: str = "", phone: str = "", after: Optional[datetime] = None) -> Optional[Dict]:
+        """
+        Register into the next session with open seats; None when every
+        upcoming session in the horizon is full
+        """
+        cursor = self.conn.cursor()
+        
+        while True:
+            session = self.next_open_session(after)
+            if session is None:
+                return None
+            webinar_id, date_time = session
+            
+            registrant = WebinarRegistrant(
+                id=str(uuid.uuid4()),
+                webinar_id=webinar_id,
+                email=email,
+                first_name=first_name,
+                last_name=last_name,
+                company=company,
+                title=title,
+                phone=phone,
+                registration_date=datetime.now().isoformat(),
+                attendance_status="registered",
+                engagement_score=0,
+                converted=False,
+                conversion_value=0.0
+            )
+            
+            status, registrant_id = self.funnel_manager.insert_registrants(cursor, [astuple(registrant)])[0]
+            if status == "duplicate":
+                # Already registered for this session: hand back the existing registration
+                self.conn.rollback()
+                return {'registrant_id': registrant_id,
+                        'webinar_id': webinar_id, 'date_time': date_time, 'status': status}
+            if status != "registered":
+                # Another writer took the last seat; try the following session
+                self.conn.rollback()
+                self._mark_full(webinar_id, date_time)
+                continue
+            
+            self.conn.commit()
+            position = bisect.bisect_left(self.starts, date_time)
+            while self.sessions[position][0] != webinar_id:
+                position += 1
+            seats = self.sessions[position]
+            if seats[1] is not None:
+                seats[1] -= 1
+                if seats[1] <= 0:
+                    del self.starts[position]
+                    del self.sessions[position]
+            
+            return {'registrant_id': registrant_id, 'webinar_id': webinar_id, 'date_time': date_time,
+                    'status': status}
+    
+    def close(self):
+        self.conn.close()
+
+def benchmark_evergreen_series(db_path: str = "webinar_series_benchmark.db", series_count: int = 5,
+                               interval_minutes: int = 120, horizon_days: int = 90,
+                               registrations: int = 1000, seats_per_session: int = 5,
+                               lookups: int = 100000) -> Dict:
+    """
+    Materialize a quarter of evergreen sessions, roll the horizon forward a
+    week and route registrations through the in-memory session index.
+    Routing is timed apart from the registrations, which pay one commit each.
+    """
+    funnel_manager = WebinarFunnelManager(db_path)
+    now = datetime(2024, 4, 1, 8, 0)
+    template_names = list(funnel_manager.webinar_templates)
+    
+    started = time.perf_counter()
+    series_ids = [
+        funnel_manager.create_webinar_series(
+            template_names[index % len(template_names)],
+            # Stagger the series so a session starts somewhere every few minutes
+            RecurrenceRule(start=(now + timedelta(minutes=index * interval_minutes // series_count)).isoformat(),
+                           interval_minutes=interval_minutes),
+            horizon_days=horizon_days, max_attendees=seats_per_session, now=now
+        )
+        for index in range(series_count)
+    ]
+    generate_seconds = time.perf_counter() - started
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM webinar_events WHERE series_id IS NOT NULL')
+    sessions = cursor.fetchone()[0]
+    conn.close()
+    
+    started = time.perf_counter()
+    extended = funnel_manager.regenerate_series_horizons(horizon_days, now=now + timedelta(days=7))
+    extend_seconds = time.perf_counter() - started
+    
+    with SeriesSessionRouter(funnel_manager, series_ids, now=now) as router:
+        horizon_minutes = horizon_days * 24 * 60
+        started = time.perf_counter()
+        for i in range(lookups):
+            router.next_open_session(now + timedelta(minutes=i * 7919 % horizon_minutes))
+        lookup_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        routed = [
+            router.register(f"evergreen{i}@example.com", "Ever", str(i), "GreenCorp", after=now)
+            for i in range(registrations)
+        ]
+        route_seconds = time.perf_counter() - started
+    
+    return {
+        'sessions_generated': sessions,
+        'generate_seconds': round(generate_seconds, 3),
+        'sessions_added_on_extend': sum(extended.values()),
+        'extend_seconds': round(extend_seconds, 3),
+        'lookups_per_second': round(lookups / lookup_seconds) if lookup_seconds > 0 else lookups,
+        'registrations_routed': sum(1 for result in routed if result),
+        'sessions_used': len({result['webinar_id'] for result in routed if result}),
+        'route_seconds': round(route_seconds, 3),
+        'registrations_per_second': round(registrations / route_seconds) if route_seconds > 0 else registrations
+    }
+
+class _EngagementState:
+    __slots__ = ("joined_at", "watch_seconds", "chat_windows", "last_chat_window",
+                 "polls", "cta_windows", "last_cta_window", "interaction_points", "flushed_score")
+    
+    def __init__(self):
+        self.joined_at = None
+        self.watch_seconds = 0.0
+        self.chat_windows = 0
+        self.last_chat_window = -1
+        self.polls = set()
+        self.cta_windows = 0
+        self.last_cta_window = -1
+        self.interaction_points = 0
+        self.flushed_score = None
+
+class EngagementStreamAggregator:
+    """
+    Fold live webinar events (join, leave, chat, poll, cta_click) into
+    per-registrant engagement scores in memory and write changed scores back
+    to webinar_registrants every flush interval of stream time.
+
+    Chat and CTA activity is counted once per window so a burst of messages
+    does not outweigh steady participation; each poll counts once.
+    """
+    
+    EVENT_TYPES = ("join", "leave", "chat", "poll", "cta_click")
+    INTERACTION_POINTS = {"chat": 2, "poll": 5, "cta_click": 10}
+    INTERACTION_CAPS = {"chat": 10, "poll": 10, "cta_click": 10}
+    
+    def __init__(self, funnel_manager: WebinarFunnelManager, webinar_id: str,
+                 window_seconds: float = 60.0, flush_interval_seconds: float = 30.0):
+        self.funnel_manager = funnel_manager
+        self.webinar_id = webinar_id
+        self.window_seconds = window_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.states: Dict[str, _EngagementState] = {}
+        self.dirty = set()
+        self.joined = set()
+        self.events_processed = 0
+        self.events_ignored = 0
+        self.scores_written = 0
+        self.flushes = 0
+        self.last_event_at = None
+        self._next_flush_at = None
+        
+        self.conn = sqlite3.connect(funnel_manager.db_path, timeout=30)
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT duration_minutes FROM webinar_events WHERE id = ?', (webinar_id,))
+        webinar = cursor.fetchone()
+        if not webinar:
+            self.conn.close()
+            raise ValueError(f"Webinar {webinar_id} not found")
+        self.duration_minutes = webinar[0] or 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def process(self, timestamp: float, registrant_id: str, event_type: str, detail: str = None):
+        """
+        Apply one event; flushes when the stream clock passes the next flush point
+        """
+        if event_type not in self.EVENT_TYPES:
+            self.events_ignored += 1
+            return
+        
+        state = self.states.get(registrant_id)
+        if state is None:
+            state = self.states[registrant_id] = _EngagementState()
+        
+        if event_type == "join":
+            if state.joined_at is None:
+                state.joined_at = timestamp
+                self.joined.add(registrant_id)
+        elif event_type == "leave":
+            if state.joined_at is not None:
+                state.watch_seconds += max(0.0, timestamp - state.joined_at)
+                state.joined_at = None
+                self.joined.discard(registrant_id)
+        elif event_type == "chat":
+            window = int(timestamp // self.window_seconds)
+            if window != state.last_chat_window:
+                state.last_chat_window = window
+                state.chat_windows += 1
+                state.interaction_points = self._interaction_points(state)
+        elif event_type == "cta_click":
+            window = int(timestamp // self.window_seconds)
+            if window != state.last_cta_window:
+                state.last_cta_window = window
+                state.cta_windows += 1
+                state.interaction_points = self._interaction_points(state)
+        else:
+            state.polls.add(detail)
+            state.interaction_points = self._interaction_points(state)
+        
+        self.dirty.add(registrant_id)
+        self.events_processed += 1
+        self.last_event_at = timestamp
+        
+        if self._next_flush_at is None:
+            self._next_flush_at = timestamp + self.flush_interval_seconds
+        elif timestamp >= self._next_flush_at:
+            self.flush(timestamp)
+            self._next_flush_at = timestamp + self.flush_interval_seconds
+    
+    def process_many(self, events):
+        """
+        Apply an iterable of (timestamp, registrant_id, event_type, detail) events
+        """
+        process = self.process
+        for timestamp, registrant_id, event_type, detail in events:
+            process(timestamp, registrant_id, event_type, detail)
+    
+    def score(self, registrant_id: str, now: Optional[float] = None) -> int:
+        """
+        Current engagement score (0-100), counting an open session up to now
+        """
+        state = self.states.get(registrant_id)
+        if state is None:
+            return 0
+        
+        watched = state.watch_seconds
+        if state.joined_at is not None:
+            now = self.last_event_at if now is None else now
+            watched += max(0.0, now - state.joined_at)
+        
+        return self.funnel_manager.calculate_engagement_score(watched, self.duration_minutes,
+                                                              state.interaction_points)
+    
+    def _interaction_points(self, state: _EngagementState) -> int:
+        return (min(self.INTERACTION_CAPS["chat"], state.chat_windows * self.INTERACTION_POINTS["chat"])
+                + min(self.INTERACTION_CAPS["poll"], len(state.polls) * self.INTERACTION_POINTS["poll"])
+                + min(self.INTERACTION_CAPS["cta_click"], state.cta_windows * self.INTERACTION_POINTS["cta_click"]))
+    
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        Write scores that changed since the last flush; returns rows written
+        """
+        # Anyone still in the session accrues watch time without sending events
+        candidates = self.dirty | self.joined
+        self.dirty = set()
+        
+        updates = []
+        for registrant_id in candidates:
+            score = self.score(registrant_id, now)
+            state = self.states[registrant_id]
+            if score != state.flushed_score:
+                state.flushed_score = score
+                updates.append((score, registrant_id))
+        
+        if updates:
+            cursor = self.conn.cursor()
+            cursor.executemany('''
+                UPDATE webinar_registrants SET engagement_score = ? WHERE id = ?
+            ''', updates)
+            self.conn.commit()
+        
+        self.flushes += 1
+        self.scores_written += len(updates)
+        return len(updates)
+    
+    def close(self):
+        """
+        End the stream: close open sessions at the last event and flush
+        """
+        if self.last_event_at is not None:
+            for registrant_id in list(self.joined):
+                self.process(self.last_event_at, registrant_id, "leave")
+            self.flush(self.last_event_at)
+        self.conn.close()
+
+EVENT_LOG_FORMAT = "webinar-events/1"
+
+def write_event_log(file_path: str, webinar_id: str, events) -> int:
+    """
+    Write a replayable event log: a JSON header line followed by one compact
+    [timestamp, registrant_id, event_type, detail] array per line
+    """
+    written = 0
+    with open(file_path, "w", encoding="utf-8") as log_file:
+        log_file.write(json.dumps({"format": EVENT_LOG_FORMAT, "webinar_id": webinar_id}) + "\n")
+        for event in events:
+            log_file.write(json.dumps(list(event), separators=(",", ":")) + "\n")
+            written += 1
+    return written
+
+def read_event_log(file_path: str):
+    """
+    Return (header, event iterator) for a log written by write_event_log
+    """
+    log_file = open(file_path, encoding="utf-8")
+    header = json.loads(log_file.readline())
+    if header.get("format") != EVENT_LOG_FORMAT:
+        log_file.close()
+        raise ValueError(f"Unsupported event log format: {header.get('format')}")
+    
+    def events():
+        with log_file:
+            for line in log_file:
+                if line.strip():
+                    yield json.loads(line)
+    
+    return header, events()
+
+def replay_event_log(funnel_manager: WebinarFunnelManager, file_path: str,
+                     flush_interval_seconds: float = 30.0) -> Dict:
+    """
+    Feed a recorded event log through the aggregator as fast as possible
+    """
+    header, events = read_event_log(file_path)
+    first_event_at = None
+    
+    started = time.perf_counter()
+    with EngagementStreamAggregator(funnel_manager, header["webinar_id"],
+                                    flush_interval_seconds=flush_interval_seconds) as aggregator:
+        for timestamp, registrant_id, event_type, detail in events:
+            if first_event_at is None:
+                first_event_at = timestamp
+            aggregator.process(timestamp, registrant_id, event_type, detail)
+    elapsed = time.perf_counter() - started
+    
+    stream_seconds = aggregator.last_event_at - first_event_at if first_event_at is not None else 0.0
+    return {
+        'events': aggregator.events_processed,
+        'ignored_events': aggregator.events_ignored,
+        'registrants': len(aggregator.states),
+        'flushes': aggregator.flushes,
+        'scores_written': aggregator.scores_written,
+        'replay_seconds': round(elapsed, 3),
+        'events_per_second': round(aggregator.events_processed / elapsed) if elapsed > 0 else 0,
+        'stream_seconds': round(stream_seconds, 1),
+        'realtime_factor': round(stream_seconds / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+def generate_session_events(registrant_ids: List[str], start_timestamp: float,
+                            duration_minutes: int, seed: int = 0) -> List[tuple]:
+    """
+    Synthetic live-session stream: staggered joins, drop-offs and rejoins,
+    chat bursts, three polls and a CTA near the end, ordered by time
+    """
+    rng = random.Random(seed)
+    duration = duration_minutes * 60
+    end_timestamp = start_timestamp + duration
+    poll_times = [start_timestamp + duration * share for share in (0.25, 0.5, 0.75)]
+    cta_time = start_timestamp + duration * 0.85
+    events = []
+    
+    for registrant_id in registrant_ids:
+        joined_at = start_timestamp + rng.uniform(-120, 600)
+        left_at = min(end_timestamp, joined_at + rng.uniform(300, duration))
+        events.append((joined_at, registrant_id, "join", None))
+        if rng.random() < 0.2:
+            drop_at = rng.uniform(joined_at, left_at)
+            events.append((drop_at, registrant_id, "leave", None))
+            events.append((min(left_at, drop_at + rng.uniform(10, 120)), registrant_id, "join", None))
+        events.append((left_at, registrant_id, "leave", None))
+        
+        for _ in range(rng.randint(0, 12)):
+            events.append((rng.uniform(joined_at, left_at), registrant_id, "chat", None))
+        for poll_number, poll_time in enumerate(poll_times, start=1):
+            if joined_at <= poll_time <= left_at and rng.random() < 0.7:
+                events.append((min(left_at, poll_time + rng.uniform(0, 45)), registrant_id, "poll", f"poll_{poll_number}"))
+        if joined_at <= cta_time <= left_at and rng.random() < 0.3:
+            events.append((min(left_at, cta_time + rng.uniform(0, 120)), registrant_id, "cta_click", None))
+    
+    events.sort(key=lambda event: event[0])
+    return events
+
+def benchmark_engagement_stream(db_path: str = "webinar_engagement_benchmark.db", attendees: int = 5000,
+                                log_path: str = "webinar_events.jsonl") -> Dict:
+    """
+    Record a synthetic session for the given number of attendees and replay
+    it through the aggregator; realtime_factor > 1 means it keeps up live
+    """
+    funnel_manager = WebinarFunnelManager(db_path)
+    webinar_id = funnel_manager.create_webinar_event("revenue_automation_masterclass", "2024-04-15T14:00:00")
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE webinar_events SET max_attendees = ? WHERE id = ?', (attendees, webinar_id))
+    cursor.execute('SELECT duration_minutes FROM webinar_events WHERE id = ?', (webinar_id,))
+    duration_minutes = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    
+    outcomes = funnel_manager.register_attendees_bulk(webinar_id, [
+        {'email': f"live{i}@example.com", 'first_name': "Live", 'last_name': str(i), 'company': "StreamCorp"}
+        for i in range(attendees)
+    ])
+    registrant_ids = [outcome['registrant_id'] for outcome in outcomes if outcome['registrant_id']]
+    
+    start_timestamp = datetime(2024, 4, 15, 14, 0).timestamp()
+    write_event_log(log_path, webinar_id, generate_session_events(registrant_ids, start_timestamp, duration_minutes))
+    
+    return replay_event_log(funnel_manager, log_path)
 
 def main():
     """
@@ -817,6 +2587,15 @@ def main():
     funnel_manager.mark_attendance(registrant_ids[1], True)  # Mike attended
     funnel_manager.mark_attendance(registrant_ids[2], False)  # Lisa no-show
     
+    # Send whatever is due now from the outbox
+    def send_email(email: Dict) -> bool:
+        print(f"Sending email: {email['email_type']} to {email['email']}")
+        print(f"Subject: {email['subject']}")
+        print("-" * 50)
+        return True
+    
+    funnel_manager.dispatch_due_emails(sender=send_email)
+    
     # Record conversions
     funnel_manager.record_conversion(registrant_ids[0], "program_purchase", 2997.00)
     